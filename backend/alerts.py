@@ -0,0 +1,134 @@
+"""
+Budget and due-date alerts pushed through the event bus.
+
+AlertMonitor is a background task that re-evaluates budgets (see
+budgets.py) and looks for subscriptions coming due whenever expenses,
+subscriptions or budgets change; it listens to the same change_versions
+bumps that invalidate the result cache. It also wakes every
+ALERT_CHECK_SECONDS to catch time passing and writes made by other
+workers. Bursts of writes are coalesced into one check.
+
+Events published:
+
+- budget.threshold: a budget's status moved between ok, warning and
+  exceeded (the first check after a client connects only records the
+  current statuses, which clients read from /api/budgets/status)
+- subscription.due_soon: an active subscription is due within
+  UPCOMING_DAYS; announced once per due date
+
+Checks are skipped while no client is connected.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from analytics import UPCOMING_DAYS
+from budgets import budget_status
+from cache import change_versions
+from events import EventBus
+
+logger = logging.getLogger(__name__)
+
+CHECK_SECONDS = float(os.getenv("ALERT_CHECK_SECONDS", "60"))
+DEBOUNCE_SECONDS = float(os.getenv("ALERT_DEBOUNCE_SECONDS", "0.5"))
+
+WATCHED_COLLECTIONS = {"expenses", "subscriptions", "budgets"}
+
+DUE_SOON_PROJECTION = {"_id": 0, "id": 1, "name": 1, "cost": 1, "category": 1, "next_due_date": 1}
+
+
+class AlertMonitor:
+    def __init__(self, db, bus: EventBus):
+        self.db = db
+        self.bus = bus
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # budget id -> last published status; None until a baseline is taken
+        self._budget_states: Optional[Dict[str, str]] = None
+        # subscription id -> due date already announced
+        self._announced: Dict[str, datetime] = {}
+        self.checks = 0
+
+    def notify(self, collections: Iterable[str] = ()) -> None:
+        """Schedule a check; cheap enough to call on every write"""
+        if not collections or WATCHED_COLLECTIONS.intersection(collections):
+            self._wake.set()
+
+    def start(self) -> None:
+        change_versions.add_listener(self.notify)
+        self.bus.on_subscribe(self.notify)
+        self._task = asyncio.create_task(self._run(), name="alert-monitor")
+
+    async def stop(self) -> None:
+        change_versions.remove_listener(self.notify)
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=CHECK_SECONDS)
+                # Let a burst of writes settle into one check
+                await asyncio.sleep(DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            if not self.bus.subscriber_count:
+                # Nobody to tell; take a fresh baseline when someone connects
+                self._budget_states = None
+                continue
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Alert check failed: {e}")
+
+    async def check(self, now: Optional[datetime] = None) -> Tuple[int, int]:
+        """Publish budget status changes and newly due-soon subscriptions"""
+        now = now or datetime.utcnow()
+        self.checks += 1
+        return await self.check_budgets(now), await self.check_due_soon(now)
+
+    async def check_budgets(self, now: datetime) -> int:
+        status = await budget_status(self.db, now)
+        states = {budget["id"]: budget["status"] for budget in status["budgets"]}
+        previous, self._budget_states = self._budget_states, states
+        if previous is None:
+            return 0
+        published = 0
+        for budget in status["budgets"]:
+            before = previous.get(budget["id"], "ok")
+            if budget["status"] != before:
+                self.bus.publish("budget.threshold", {**budget, "previous_status": before})
+                published += 1
+        return published
+
+    async def check_due_soon(self, now: datetime) -> int:
+        due_soon = await self.db.subscriptions.find(
+            {"is_active": True, "next_due_date": {"$gte": now, "$lte": now + timedelta(days=UPCOMING_DAYS)}},
+            DUE_SOON_PROJECTION,
+        ).to_list(length=None)
+        announced = {}
+        published = 0
+        for subscription in due_soon:
+            due = subscription["next_due_date"]
+            announced[subscription["id"]] = due
+            if self._announced.get(subscription["id"]) == due:
+                continue
+            self.bus.publish("subscription.due_soon", {
+                **subscription,
+                "days_until_due": (due - now).days,
+            })
+            published += 1
+        # Forget subscriptions that are no longer due soon
+        self._announced = announced
+        return published
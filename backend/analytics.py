@@ -0,0 +1,391 @@
+"""
+Server-side spending aggregations shared by the dashboard and analytics endpoints.
+
+spending_summary() runs one aggregation pipeline: the current year's monthly
+spending rollups (see rollups.py) are unioned with the active subscriptions
+and split by a $facet into the grouped totals each endpoint needs. The
+pipeline reads O(categories x months) rollup documents rather than every
+expense, and only per-category and per-month sums (plus the short
+upcoming-subscriptions list) come back to the process.
+
+spending_timeseries() buckets spending by day, week, month or quarter over
+any date range with server-side $dateTrunc grouping (MongoDB 5.0+) and
+zero-fills the buckets that have no spending.
+
+tag_analytics() breaks spending down by tag ($unwind/$group in a $facet):
+spend per tag, tags that occur together, and the top tags per bucket.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from rollups import COLLECTION as ROLLUPS_COLLECTION
+
+# Cost of a subscription over a year, computed in the pipeline
+YEARLY_COST_EXPR = {
+    "$cond": [
+        {"$eq": ["$billing_frequency", "monthly"]},
+        {"$multiply": ["$cost", 12]},
+        "$cost",
+    ]
+}
+
+EXPENSIVE_SUBSCRIPTION_COST = 500
+UPCOMING_DAYS = 7
+
+FACETS = (
+    "category_totals",
+    "monthly_category_totals",
+    "monthly_trends",
+    "subscription_category_totals",
+    "upcoming_subscriptions",
+    "expensive_subscriptions",
+)
+
+
+def _period_starts(now: datetime):
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return month_start, year_start
+
+
+def _facet_stages(name: str, now: datetime) -> list:
+    month_start, _ = _period_starts(now)
+    expense = {"kind": "expense"}
+    subscription = {"kind": "subscription"}
+
+    if name == "category_totals":
+        return [{"$match": expense}, {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}}]
+    if name == "monthly_category_totals":
+        return [
+            {"$match": {**expense, "date": {"$gte": month_start}}},
+            {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+        ]
+    if name == "monthly_trends":
+        return [
+            {"$match": expense},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+                "total": {"$sum": "$amount"},
+            }},
+        ]
+    if name == "subscription_category_totals":
+        return [{"$match": subscription}, {"$group": {"_id": "$category", "total": {"$sum": "$yearly_cost"}}}]
+    if name == "upcoming_subscriptions":
+        return [
+            {"$match": {**subscription, "next_due_date": {"$lte": now + timedelta(days=UPCOMING_DAYS)}}},
+            {"$sort": {"next_due_date": 1}},
+            {"$project": {"_id": 0, "id": 1, "name": 1, "cost": 1, "next_due_date": 1}},
+        ]
+    if name == "expensive_subscriptions":
+        return [
+            {"$match": {**subscription, "cost": {"$gt": EXPENSIVE_SUBSCRIPTION_COST}}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "yearly_cost": {"$sum": "$yearly_cost"}}},
+        ]
+    raise ValueError(f"Unknown facet: {name}")
+
+
+def build_summary_pipeline(now: datetime, facets: Iterable[str] = FACETS) -> list:
+    """Build the rollups + subscriptions $facet pipeline for the given facets"""
+    facets = list(facets)
+    _, year_start = _period_starts(now)
+    needs_subscriptions = any(name.startswith(("subscription", "upcoming", "expensive")) for name in facets)
+
+    pipeline = [
+        {"$match": {"period": "month", "bucket_start": {"$gte": year_start}, "count": {"$gt": 0}}},
+        {"$project": {"_id": 0, "kind": "expense", "amount": "$total", "category": 1, "date": "$bucket_start"}},
+    ]
+    if needs_subscriptions:
+        pipeline.append({"$unionWith": {
+            "coll": "subscriptions",
+            "pipeline": [
+                {"$match": {"is_active": True}},
+                {"$project": {
+                    "_id": 0, "kind": "subscription", "id": 1, "name": 1, "cost": 1,
+                    "category": 1, "next_due_date": 1, "yearly_cost": YEARLY_COST_EXPR,
+                }},
+            ],
+        }})
+    pipeline.append({"$facet": {name: _facet_stages(name, now) for name in facets}})
+    return pipeline
+
+
+async def spending_summary(db, now: Optional[datetime] = None, facets: Iterable[str] = FACETS) -> Dict[str, Any]:
+    """Return grouped spending totals for the current month and year in one round trip"""
+    now = now or datetime.utcnow()
+    facets = list(facets)
+    result = await db[ROLLUPS_COLLECTION].aggregate(build_summary_pipeline(now, facets)).to_list(length=1)
+    raw = result[0] if result else {name: [] for name in facets}
+
+    def totals(name):
+        return {row["_id"]: row["total"] for row in raw.get(name, [])}
+
+    summary: Dict[str, Any] = {}
+    if "category_totals" in facets:
+        summary["category_totals"] = totals("category_totals")
+        summary["yearly_total"] = sum(summary["category_totals"].values())
+    if "monthly_category_totals" in facets:
+        summary["monthly_category_totals"] = totals("monthly_category_totals")
+        summary["monthly_total"] = sum(summary["monthly_category_totals"].values())
+    if "monthly_trends" in facets:
+        summary["monthly_trends"] = dict(sorted(totals("monthly_trends").items()))
+    if "subscription_category_totals" in facets:
+        summary["subscription_category_totals"] = totals("subscription_category_totals")
+        summary["subscription_yearly_cost"] = sum(summary["subscription_category_totals"].values())
+    if "upcoming_subscriptions" in facets:
+        summary["upcoming_subscriptions"] = raw.get("upcoming_subscriptions", [])
+    if "expensive_subscriptions" in facets:
+        expensive = raw.get("expensive_subscriptions") or [{"count": 0, "yearly_cost": 0}]
+        summary["expensive_subscriptions"] = {
+            "count": expensive[0]["count"],
+            "yearly_cost": expensive[0]["yearly_cost"],
+        }
+    return summary
+
+
+def merge_totals(*breakdowns: Dict[str, float]) -> Dict[str, float]:
+    """Add several category -> amount mappings together"""
+    merged: Dict[str, float] = {}
+    for breakdown in breakdowns:
+        for category, amount in breakdown.items():
+            merged[category] = merged.get(category, 0) + amount
+    return merged
+
+
+# Time series
+
+GRANULARITIES = ("day", "week", "month", "quarter")
+SPLITS = ("category", "tag")
+MAX_TIMESERIES_DAYS = 20 * 366
+
+
+def truncate_date(value: date, granularity: str) -> date:
+    """Start of the bucket containing value, matching $dateTrunc (weeks start on Monday)"""
+    if granularity == "day":
+        return value
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    if granularity == "month":
+        return value.replace(day=1)
+    return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+
+
+def next_bucket(value: date, granularity: str) -> date:
+    if granularity == "day":
+        return value + timedelta(days=1)
+    if granularity == "week":
+        return value + timedelta(days=7)
+    months = 1 if granularity == "month" else 3
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def bucket_starts(start: date, end: date, granularity: str) -> List[date]:
+    """Every bucket between start and end inclusive, for zero-filling"""
+    buckets = []
+    current = truncate_date(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def _date_trunc(field: str, granularity: str) -> Dict[str, Any]:
+    spec = {"date": field, "unit": granularity}
+    if granularity == "week":
+        spec["startOfWeek"] = "monday"
+    return {"$dateTrunc": spec}
+
+
+def _as_datetime(value: date) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+async def spending_timeseries(
+    db,
+    granularity: str,
+    start: date,
+    end: date,
+    split: Optional[str] = None,
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Zero-filled spending totals per bucket between start and end (whole days, inclusive).
+
+    Grouping runs server-side with $dateTrunc. Without tag filters or a tag
+    split, the per-day rollups are grouped instead of the raw expenses, so
+    a five-year daily series reads at most days x categories documents.
+    """
+    range_start, range_end = _as_datetime(start), _as_datetime(end + timedelta(days=1))
+    split_field = {"category": "$category", "tag": "$tags", None: None}[split]
+
+    if split != "tag" and not tags:
+        match: Dict[str, Any] = {"period": "day", "bucket_start": {"$gte": range_start, "$lt": range_end}}
+        if category:
+            match["category"] = category
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"bucket": _date_trunc("$bucket_start", granularity), "key": split_field},
+                "total": {"$sum": "$total"},
+            }},
+        ]
+        rows = await db[ROLLUPS_COLLECTION].aggregate(pipeline).to_list(length=None)
+        series_rows = rows if split else []
+        total_rows = rows
+    else:
+        match = {"date": {"$gte": range_start, "$lt": range_end}}
+        if category:
+            match["category"] = category
+        if tags:
+            match["tags"] = {"$all": tags}
+        bucket = _date_trunc("$date", granularity)
+        facets: Dict[str, Any] = {
+            "totals": [{"$group": {"_id": {"bucket": bucket, "key": None}, "total": {"$sum": "$amount"}}}],
+        }
+        if split:
+            # An expense counts in full towards each of its tags
+            facets["series"] = ([{"$unwind": "$tags"}] if split == "tag" else []) + [
+                {"$group": {"_id": {"bucket": bucket, "key": split_field}, "total": {"$sum": "$amount"}}},
+            ]
+        pipeline = [
+            {"$match": match},
+            {"$project": {"_id": 0, "date": 1, "amount": 1, "category": 1, "tags": 1}},
+            {"$facet": facets},
+        ]
+        result = await db.expenses.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        raw = result[0] if result else {}
+        total_rows = raw.get("totals", [])
+        series_rows = raw.get("series", [])
+
+    buckets = bucket_starts(start, end, granularity)
+    index = {bucket: position for position, bucket in enumerate(buckets)}
+    totals = [0.0] * len(buckets)
+    for row in total_rows:
+        position = index.get(row["_id"]["bucket"].date())
+        if position is not None:
+            totals[position] += row["total"]
+
+    response: Dict[str, Any] = {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "totals": totals,
+    }
+    if split:
+        series: Dict[str, List[float]] = {}
+        for row in series_rows:
+            position = index.get(row["_id"]["bucket"].date())
+            if position is None:
+                continue
+            values = series.setdefault(row["_id"]["key"], [0.0] * len(buckets))
+            values[position] += row["total"]
+        response["split"] = split
+        response["series"] = dict(sorted(series.items()))
+    return response
+
+
+# Tags
+
+DEFAULT_TOP_TAGS = 5
+MAX_TOP_TAGS = 50
+MAX_TAGS = 200
+MAX_TAG_PAIRS = 50
+# Keeps the per-period breakdown well inside the 16MB result document
+MAX_TAG_PERIOD_ENTRIES = 100000
+
+
+def _tag_facets(granularity: str, top: int) -> Dict[str, Any]:
+    return {
+        "tags": [
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+            {"$sort": {"total": -1, "_id": 1}},
+            {"$limit": MAX_TAGS},
+        ],
+        "tag_count": [
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags"}},
+            {"$count": "distinct"},
+        ],
+        "untagged": [
+            {"$match": {"tags": {"$size": 0}}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}},
+        ],
+        "periods": [
+            {"$unwind": "$tags"},
+            {"$group": {
+                "_id": {"bucket": _date_trunc("$date", granularity), "tag": "$tags"},
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"_id.bucket": 1, "total": -1, "_id.tag": 1}},
+            {"$group": {
+                "_id": "$_id.bucket",
+                "top": {"$push": {"tag": "$_id.tag", "total": "$total", "count": "$count"}},
+            }},
+            {"$project": {"top": {"$slice": ["$top", top]}}},
+        ],
+        # Every unordered pair of tags on the same expense
+        "co_occurrence": [
+            {"$match": {"tags.1": {"$exists": True}}},
+            {"$project": {"amount": 1, "first": "$tags", "second": "$tags"}},
+            {"$unwind": "$first"},
+            {"$unwind": "$second"},
+            {"$match": {"$expr": {"$lt": ["$first", "$second"]}}},
+            {"$group": {
+                "_id": {"first": "$first", "second": "$second"},
+                "count": {"$sum": 1},
+                "total": {"$sum": "$amount"},
+            }},
+            {"$sort": {"count": -1, "total": -1}},
+            {"$limit": MAX_TAG_PAIRS},
+        ],
+    }
+
+
+async def tag_analytics(
+    db,
+    granularity: str,
+    start: date,
+    end: date,
+    top: int = DEFAULT_TOP_TAGS,
+    category: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Spend per tag, tag pairs that occur together and the top tags per bucket.
+
+    One aggregation over the expenses in the date range: tags are
+    de-duplicated per expense, then a $facet unwinds them for each
+    breakdown. An expense counts in full towards each of its tags.
+    """
+    match: Dict[str, Any] = {"date": {"$gte": _as_datetime(start), "$lt": _as_datetime(end + timedelta(days=1))}}
+    if category:
+        match["category"] = category
+    pipeline = [
+        {"$match": match},
+        {"$project": {"_id": 0, "date": 1, "amount": 1, "tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+        {"$facet": _tag_facets(granularity, top)},
+    ]
+    result = await db.expenses.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+    raw = result[0] if result else {}
+
+    tag_count = (raw.get("tag_count") or [{"distinct": 0}])[0]["distinct"]
+    untagged = (raw.get("untagged") or [{"total": 0, "count": 0}])[0]
+    top_by_bucket = {row["_id"].date(): row["top"] for row in raw.get("periods", [])}
+    return {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "tag_count": tag_count,
+        "tags": [{"tag": row["_id"], "total": row["total"], "count": row["count"]} for row in raw.get("tags", [])],
+        "untagged": {"total": untagged["total"], "count": untagged["count"]},
+        "co_occurrence": [
+            {"tags": [row["_id"]["first"], row["_id"]["second"]], "count": row["count"], "total": row["total"]}
+            for row in raw.get("co_occurrence", [])
+        ],
+        "periods": [
+            {"bucket": bucket.isoformat(), "top": top_by_bucket.get(bucket, [])}
+            for bucket in bucket_starts(start, end, granularity)
+        ],
+    }
@@ -0,0 +1,91 @@
+"""
+Forecast timings for many subscriptions over a long horizon.
+
+"naive" steps each subscription through calculate_next_due_date-style
+month arithmetic and sums charges into a dict per month; "cold" is
+ForecastEngine with an empty expansion cache and "warm" is the same engine
+once every expansion is cached, which is the steady state between edits.
+No database is needed.
+
+    cd backend && python -m benchmarks.forecast [--subscriptions 10000] [--months 60]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from forecast import FREQUENCY_MONTHS, ForecastEngine, add_months  # noqa: E402
+
+CATEGORIES = ["entertainment", "utilities", "software", "healthcare", "education"]
+START = date(2026, 1, 15)
+
+
+def make_subscriptions(count: int) -> List[dict]:
+    rng = np.random.default_rng(7)
+    now = datetime(2026, 1, 1)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "cost": float(round(rng.uniform(1, 300), 2)),
+            "billing_frequency": "yearly" if i % 5 == 0 else "monthly",
+            "next_due_date": datetime(2026, 1, 1) + timedelta(days=int(rng.integers(0, 365))),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def naive_forecast(subscriptions: List[dict], start: date, months: int) -> Dict[str, float]:
+    end_index = start.year * 12 + start.month - 1 + months
+    totals: Dict[str, float] = {}
+    for subscription in subscriptions:
+        step = FREQUENCY_MONTHS[subscription["billing_frequency"]]
+        k = 0
+        while True:
+            due = add_months(subscription["next_due_date"], k * step)
+            if due.year * 12 + due.month - 1 >= end_index:
+                break
+            if due.date() >= start:
+                month = due.strftime("%Y-%m")
+                totals[month] = totals.get(month, 0) + subscription["cost"]
+            k += 1
+    return totals
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main(count: int, months: int) -> None:
+    subscriptions = make_subscriptions(count)
+    engine = ForecastEngine(max_entries=count)
+    naive, naive_seconds = timed(naive_forecast, subscriptions, START, months)
+    cold, cold_seconds = timed(engine.forecast, subscriptions, START, months)
+    warm, warm_seconds = timed(engine.forecast, subscriptions, START, months)
+
+    # Same totals from every path
+    expected = [naive.get(bucket[:7], 0.0) for bucket in cold["buckets"]]
+    assert np.allclose(expected, cold["totals"]) and cold["totals"] == warm["totals"]
+
+    print(f"{count:,} subscriptions x {months} months ({int(sum(cold['charge_counts'])):,} charges)")
+    for label, seconds in (("naive", naive_seconds), ("cold", cold_seconds), ("warm", warm_seconds)):
+        print(f"  {label:<6} {seconds * 1000:9.1f} ms  x{naive_seconds / seconds:6.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscriptions", type=int, default=10000)
+    parser.add_argument("--months", type=int, default=60)
+    args = parser.parse_args()
+    main(args.subscriptions, args.months)
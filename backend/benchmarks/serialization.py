@@ -0,0 +1,91 @@
+"""
+Rows/sec for serialising a GET /api/expenses page, before and after the fast path.
+
+"before" is what the endpoint used to do: build an Expense per Mongo dict,
+then let FastAPI validate and serialise the list again through
+response_model and render it with JSONResponse. "strict" is the opt-in
+STRICT_RESPONSE_VALIDATION path and "fast" encodes the Mongo dicts
+directly. No database is needed.
+
+    cd backend && python -m benchmarks.serialization [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import serialization  # noqa: E402
+from server import Expense  # noqa: E402
+
+CATEGORIES = ["food", "transport", "utilities", "shopping", "healthcare"]
+
+
+def make_documents(rows: int) -> List[dict]:
+    """Expense documents shaped like the ones Motor returns (without _id)"""
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(rows):
+        created = start + timedelta(minutes=17 * i, milliseconds=i % 1000)
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "amount": float(50 + (i * 37) % 4000),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "tags": ["upi", CATEGORIES[i % len(CATEGORIES)]],
+            "notes": f"Expense number {i}",
+            "date": created,
+            "created_at": created,
+            "updated_at": created,
+        })
+    return docs
+
+
+async def before(docs: List[dict], field) -> bytes:
+    content = [Expense(**doc) for doc in docs]
+    value = await serialize_response(field=field, response_content=content, is_coroutine=True)
+    return JSONResponse(value).body
+
+
+async def strict(docs: List[dict], field) -> bytes:
+    return serialization.list_response(Expense, docs, strict=True).body
+
+
+async def fast(docs: List[dict], field) -> bytes:
+    return serialization.list_response(Expense, docs, strict=False).body
+
+
+async def main(rows: int, repeat: int) -> None:
+    docs = make_documents(rows)
+    field = create_response_field(name="Response_get_expenses", type_=List[Expense])
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"{rows} rows, best of {repeat}, encoder={encoder}")
+
+    baseline = None
+    for name, path in (("before", before), ("strict", strict), ("fast", fast)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = await path(docs, field)
+            best = min(best, time.perf_counter() - started)
+        rate = rows / best
+        baseline = baseline or rate
+        print(f"{name:>7}: {best * 1000:8.1f} ms  {rate:12,.0f} rows/s  x{rate / baseline:5.1f}  {len(body):,} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
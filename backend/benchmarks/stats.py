@@ -0,0 +1,135 @@
+"""
+Vectorised spending statistics against the equivalent per-dict Python loops.
+
+Both sides compute the same numbers (rolling 7/30-day averages, per-category
+percentiles, month-over-month totals and z-score anomalies) from the same
+synthetic expenses; "naive" walks a list of dicts the way get_dashboard
+used to, "vectorised" is stats.compute_stats over NumPy columns. Loading
+the columns is timed separately. No database is needed.
+
+    cd backend && python -m benchmarks.stats [--rows 100000 1000000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stats import DEFAULT_Z_THRESHOLD, PERCENTILES, ROLLING_WINDOWS, ExpenseColumns, compute_stats  # noqa: E402
+
+CATEGORIES = ["food", "transport", "utilities", "shopping", "healthcare", "entertainment", "education", "other"]
+START = date(2024, 1, 1)
+END = date(2025, 12, 31)
+
+
+def make_documents(rows: int) -> List[dict]:
+    rng = np.random.default_rng(42)
+    n_days = (END - START).days + 1
+    offsets = rng.integers(0, n_days * 24 * 60, rows)
+    amounts = np.round(rng.lognormal(6, 1, rows), 2)
+    categories = rng.integers(0, len(CATEGORIES), rows)
+    start = datetime(START.year, START.month, START.day)
+    return [
+        {
+            "id": f"exp-{i}",
+            "amount": float(amounts[i]),
+            "category": CATEGORIES[categories[i]],
+            "date": start + timedelta(minutes=int(offsets[i])),
+        }
+        for i in range(rows)
+    ]
+
+
+def naive_stats(docs: List[dict]) -> Dict:
+    n_days = (END - START).days + 1
+    daily = [0.0] * n_days
+    for doc in docs:
+        daily[(doc["date"].date() - START).days] += doc["amount"]
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        values = []
+        for i in range(n_days):
+            span = daily[max(0, i - window + 1):i + 1]
+            values.append(sum(span) / len(span))
+        rolling[window] = values
+
+    by_category: Dict[str, List[float]] = {}
+    for doc in docs:
+        by_category.setdefault(doc["category"], []).append(doc["amount"])
+    percentiles = {}
+    for category, amounts in by_category.items():
+        amounts = sorted(amounts)
+        percentiles[category] = {}
+        for quantile in PERCENTILES:
+            position = quantile * (len(amounts) - 1)
+            lower, upper = math.floor(position), math.ceil(position)
+            percentiles[category][quantile] = amounts[lower] + (amounts[upper] - amounts[lower]) * (position - lower)
+
+    monthly: Dict[str, float] = {}
+    monthly_by_category: Dict[tuple, float] = {}
+    for doc in docs:
+        month = doc["date"].strftime("%Y-%m")
+        monthly[month] = monthly.get(month, 0) + doc["amount"]
+        key = (month, doc["category"])
+        monthly_by_category[key] = monthly_by_category.get(key, 0) + doc["amount"]
+    months = sorted(monthly)
+    deltas = [monthly[b] - monthly[a] for a, b in zip(months, months[1:])]
+
+    stats = {}
+    for category, amounts in by_category.items():
+        mean = sum(amounts) / len(amounts)
+        std = math.sqrt(sum((a - mean) ** 2 for a in amounts) / len(amounts))
+        stats[category] = (mean, std)
+    flagged = []
+    for doc in docs:
+        mean, std = stats[doc["category"]]
+        if std and abs(doc["amount"] - mean) / std >= DEFAULT_Z_THRESHOLD:
+            flagged.append(doc["id"])
+    return {"rolling": rolling, "percentiles": percentiles, "deltas": deltas, "anomalies": len(flagged)}
+
+
+def load(docs: List[dict]) -> ExpenseColumns:
+    return ExpenseColumns.from_lists(
+        [doc["amount"] for doc in docs],
+        [doc["date"] for doc in docs],
+        [doc["category"] for doc in docs],
+        [doc["id"] for doc in docs],
+    )
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main(row_counts: List[int]) -> None:
+    for rows in row_counts:
+        docs = make_documents(rows)
+        naive, naive_seconds = timed(naive_stats, docs)
+        columns, load_seconds = timed(load, docs)
+        vectorised, vector_seconds = timed(compute_stats, columns, START, END)
+
+        # Same answers from both paths
+        assert np.allclose(naive["rolling"][7], vectorised["rolling_averages"]["7"])
+        assert np.allclose(naive["deltas"], vectorised["month_over_month"]["deltas"])
+        assert naive["anomalies"] == vectorised["anomalies"]["count"]
+
+        print(
+            f"{rows:>9,} rows  naive {naive_seconds * 1000:9.1f} ms  "
+            f"vectorised {vector_seconds * 1000:8.1f} ms (+{load_seconds * 1000:.1f} ms column load)  "
+            f"x{naive_seconds / vector_seconds:6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    main(parser.parse_args().rows)
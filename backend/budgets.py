@@ -0,0 +1,125 @@
+"""
+Budget evaluation.
+
+All budgets are evaluated against one grouped spending summary (see
+analytics.spending_summary): the current month's and year's totals per
+category come back from a single aggregation, and each budget is then a
+dictionary lookup, so the cost does not depend on how many expenses or
+budgets there are.
+
+Spending is counted the way the dashboard always has: a monthly budget
+covers this month's expenses; a yearly budget covers this year's expenses
+plus the yearly cost of active subscriptions. The projection extrapolates
+expenses at the pace so far to the end of the period (subscription costs
+are already a full-year figure and are added as they are).
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from analytics import spending_summary
+
+BUDGET_FACETS = ("category_totals", "monthly_category_totals", "subscription_category_totals")
+
+# Percent of the limit at which a budget is reported as "warning"
+WARNING_PERCENT = float(os.getenv("BUDGET_WARNING_PERCENT", "80"))
+
+# Projections made early in a period are extrapolated from at least this much of it
+MIN_ELAPSED = timedelta(days=1)
+
+
+def period_bounds(budget_type: str, now: datetime) -> Tuple[datetime, datetime]:
+    """Start and (exclusive) end of the budget period containing now"""
+    if budget_type == "monthly":
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    else:
+        start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = start.replace(year=start.year + 1)
+    return start, end
+
+
+def _percent(value: float, limit: float) -> Optional[float]:
+    return value / limit * 100 if limit > 0 else None
+
+
+def evaluate_budget(budget: Dict[str, Any], summary: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Utilisation and end-of-period projection of one budget"""
+    category = budget.get("category")
+    if budget["type"] == "monthly":
+        expenses = summary["monthly_category_totals"]
+        committed: Dict[str, float] = {}
+    else:
+        expenses = summary["category_totals"]
+        committed = summary["subscription_category_totals"]
+    if category:
+        expense_spent = expenses.get(category, 0)
+        committed_spent = committed.get(category, 0)
+    else:
+        expense_spent = sum(expenses.values())
+        committed_spent = sum(committed.values())
+
+    start, end = period_bounds(budget["type"], now)
+    elapsed = max(now - start, MIN_ELAPSED) / (end - start)
+    spent = expense_spent + committed_spent
+    projected = expense_spent / min(elapsed, 1.0) + committed_spent
+    percent_used = _percent(spent, budget["limit"])
+
+    if spent > budget["limit"]:
+        status = "exceeded"
+    elif percent_used is not None and percent_used >= WARNING_PERCENT:
+        status = "warning"
+    else:
+        status = "ok"
+    return {
+        "id": budget["id"],
+        "type": budget["type"],
+        "category": category,
+        "limit": budget["limit"],
+        "period_start": start,
+        "period_end": end,
+        "spent": spent,
+        "remaining": budget["limit"] - spent,
+        "percent_used": percent_used,
+        "projected": projected,
+        "projected_percent": _percent(projected, budget["limit"]),
+        "projected_to_exceed": projected > budget["limit"],
+        "status": status,
+    }
+
+
+def evaluate_budgets(budgets: List[Dict[str, Any]], summary: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+    return [evaluate_budget(budget, summary, now) for budget in budgets]
+
+
+def alerts_from_statuses(statuses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The dashboard's alert entries for budgets over their limit"""
+    return [
+        {
+            "type": status["type"],
+            "category": status["category"],
+            "limit": status["limit"],
+            "current": status["spent"],
+            "exceeded_by": status["spent"] - status["limit"],
+        }
+        for status in statuses if status["status"] == "exceeded"
+    ]
+
+
+async def budget_status(db, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Evaluate every budget against the current month's and year's spending"""
+    now = now or datetime.utcnow()
+    budgets, summary = await asyncio.gather(
+        db.budgets.find({}, {"_id": 0}).to_list(length=None),
+        spending_summary(db, now, BUDGET_FACETS),
+    )
+    statuses = evaluate_budgets(budgets, summary, now)
+    return {
+        "as_of": now,
+        "budgets": statuses,
+        "exceeded": sum(1 for status in statuses if status["status"] == "exceeded"),
+        "warning": sum(1 for status in statuses if status["status"] == "warning"),
+        "projected_to_exceed": sum(1 for status in statuses if status["projected_to_exceed"]),
+    }
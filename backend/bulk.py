@@ -0,0 +1,173 @@
+"""
+Filter-based bulk mutations for expenses and subscriptions.
+
+Each mutation is a single server operation (update_many or delete_many)
+over the same filters GET /api/expenses understands, with a dry-run mode
+that only counts what would change. Expense changes that move money
+between rollup buckets (amount, category, date) are reflected in the
+rollups from one grouped aggregation of the matched expenses, taken just
+before the write.
+
+The aggregation, the write and the rollup update run in one transaction
+when the server supports them (a replica set or sharded cluster), so a
+concurrent expense write can't slip between them. On a standalone server
+the matching ids are read first and the mutation runs over them in
+batches of PINNED_BATCH_SIZE, each one aggregated, written and rolled up
+on its own: expenses created meanwhile are left alone, every command stays
+far below the 16 MB limit, and a failure part way leaves the finished
+batches' rollups right. An edit to one of those expenses that lands
+between a batch's aggregation and its write can still leave its rollups
+off; `python rollups.py verify` finds that and `rebuild` repairs it.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure
+
+from rollups import apply_deltas, bulk_change_deltas, grouped_contributions
+
+logger = logging.getLogger(__name__)
+
+# Server error code for transactions on a standalone server (IllegalOperation)
+TRANSACTIONS_UNSUPPORTED_CODES = {20}
+
+# Whether the server took a transaction; None until the first bulk mutation finds out
+_transactions_supported: Optional[bool] = None
+
+# Expense fields whose change affects the spending rollups
+ROLLUP_FIELDS = ("amount", "category", "date")
+
+# Expense ids per write when mutating without a transaction
+PINNED_BATCH_SIZE = int(os.getenv("BULK_PINNED_BATCH_SIZE", "5000"))
+
+
+class _SummedResult:
+    """Counts of several update_many/delete_many results, read like one"""
+
+    def __init__(self):
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+
+    def add(self, result) -> None:
+        self.matched_count += getattr(result, "matched_count", 0)
+        self.modified_count += getattr(result, "modified_count", 0)
+        self.deleted_count += getattr(result, "deleted_count", 0)
+
+
+def _tags_expression(add_tags: List[str], remove_tags: List[str]) -> Dict[str, Any]:
+    """Pipeline expression removing then appending tags, keeping existing order"""
+    return {"$let": {
+        "vars": {"kept": {"$filter": {
+            "input": {"$ifNull": ["$tags", []]},
+            "cond": {"$not": [{"$in": ["$$this", {"$literal": remove_tags}]}]},
+        }}},
+        "in": {"$concatArrays": ["$$kept", {"$filter": {
+            "input": {"$literal": add_tags},
+            "cond": {"$not": [{"$in": ["$$this", "$$kept"]}]},
+        }}]},
+    }}
+
+
+def build_update_pipeline(
+    changes: Dict[str, Any],
+    add_tags: Optional[List[str]] = None,
+    remove_tags: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Update pipeline that sets fields and adds/removes tags in one update_many"""
+    # $literal so user values starting with "$" aren't read as field paths
+    fields: Dict[str, Any] = {key: {"$literal": value} for key, value in changes.items()}
+    if add_tags or remove_tags:
+        fields["tags"] = _tags_expression(add_tags or [], remove_tags or [])
+    fields["updated_at"] = {"$literal": datetime.utcnow()}
+    return [{"$set": fields}]
+
+
+async def _mutate_with_rollups(
+    db,
+    query: Dict[str, Any],
+    changes: Optional[Dict[str, Any]],
+    mutate: Callable[[Dict[str, Any], Any], Awaitable[Any]],
+) -> Any:
+    """Run mutate(query, session) and move the rollups of the expenses it matched, as one unit if possible"""
+    global _transactions_supported
+    if _transactions_supported is not False:
+        try:
+            async with await db.client.start_session() as session:
+                result = await session.with_transaction(
+                    lambda session: _grouped_mutation(db, query, changes, mutate, session)
+                )
+            _transactions_supported = True
+            return result
+        except OperationFailure as e:
+            if e.code not in TRANSACTIONS_UNSUPPORTED_CODES:
+                raise
+            _transactions_supported = False
+            logger.warning("Transactions unavailable, bulk expense changes update rollups without one")
+    return await _pinned_mutation(db, query, changes, mutate)
+
+
+async def _grouped_mutation(db, query, changes, mutate, session) -> Any:
+    groups = await grouped_contributions(db, query, session=session)
+    result = await mutate(query, session)
+    await apply_deltas(db, bulk_change_deltas(groups, changes), session=session)
+    return result
+
+
+async def _pinned_mutation(db, query, changes, mutate) -> _SummedResult:
+    """The mutation without a transaction, over the ids matching now, in batches"""
+    # Only touch the expenses matching now, not ones that start matching meanwhile
+    ids = [doc["id"] async for doc in db.expenses.find(query, {"_id": 0, "id": 1})]
+    result = _SummedResult()
+    for start in range(0, len(ids), PINNED_BATCH_SIZE):
+        pinned = {"$and": [query, {"id": {"$in": ids[start:start + PINNED_BATCH_SIZE]}}]}
+        result.add(await _grouped_mutation(db, pinned, changes, mutate, None))
+    return result
+
+
+async def bulk_update_expenses(
+    db,
+    query: Dict[str, Any],
+    changes: Dict[str, Any],
+    add_tags: Optional[List[str]] = None,
+    remove_tags: Optional[List[str]] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    if dry_run:
+        matched = await db.expenses.count_documents(query)
+        return {"matched": matched, "modified": 0, "dry_run": True}
+
+    pipeline = build_update_pipeline(changes, add_tags, remove_tags)
+    rollup_changes = {key: value for key, value in changes.items() if key in ROLLUP_FIELDS}
+    if not rollup_changes:
+        result = await db.expenses.update_many(query, pipeline)
+    else:
+        result = await _mutate_with_rollups(
+            db, query, rollup_changes, lambda matched, session: db.expenses.update_many(matched, pipeline, session=session)
+        )
+    return {"matched": result.matched_count, "modified": result.modified_count, "dry_run": False}
+
+
+async def bulk_delete_expenses(db, query: Dict[str, Any], dry_run: bool = False) -> Dict[str, Any]:
+    if dry_run:
+        matched = await db.expenses.count_documents(query)
+        return {"matched": matched, "modified": 0, "dry_run": True}
+
+    result = await _mutate_with_rollups(
+        db, query, None, lambda matched, session: db.expenses.delete_many(matched, session=session)
+    )
+    return {"matched": result.deleted_count, "modified": result.deleted_count, "dry_run": False}
+
+
+async def bulk_update_subscriptions(
+    db, query: Dict[str, Any], changes: Dict[str, Any], dry_run: bool = False
+) -> Dict[str, Any]:
+    if dry_run:
+        matched = await db.subscriptions.count_documents(query)
+        return {"matched": matched, "modified": 0, "dry_run": True}
+
+    result = await db.subscriptions.update_many(query, build_update_pipeline(changes))
+    return {"matched": result.matched_count, "modified": result.modified_count, "dry_run": False}
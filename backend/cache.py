@@ -0,0 +1,115 @@
+"""
+In-process result cache for the dashboard and analytics endpoints.
+
+Entries are keyed by endpoint and period. Every write handler bumps a
+per-collection version counter (change_versions.bump("expenses")), and an
+entry is only served while the versions of the collections it was computed
+from are unchanged, so a write invalidates exactly the results that depend
+on it without any explicit key bookkeeping. A TTL backstops anything the
+counters can't see (time-dependent fields such as days_until_due, writes
+made by another process) and the cache is a bounded LRU.
+
+Everything runs on the event loop thread, so no locking is needed.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Tuple
+
+
+class ChangeVersions:
+    """Monotonic per-collection change counters"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._listeners: List[Callable[[Tuple[str, ...]], None]] = []
+
+    def bump(self, *collections: str) -> None:
+        for collection in collections:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+        for listener in self._listeners:
+            listener(collections)
+
+    def add_listener(self, listener: Callable[[Tuple[str, ...]], None]) -> None:
+        """Call listener(collections) after every bump; it must not block"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Tuple[str, ...]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def snapshot(self, collections: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(collection, 0) for collection in collections)
+
+
+class ResultCache:
+    """Bounded LRU of computed results, invalidated by collection versions and TTL"""
+
+    def __init__(self, versions: ChangeVersions, max_entries: int = 256, ttl_seconds: float = 60.0):
+        self.versions = versions
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple[int, ...], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        collections: Tuple[str, ...],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Return the cached result for key, computing and storing it if stale or absent"""
+        # Snapshot before computing so a write that lands mid-computation
+        # leaves the stored entry already stale
+        current = self.versions.snapshot(collections)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, versions, value = entry
+            if versions != current:
+                self.invalidations += 1
+            elif time.monotonic() - stored_at > self.ttl_seconds:
+                self.expirations += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        value = await compute()
+        self._entries[key] = (time.monotonic(), current, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+
+change_versions = ChangeVersions()
+result_cache = ResultCache(
+    change_versions,
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "60")),
+)
@@ -0,0 +1,102 @@
+"""
+Cross-process change notification through a MongoDB change stream.
+
+The result cache, ETags and alert monitor are driven by per-process
+change_versions counters, which only see writes made by the same process.
+With several workers, ChangeStreamSync watches the database for writes to
+the watched collections and bumps the local counters for each one, so a
+write through any worker invalidates cached results in all of them.
+
+Change streams need a replica set or sharded cluster (Atlas always is).
+On a standalone server the sync logs a warning and stays off; the cache
+TTL then bounds how stale another worker's results can be, and ETags fall
+back to shared counters in Mongo (see etags.py). After a
+dropped stream every watched collection is bumped, since changes may have
+been missed while it was down.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo.errors import OperationFailure
+
+from cache import ChangeVersions
+
+logger = logging.getLogger(__name__)
+
+CHANGE_STREAM_SYNC = os.getenv("CHANGE_STREAM_SYNC", "true").lower() == "true"
+SYNCED_COLLECTIONS = ("expenses", "subscriptions", "budgets")
+
+# Server error codes meaning change streams are not available here
+UNSUPPORTED_CODES = {40573, 40324}
+
+MAX_BACKOFF_SECONDS = 60
+
+
+class ChangeStreamSync:
+    def __init__(self, db, versions: ChangeVersions, collections: Iterable[str] = SYNCED_COLLECTIONS):
+        self.db = db
+        self.versions = versions
+        self.collections = tuple(collections)
+        self._task: Optional[asyncio.Task] = None
+        self.active = False
+        self.unsupported = False
+        self.changes = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="change-stream-sync")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(self.collections)}}},
+            # Only the collection name is needed (and _id, the resume token)
+            {"$project": {"ns": 1}},
+        ]
+        backoff = 1.0
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    self.active = True
+                    backoff = 1.0
+                    async for change in stream:
+                        self.changes += 1
+                        self.versions.bump(change["ns"]["coll"])
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED_CODES:
+                    self.active = False
+                    self.unsupported = True
+                    logger.warning(f"Change streams unavailable, cross-worker cache sync is off: {e}")
+                    return
+                logger.error(f"Change stream failed: {e}")
+            except asyncio.CancelledError:
+                self.active = False
+                raise
+            except Exception as e:
+                logger.error(f"Change stream failed: {e}")
+            self.active = False
+            self.restarts += 1
+            self.versions.bump(*self.collections)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "unsupported": self.unsupported,
+            "collections": list(self.collections),
+            "changes": self.changes,
+            "restarts": self.restarts,
+        }
@@ -0,0 +1,253 @@
+"""
+Negotiated compression of API responses.
+
+CompressionMiddleware compresses /api/ responses with brotli or gzip,
+whichever the client's Accept-Encoding prefers and is available (brotli
+comes from the brotli package in requirements.txt; without it only gzip
+is offered). It is plain ASGI, so it works on streamed responses too:
+each chunk of the export stream is compressed and flushed as it is
+produced, and nothing is buffered beyond the first chunk.
+
+Not compressed: bodies below COMPRESSION_MIN_BYTES (the header overhead and
+CPU aren't worth it), 304s and other bodiless responses, HEAD requests,
+responses that already have a Content-Encoding (the export's own gzip),
+Server-Sent Events (compressors buffer, which would delay events) and
+content types that don't compress well.
+
+Compressed responses turn a strong ETag into a weak one, since the bytes
+differ per encoding; If-None-Match uses the weak comparison (see etags.py)
+so revalidation keeps working.
+
+    COMPRESSION_ENABLED         true
+    COMPRESSION_MIN_BYTES       1024
+    COMPRESSION_GZIP_LEVEL      6
+    COMPRESSION_BROTLI_QUALITY  4
+
+Per-route counters (bytes in and out, ratio and the CPU time spent
+compressing) are kept for /api/stats/compression, to tune the levels.
+"""
+
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from routing import route_label
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """br or gzip, by the client's q-values (br first on a tie), or None"""
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        qualities[coding.strip().lower()] = quality
+    candidates = [("gzip", qualities.get("gzip", qualities.get("*", 0.0)))]
+    if brotli is not None:
+        candidates.insert(0, ("br", qualities.get("br", qualities.get("*", 0.0))))
+    encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if quality > 0 else None
+
+
+class Compressor:
+    """One streaming gzip or brotli compressor"""
+
+    def __init__(self, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        # Flushing emits everything compressed so far, so a streamed chunk reaches the client now
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionStats:
+    """Per-route compression counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, encoding: Optional[str], bytes_in: int, bytes_out: int, cpu_seconds: float) -> None:
+        with self._lock:
+            entry = self.routes.setdefault(route, {
+                "responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "cpu_ms": 0.0, "encodings": {},
+            })
+            entry["responses"] += 1
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+            if encoding:
+                entry["compressed"] += 1
+                entry["cpu_ms"] += cpu_seconds * 1000
+                entry["encodings"][encoding] = entry["encodings"].get(encoding, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, entry in sorted(self.routes.items()):
+                routes[route] = {
+                    **entry,
+                    "encodings": dict(entry["encodings"]),
+                    "ratio": round(entry["bytes_out"] / entry["bytes_in"], 4) if entry["bytes_in"] else None,
+                    "cpu_ms": round(entry["cpu_ms"], 3),
+                    "cpu_us_per_kb": round(entry["cpu_ms"] * 1000 / (entry["bytes_in"] / 1024), 2) if entry["bytes_in"] else None,
+                }
+            return {
+                "enabled": COMPRESSION_ENABLED,
+                "min_bytes": MIN_BYTES,
+                "gzip_level": GZIP_LEVEL,
+                "brotli_quality": BROTLI_QUALITY if brotli is not None else None,
+                "routes": routes,
+            }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        prefix: str = "/api/",
+        minimum_size: int = MIN_BYTES,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+        stats: CompressionStats = compression_stats,
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingSender(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingSender:
+    """Wraps send() for one response: decides on the first body message, then compresses or passes through"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, send: Send, encoding: str):
+        self.middleware = middleware
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu = 0.0
+
+    def _skip(self, start: Message) -> bool:
+        headers = Headers(raw=start["headers"])
+        content_type = headers.get("content-type", "")
+        return (
+            start["status"] < 200 or start["status"] in (204, 304)
+            or "content-encoding" in headers
+            or "no-transform" in headers.get("cache-control", "")
+            or content_type.startswith(UNCOMPRESSED_TYPES)
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+        )
+
+    def _compress(self, data: bytes, flush: bool = False, finish: bool = False) -> bytes:
+        started = time.thread_time()
+        out = self.compressor.compress(data, flush=flush) if data or flush else b""
+        if finish:
+            out += self.compressor.finish()
+        self.cpu += time.thread_time() - started
+        return out
+
+    def _start_compressed(self) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["content-length"]
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        self.compressor = Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+
+    def _record(self) -> None:
+        self.middleware.stats.record(
+            route_label(self.scope, self.middleware.prefix), self.encoding if self.compressor else None, self.bytes_in, self.bytes_out, self.cpu
+        )
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            if self._skip(message):
+                self.passthrough = True
+                await self._send(message)
+            else:
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self.bytes_in += len(body)
+        if self.compressor is None:
+            # First body message: a whole response below the threshold goes out as it is
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                self.bytes_out += len(body)
+                self._record()
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self._start_compressed()
+            data = self._compress(body, flush=more_body, finish=not more_body)
+            if not more_body:
+                MutableHeaders(raw=self.start["headers"])["Content-Length"] = str(len(data))
+            await self._send(self.start)
+        else:
+            data = self._compress(body, flush=more_body, finish=not more_body)
+        self.bytes_out += len(data)
+        if not more_body:
+            self._record()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
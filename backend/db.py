@@ -0,0 +1,226 @@
+"""
+MongoDB client lifecycle, pool settings and readiness.
+
+The client is created by the app lifespan (MongoConnection.connect), which
+also warms the pool up before the first request, and closed on shutdown;
+nothing connects at import time, so each worker process builds its own
+pool after it starts. MONGO_URL and DB_NAME select the database; pool size
+and timeouts also come from the environment:
+
+    MONGO_MAX_POOL_SIZE                 100
+    MONGO_MIN_POOL_SIZE                 0
+    MONGO_MAX_IDLE_TIME_MS              (driver default: no limit)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         (driver default: no limit)
+    MONGO_CONNECT_TIMEOUT_MS            (driver default: 20000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   (driver default: 30000)
+    MONGO_SOCKET_TIMEOUT_MS             (driver default: no limit)
+
+Readiness probes share one cached ping (READINESS_CACHE_SECONDS), so
+probing the API every second doesn't turn into a command per probe.
+
+PoolMonitor records how long operations wait to check a connection out of
+the pool. A steadily growing wait means the pool is too small for the load.
+Command durations are recorded for /metrics (see metrics.py), and slow
+commands for the slow-query log when it is on (see profiling.py).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+from metrics import METRICS_ENABLED, command_metrics
+from profiling import slow_query_log
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+PING_TIMEOUT_SECONDS = float(os.getenv("MONGO_PING_TIMEOUT_SECONDS", "2"))
+
+# Upper bounds (ms) of the checkout wait histogram
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_POOL_OPTIONS = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+    "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+}
+
+
+def pool_settings() -> Dict[str, int]:
+    """Client options set in the environment; the rest keep the driver defaults"""
+    settings = {"maxPoolSize": 100, "minPoolSize": 0}
+    for option, variable in _POOL_OPTIONS.items():
+        value = os.getenv(variable)
+        if value:
+            settings[option] = int(value)
+    return settings
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Checkout wait times and connection counts of the client's pools.
+
+    The driver reports checkout start and completion as separate events
+    from whichever thread does the checkout (Motor runs the driver in a
+    thread pool), so the start time is kept in a thread-local and paired
+    up on completion.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.checked_out = 0
+        self.connections_open = 0
+        self.pool_clears = 0
+
+    def _waited_ms(self) -> Optional[float]:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return None if started is None else (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited_ms()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            if waited is not None:
+                self.wait_total_ms += waited
+                self.wait_max_ms = max(self.wait_max_ms, waited)
+                index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited <= bound), len(WAIT_BUCKETS_MS))
+                self.wait_buckets[index] += 1
+
+    def connection_check_out_failed(self, event):
+        self._waited_ms()
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            histogram[f"gt_{WAIT_BUCKETS_MS[-1]}ms"] = self.wait_buckets[-1]
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checked_out": self.checked_out,
+                "connections_open": self.connections_open,
+                "pool_clears": self.pool_clears,
+                "wait_avg_ms": self.wait_total_ms / self.checkouts if self.checkouts else 0.0,
+                "wait_max_ms": self.wait_max_ms,
+                "wait_histogram": histogram,
+            }
+
+
+class MongoConnection:
+    """Owns the Motor client: created on startup, warmed up, closed on shutdown"""
+
+    def __init__(self, url: Optional[str] = None, db_name: Optional[str] = None):
+        self.url = url
+        self.db_name = db_name
+        self.settings: Dict[str, int] = {}
+        self.pool_monitor = PoolMonitor()
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._ready: Optional[bool] = None
+        self._ready_error: Optional[str] = None
+        self._checked_at = 0.0
+        self._ping_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        if self.client is None:
+            raise RuntimeError("MongoDB client is not connected")
+        return self.client[self.db_name]
+
+    def connect(self) -> AsyncIOMotorDatabase:
+        # Settings are read here rather than at import so .env has been loaded
+        if self.client is None:
+            self.url = self.url or os.getenv("MONGO_URL", "mongodb://localhost:27017")
+            self.db_name = self.db_name or os.getenv("DB_NAME", "nbntracker")
+            self.settings = pool_settings()
+            listeners = [self.pool_monitor]
+            if METRICS_ENABLED:
+                listeners.append(command_metrics)
+            if slow_query_log is not None:
+                listeners.append(slow_query_log)
+            self.client = AsyncIOMotorClient(self.url, event_listeners=listeners, **self.settings)
+        return self.db
+
+    async def warm_up(self) -> None:
+        """Open up to minPoolSize connections (at least one) before serving"""
+        connections = max(self.settings.get("minPoolSize", 0), 1)
+        await asyncio.gather(*(self.db.command("ping") for _ in range(connections)))
+        self._record(True, None)
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self._ready = None
+
+    def _record(self, ready: bool, error: Optional[str]) -> None:
+        self._ready, self._ready_error, self._checked_at = ready, error, time.monotonic()
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Cached result of a ping; concurrent probes wait for the same ping"""
+        if self._ping_lock is None:
+            self._ping_lock = asyncio.Lock()
+        async with self._ping_lock:
+            age = time.monotonic() - self._checked_at
+            if self._ready is None or age > READINESS_CACHE_SECONDS:
+                try:
+                    await asyncio.wait_for(self.db.command("ping"), timeout=PING_TIMEOUT_SECONDS)
+                    self._record(True, None)
+                except Exception as e:
+                    self._record(False, str(e) or type(e).__name__)
+                age = 0.0
+        result = {"ready": self._ready, "checked_seconds_ago": round(age, 3)}
+        if self._ready_error:
+            result["error"] = self._ready_error
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"settings": self.settings, **self.pool_monitor.stats()}
+
+
+mongo = MongoConnection()
@@ -0,0 +1,141 @@
+"""
+Strong ETags and If-None-Match handling for read endpoints.
+
+An ETag is derived from the change versions of the collections a resource
+is read from, plus the request variant (query string). The versions are
+the in-process change_versions counters (see cache.py): every write
+through this process bumps them via record_change(), and with several
+workers ChangeStreamSync (change_sync.py) bumps them for writes made
+through the others. Computing or checking a tag touches no database, so a
+matching If-None-Match gets a 304 straight away.
+
+Counters are per process, so tags also carry an id of the process that
+made them: a tag from another worker (or from before a restart) never
+matches and costs a full response, never a wrong 304. The trade-off is
+staleness: a write through another worker is only seen once its change
+event arrives, usually within milliseconds, and until then this worker
+can still answer 304 for the old data.
+
+Without a running change stream (CHANGE_STREAM_SYNC=false, a standalone
+server, or while the stream reconnects) other workers' writes would go
+unseen. Writes then also bump a shared counter in Mongo (the
+change_versions collection, one small document per collection), and tags
+fold it in. It is read at most once per SHARED_VERSIONS_TTL_SECONDS per
+process, which bounds how long another worker's write can go unnoticed.
+
+Responses carry Cache-Control: no-cache, so browsers keep the body and
+revalidate it on every request; time-dependent resources (the dashboard's
+days_until_due, the current period) also fold a time window into the tag
+so they are re-sent at least that often.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from pymongo import UpdateOne
+
+from cache import change_versions
+
+VERSIONS_COLLECTION = "change_versions"
+
+# How long the shared Mongo counters are trusted before they are read again
+SHARED_VERSIONS_TTL_SECONDS = float(os.getenv("SHARED_VERSIONS_TTL_SECONDS", "2"))
+
+# Distinguishes this process's counters from those of other workers and earlier runs
+PROCESS_TAG = uuid.uuid4().hex[:12]
+
+# Upper bound on how long a time-dependent resource's ETag stays valid
+ETAG_WINDOW_SECONDS = int(os.getenv("ETAG_WINDOW_SECONDS", os.getenv("RESULT_CACHE_TTL_SECONDS", "60")))
+
+CACHE_CONTROL = "no-cache"
+
+# The ChangeStreamSync keeping change_versions in step with other workers, if any
+_change_sync = None
+# (read at, {collection: "epoch:version"}) of the shared counters
+_shared: Tuple[float, Dict[str, str]] = (float("-inf"), {})
+
+
+def use_change_stream(change_sync) -> None:
+    """Rely on change_sync (a ChangeStreamSync, or None) for other workers' writes while it runs"""
+    global _change_sync
+    _change_sync = change_sync
+
+
+def _stream_active() -> bool:
+    return _change_sync is not None and _change_sync.active
+
+
+async def record_change(db, *collections: str) -> None:
+    """Bump the versions of collections after a write to them (and the shared ones without a change stream)"""
+    change_versions.bump(*collections)
+    if _stream_active():
+        return
+    await db[VERSIONS_COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": collection},
+            # The epoch keeps tags from matching again if the versions are ever dropped and restart at 1
+            {"$inc": {"version": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+            upsert=True,
+        )
+        for collection in collections
+    ], ordered=False)
+
+
+async def shared_versions(db, collections: Sequence[str]) -> Tuple[str, ...]:
+    """Shared version of each collection, as epoch:version ("0" if never written), cached for a short TTL"""
+    global _shared
+    read_at, versions = _shared
+    if time.monotonic() - read_at > SHARED_VERSIONS_TTL_SECONDS:
+        versions = {doc["_id"]: f"{doc['epoch']}:{doc['version']}" async for doc in db[VERSIONS_COLLECTION].find()}
+        _shared = (time.monotonic(), versions)
+    return tuple(versions.get(collection, "0") for collection in collections)
+
+
+async def current_versions(db, collections: Sequence[str]) -> Tuple[str, ...]:
+    """This process's versions of collections, plus the shared ones when no change stream is running"""
+    versions = (PROCESS_TAG,) + tuple(str(version) for version in change_versions.snapshot(collections))
+    if _stream_active():
+        return versions
+    return versions + await shared_versions(db, collections)
+
+
+def make_etag(scope: str, versions: Iterable[str], variant: str = "", windowed: bool = False) -> str:
+    parts = [scope, ".".join(versions), variant]
+    if windowed:
+        parts.append(str(int(time.time() // ETAG_WINDOW_SECONDS)))
+    digest = hashlib.blake2s("|".join(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists this ETag (or is *)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+async def conditional_get(
+    db,
+    request: Request,
+    scope: str,
+    collections: Tuple[str, ...],
+    windowed: bool = False,
+) -> Tuple[Dict[str, str], Optional[Response]]:
+    """Return the validator headers for a resource, and a 304 if the client already has it.
+
+    The query string is part of the variant, so each filter set of a list
+    endpoint gets its own ETag.
+    """
+    variant = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    etag = make_etag(scope, await current_versions(db, collections), variant, windowed)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
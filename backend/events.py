@@ -0,0 +1,208 @@
+"""
+In-process event bus and Server-Sent Events stream.
+
+Each connected client is a Subscriber with a bounded asyncio.Queue, so an
+idle connection costs one queue and one suspended coroutine. publish()
+never blocks: if a subscriber's queue is full (a slow consumer) it is
+disconnected instead of letting the queue grow or holding up everyone
+else. EventSource reconnects by itself and sends Last-Event-ID, and the
+last EVENT_HISTORY_SIZE events are kept so the missed ones are replayed;
+if they have already been dropped from history the client gets a "reset"
+event and should refetch /api/budgets/status.
+
+A stream never finishes on its own, and on shutdown uvicorn waits for open
+responses (up to GRACEFUL_SHUTDOWN_SECONDS, see serve.py) before the
+lifespan shutdown runs. close_on_shutdown_signal() therefore closes the bus
+as soon as SIGTERM or SIGINT arrives, so streams end at once and their
+clients reconnect to another worker. Streams also end after
+EVENT_STREAM_MAX_SECONDS, as a backstop.
+
+Events are per process. With several workers, each worker's alert monitor
+(see alerts.py) also re-checks on a timer, so clients see writes made
+through other workers after at most that interval.
+"""
+
+import asyncio
+import itertools
+import os
+import signal
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from serialization import dumps
+
+QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "10000"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+STREAM_MAX_SECONDS = float(os.getenv("EVENT_STREAM_MAX_SECONDS", "300"))
+
+# Client reconnect delay hint, in milliseconds
+RETRY_MS = 3000
+
+SHUTDOWN_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+# Event = (id, type, data)
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class Subscriber:
+    def __init__(self, types: Optional[Set[str]] = None):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.types = types
+        self.closed = False
+
+    def wants(self, event_type: str) -> bool:
+        return not self.types or event_type in self.types
+
+
+class EventBus:
+    """Fan-out of events to subscribers with bounded queues and a replay history"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._subscribers: Set[Subscriber] = set()
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._on_subscribe: List = []
+        self.closed = False
+        self.published = 0
+        self.delivered = 0
+        self.disconnected_slow = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def on_subscribe(self, callback) -> None:
+        """Call callback() whenever a client connects"""
+        self._on_subscribe.append(callback)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        event = (next(self._ids), event_type, data)
+        self._history.append(event)
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if not subscriber.wants(event_type):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # Slow consumer: drop it rather than buffer without bound
+                self._drop(subscriber)
+                self.disconnected_slow += 1
+        return event[0]
+
+    def subscribe(self, types: Optional[Set[str]] = None) -> Optional[Subscriber]:
+        """Register a subscriber, or None if the process is at MAX_SUBSCRIBERS or shutting down"""
+        if self.closed or len(self._subscribers) >= MAX_SUBSCRIBERS:
+            return None
+        subscriber = Subscriber(types)
+        self._subscribers.add(subscriber)
+        for callback in self._on_subscribe:
+            callback()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        subscriber.closed = True
+        self._subscribers.discard(subscriber)
+
+    def replay(self, last_event_id: int) -> Optional[List[Event]]:
+        """Events after last_event_id, or None if some of them are no longer kept"""
+        if not self._history or last_event_id >= self._history[-1][0]:
+            return []
+        if last_event_id < self._history[0][0] - 1:
+            return None
+        return [event for event in self._history if event[0] > last_event_id]
+
+    def close(self) -> None:
+        """Ask every open stream to finish and refuse new ones, e.g. on shutdown"""
+        self.closed = True
+        for subscriber in list(self._subscribers):
+            self._drop(subscriber)
+            try:
+                subscriber.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": MAX_SUBSCRIBERS,
+            "queue_size": QUEUE_SIZE,
+            "published": self.published,
+            "delivered": self.delivered,
+            "disconnected_slow": self.disconnected_slow,
+            "history": len(self._history),
+        }
+
+
+def close_on_shutdown_signal(bus: EventBus) -> None:
+    """Close bus when the process is told to stop, before the server's own handler runs.
+
+    Call from the lifespan startup, once the server has installed its signal
+    handlers; they are kept and called after the bus is closed. Does nothing
+    outside the main thread or for signals without a Python handler.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in SHUTDOWN_SIGNALS:
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            # Signal handlers may interrupt the loop mid-step, so the close runs as a callback
+            loop.call_soon_threadsafe(bus.close)
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+def format_event(event: Event) -> bytes:
+    event_id, event_type, data = event
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event_type.encode(), dumps(data))
+
+
+async def sse_stream(bus: EventBus, subscriber: Subscriber, last_event_id: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Encode a subscriber's events as text/event-stream, with heartbeats while idle"""
+    try:
+        yield b"retry: %d\n\n" % RETRY_MS
+        if last_event_id is not None:
+            missed = bus.replay(last_event_id)
+            if missed is None:
+                yield b"event: reset\ndata: {}\n\n"
+            else:
+                for event in missed:
+                    if subscriber.wants(event[1]):
+                        yield format_event(event)
+
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=min(HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                if subscriber.closed:
+                    break
+                # Comment line: keeps proxies from timing out the idle connection
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            yield format_event(event)
+            if subscriber.closed and subscriber.queue.empty():
+                break
+    finally:
+        bus.unsubscribe(subscriber)
+
+
+event_bus = EventBus()
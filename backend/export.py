@@ -0,0 +1,105 @@
+"""
+Streaming data export.
+
+export_stream() is an async generator over Motor cursors that yields CSV or
+NDJSON text in ~64KB chunks as documents arrive, optionally gzip-compressed
+on the fly. Nothing is materialised beyond the current cursor batch, so
+memory stays flat and the first bytes go out as soon as the header is
+written, however many rows there are.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List
+
+# Columns written for each collection, in order
+EXPORT_FIELDS: Dict[str, List[str]] = {
+    "subscriptions": [
+        "id", "name", "cost", "billing_frequency", "next_due_date", "billing_day", "category",
+        "description", "is_active", "created_at", "updated_at",
+    ],
+    "expenses": ["id", "amount", "category", "tags", "notes", "date", "created_at", "updated_at"],
+    "budgets": ["id", "type", "category", "limit", "created_at", "updated_at"],
+}
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH_SIZE = 1000
+
+# Separator for list values (expense tags) inside a single CSV cell
+LIST_SEPARATOR = ";"
+
+
+def csv_columns(collections: Iterable[str]) -> List[str]:
+    """Union of the export columns, prefixed by the collection name column"""
+    columns = ["collection"]
+    for name in collections:
+        for field in EXPORT_FIELDS[name]:
+            if field not in columns:
+                columns.append(field)
+    return columns
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(str(item) for item in value)
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def _text_chunks(db, collections: List[str], fmt: str) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    columns = csv_columns(collections)
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(columns)
+        # Send the header straight away so the client sees the first byte immediately
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    for name in collections:
+        projection = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS[name]}}
+        cursor = db[name].find({}, projection).batch_size(CURSOR_BATCH_SIZE)
+        async for doc in cursor:
+            if fmt == "csv":
+                doc["collection"] = name
+                writer.writerow([_csv_value(doc.get(column)) for column in columns])
+            else:
+                buffer.write(json.dumps({"collection": name, **doc}, default=_json_default))
+                buffer.write("\n")
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def export_stream(db, collections: List[str], fmt: str = "csv", compress: bool = False) -> AsyncIterator[bytes]:
+    """Yield the export of the given collections as encoded (and optionally gzipped) chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    async for text in _text_chunks(db, collections, fmt):
+        data = text.encode("utf-8")
+        if compressor is None:
+            yield data
+        else:
+            # Sync-flush each chunk so compressed bytes reach the client as they are produced
+            yield compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,185 @@
+"""
+Subscription cash-flow forecast.
+
+Every active subscription's billing schedule is expanded over the forecast
+horizon and the charges are summed per month, quarter or year, overall and
+per category.
+
+Occurrence k of a schedule is the anchor date (the subscription's
+next_due_date) moved forward k billing steps, on the subscription's
+billing_day clamped to the last day of the target month. That is the rule
+calculate_next_due_date applies one step at a time, so the forecast and
+the scheduler agree: a subscription billed on the 31st is charged on
+Feb 28 and then on Mar 31 again instead of drifting to the 28th.
+Subscriptions saved before billing_day was kept bill on their
+next_due_date's day.
+
+Expansions depend only on the schedule, so ForecastEngine keeps them in a
+bounded LRU keyed by subscription id, updated_at, anchor, billing day,
+frequency and horizon end; a subscription is only re-expanded after it is edited or
+when the horizon moves into a new month. Aggregation is a few NumPy
+bincounts over the concatenated expansions.
+"""
+
+import calendar
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+GRANULARITIES = ("month", "quarter", "year")
+DEFAULT_FORECAST_MONTHS = 12
+MAX_FORECAST_MONTHS = 120
+
+# Billing step in months per frequency
+FREQUENCY_MONTHS = {"monthly": 1, "yearly": 12}
+BUCKET_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+
+EPOCH = np.datetime64("1970-01-01", "D")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+PROJECTION = {
+    "_id": 0, "id": 1, "cost": 1, "billing_frequency": 1, "next_due_date": 1, "billing_day": 1, "category": 1, "updated_at": 1,
+}
+
+
+def billing_day(subscription: Dict[str, Any]) -> int:
+    """Day of the month a subscription is billed on (before clamping to short months)"""
+    return subscription.get("billing_day") or subscription["next_due_date"].day
+
+
+def add_months(value: datetime, months: int, day: Optional[int] = None) -> datetime:
+    """value moved forward by months, on day (value's own by default) clamped to the target month's last day"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(day or value.day, calendar.monthrange(year, month)[1]))
+
+
+def month_number(value: date) -> int:
+    """Months since 1970-01, so quarters and years align on multiples of 3 and 12"""
+    return (value.year - 1970) * 12 + value.month - 1
+
+
+def expand_schedule(anchor: date, step_months: int, until_month: int, day: Optional[int] = None) -> np.ndarray:
+    """Days since 1970-01-01 of every occurrence from anchor up to (not including) month until_month.
+
+    Occurrences fall on day (the anchor's by default), clamped to each month's length.
+    """
+    first_month = month_number(anchor)
+    if first_month >= until_month:
+        return np.empty(0, dtype=np.int64)
+    months = np.arange(first_month, until_month, step_months, dtype=np.int64)
+    month_starts = months.astype("datetime64[M]").astype("datetime64[D]")
+    month_lengths = ((months + 1).astype("datetime64[M]").astype("datetime64[D]") - month_starts).astype(np.int64)
+    days = np.minimum(day or anchor.day, month_lengths) - 1
+    return (month_starts - EPOCH).astype(np.int64) + days
+
+
+def _bucket_start(bucket_month: int) -> str:
+    return str(np.datetime64(int(bucket_month), "M").astype("datetime64[D]"))
+
+
+class ForecastEngine:
+    """Expands subscription schedules, caching each expansion per subscription"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._expansions: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def expansion(self, subscription: Dict[str, Any], until_month: int) -> np.ndarray:
+        anchor = subscription["next_due_date"]
+        step = FREQUENCY_MONTHS[subscription["billing_frequency"]]
+        day = billing_day(subscription)
+        key = (subscription["id"], subscription.get("updated_at"), anchor, day, step, until_month)
+        days = self._expansions.get(key)
+        if days is not None:
+            self.hits += 1
+            self._expansions.move_to_end(key)
+            return days
+        self.misses += 1
+        days = expand_schedule(anchor, step, until_month, day)
+        self._expansions[key] = days
+        while len(self._expansions) > self.max_entries:
+            self._expansions.popitem(last=False)
+        return days
+
+    def forecast(
+        self,
+        subscriptions: Iterable[Dict[str, Any]],
+        start: date,
+        months: int = DEFAULT_FORECAST_MONTHS,
+        granularity: str = "month",
+    ) -> Dict[str, Any]:
+        """Charges from start up to the end of the months-th calendar month, per bucket"""
+        start_month = month_number(start)
+        until_month = start_month + months
+        start_day = start.toordinal() - EPOCH_ORDINAL
+
+        expansions: List[np.ndarray] = []
+        costs: List[float] = []
+        category_names: Dict[str, int] = {}
+        category_codes: List[int] = []
+        subscription_count = 0
+        for subscription in subscriptions:
+            subscription_count += 1
+            expansions.append(self.expansion(subscription, until_month))
+            costs.append(subscription["cost"])
+            category_codes.append(category_names.setdefault(subscription["category"], len(category_names)))
+
+        bucket_size = BUCKET_MONTHS[granularity]
+        first_bucket = start_month // bucket_size
+        n_buckets = (until_month - 1) // bucket_size - first_bucket + 1
+        lengths = np.fromiter((len(days) for days in expansions), dtype=np.int64, count=len(expansions))
+        if expansions:
+            charge_days = np.concatenate(expansions)
+        else:
+            charge_days = np.empty(0, dtype=np.int64)
+        amounts = np.repeat(np.asarray(costs, dtype=np.float64), lengths)
+        codes = np.repeat(np.asarray(category_codes, dtype=np.int64), lengths)
+        # Overdue occurrences before start are not part of the forecast
+        upcoming = charge_days >= start_day
+        charge_days, amounts, codes = charge_days[upcoming], amounts[upcoming], codes[upcoming]
+        charge_months = (EPOCH + charge_days.astype("timedelta64[D]")).astype("datetime64[M]").astype(np.int64)
+        buckets = charge_months // bucket_size - first_bucket
+
+        totals = np.bincount(buckets, weights=amounts, minlength=n_buckets).astype(np.float64)
+        counts = np.bincount(buckets, minlength=n_buckets)
+        n_categories = len(category_names)
+        grid = np.bincount(
+            buckets * n_categories + codes, weights=amounts, minlength=n_buckets * n_categories
+        ).reshape(n_buckets, n_categories)
+
+        end = np.datetime64(int(until_month), "M").astype("datetime64[D]") - np.timedelta64(1, "D")
+        return {
+            "granularity": granularity,
+            "start": start.isoformat(),
+            "end": str(end),
+            "months": months,
+            "buckets": [_bucket_start((first_bucket + index) * bucket_size) for index in range(n_buckets)],
+            "totals": totals.tolist(),
+            "charge_counts": counts.tolist(),
+            "total": float(totals.sum()),
+            "subscription_count": subscription_count,
+            "series": {name: grid[:, code].tolist() for name, code in sorted(category_names.items())},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._expansions), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+forecast_engine = ForecastEngine(max_entries=int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "50000")))
+
+
+async def subscription_forecast(
+    db,
+    start: date,
+    months: int = DEFAULT_FORECAST_MONTHS,
+    granularity: str = "month",
+) -> Dict[str, Any]:
+    subscriptions = await db.subscriptions.find({"is_active": True}, PROJECTION).to_list(length=None)
+    return forecast_engine.forecast(subscriptions, start, months, granularity)
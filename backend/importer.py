@@ -0,0 +1,170 @@
+"""
+Bulk expense import.
+
+import_expenses() consumes a request body as it streams in, splits it into
+CSV records or NDJSON lines, validates each row and writes valid rows with
+insert_many(ordered=False) in batches. A bad row is reported with its row
+number and never aborts the rest of the import. Rollups (and, through
+on_batch, caches) are updated once per written batch.
+
+CSV input needs a header row; recognised columns are amount, category, tags
+(separated by ";"), notes and date, and other columns are ignored. A file
+produced by the CSV export can be fed back in directly: when it has a
+collection column, only the expense rows are imported.
+"""
+
+import codecs
+import csv
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from export import LIST_SEPARATOR
+from rollups import apply_deltas, expense_deltas
+
+FORMATS = ("csv", "ndjson")
+DEFAULT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500"))
+MAX_BATCH_SIZE = 10000
+
+# Only this many row errors are returned; the total is always in "failed"
+MAX_REPORTED_ERRORS = 1000
+
+CSV_COLUMNS = ("amount", "category", "tags", "notes", "date")
+
+
+def _format_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}" for err in error.errors()
+        )
+    return str(error)
+
+
+async def _records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[str]:
+    """Yield complete records: lines, or CSV records spanning quoted newlines"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    partial = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if fmt == "csv":
+                # An odd number of quotes so far means the newline is inside a field
+                partial += line + "\n"
+                if partial.count('"') % 2:
+                    continue
+                line, partial = partial, ""
+            yield line
+    pending = partial + pending + decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending
+
+
+def _csv_row(header: List[str], record: str) -> Optional[Dict[str, Any]]:
+    values = next(csv.reader([record]), [])
+    row = dict(zip(header, values))
+    if "collection" in row and row["collection"] != "expenses":
+        return None
+    parsed: Dict[str, Any] = {}
+    for column in CSV_COLUMNS:
+        value = row.get(column, "")
+        if value == "":
+            continue
+        if column == "tags":
+            parsed[column] = [tag for tag in value.split(LIST_SEPARATOR) if tag]
+        else:
+            parsed[column] = value
+    return parsed
+
+
+async def _rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, raw row or exception) pairs; row numbers start at 1"""
+    header: Optional[List[str]] = None
+    row_number = 0
+    async for record in _records(chunks, fmt):
+        if not record.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = [column.strip().lower() for column in next(csv.reader([record]))]
+            continue
+        row_number += 1
+        try:
+            if fmt == "csv":
+                row = _csv_row(header, record)
+                if row is None:
+                    continue
+            else:
+                row = json.loads(record)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+        except (ValueError, csv.Error) as e:
+            row = e
+        yield row_number, row
+
+
+async def _write_batch(db, batch: List[Tuple[int, Dict[str, Any]]], result: Dict[str, Any]) -> None:
+    documents = [document for _, document in batch]
+    failed_indexes = set()
+    try:
+        await db.expenses.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            failed_indexes.add(write_error["index"])
+            _record_error(result, batch[write_error["index"]][0], write_error.get("errmsg", "write failed"))
+
+    written = [document for index, document in enumerate(documents) if index not in failed_indexes]
+    result["inserted"] += len(written)
+    # One rollup update per batch rather than per row
+    deltas = []
+    for document in written:
+        deltas.extend(expense_deltas(document, 1))
+    await apply_deltas(db, deltas)
+
+
+def _record_error(result: Dict[str, Any], row_number: int, message: str) -> None:
+    result["failed"] += 1
+    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+        result["errors"].append({"row": row_number, "error": message})
+
+
+async def import_expenses(
+    db,
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    build_document: Callable[[Dict[str, Any]], Dict[str, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_batch: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """Validate and insert streamed expense rows.
+
+    build_document turns a raw row into the expense document to insert and
+    raises ValidationError/ValueError for invalid rows. on_batch is awaited
+    once after each written batch (e.g. to invalidate caches).
+    """
+    result: Dict[str, Any] = {"inserted": 0, "failed": 0, "errors": []}
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    async for row_number, row in _rows(chunks, fmt):
+        if isinstance(row, Exception):
+            _record_error(result, row_number, _format_error(row))
+            continue
+        try:
+            batch.append((row_number, build_document(row)))
+        except (ValidationError, ValueError, TypeError) as e:
+            _record_error(result, row_number, _format_error(e))
+            continue
+        if len(batch) >= batch_size:
+            await _write_batch(db, batch, result)
+            if on_batch:
+                await on_batch()
+            batch = []
+
+    if batch:
+        await _write_batch(db, batch, result)
+        if on_batch:
+            await on_batch()
+    return result
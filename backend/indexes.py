@@ -0,0 +1,190 @@
+"""
+Index management for the NBNTracker collections.
+
+The indexes every query in server.py relies on are declared once in
+INDEX_SPECS. ensure_indexes() reconciles them against the live database:
+missing indexes are created, and indexes whose definition drifted from the
+declaration (or that nobody declared) are logged. It runs from the app
+lifespan hook, and can be run ahead of a deploy from the command line:
+
+    python indexes.py            # create missing indexes
+    python indexes.py --check    # report drift only, change nothing
+    python indexes.py --repair   # also rebuild indexes that drifted
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Options that change what an index is; anything else reported by
+# list_indexes() (v, ns, background, ...) is ignored when comparing.
+SIGNIFICANT_OPTIONS = (
+    "unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights", "default_language",
+)
+
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "expenses": [
+        # find_one / update_one / delete_one by id
+        {"name": "id_unique", "keys": [("id", ASCENDING)], "unique": True},
+        # GET /api/expenses keyset pages on (date, id), and date ranges
+        {"name": "date_desc_id_desc", "keys": [("date", DESCENDING), ("id", DESCENDING)]},
+        # GET /api/expenses?category=... keyset pages
+        {
+            "name": "category_date_desc_id_desc",
+            "keys": [("category", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)],
+        },
+        # GET /api/expenses?tags=... (multikey; $all is bounded by its first tag)
+        {"name": "tags_date_desc_id_desc", "keys": [("tags", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)]},
+        # GET /api/expenses/search; a tag match ranks above a word in the notes
+        {
+            "name": "notes_tags_text",
+            "keys": [("notes", TEXT), ("tags", TEXT)],
+            "weights": {"notes": 1, "tags": 2},
+            "default_language": "english",
+        },
+    ],
+    "subscriptions": [
+        {"name": "id_unique", "keys": [("id", ASCENDING)], "unique": True},
+        # Active subscriptions ordered by when they are due
+        {
+            "name": "active_next_due_date",
+            "keys": [("next_due_date", ASCENDING)],
+            "partialFilterExpression": {"is_active": True},
+        },
+    ],
+    "budgets": [
+        {"name": "id_unique", "keys": [("id", ASCENDING)], "unique": True},
+    ],
+    "spending_rollups": [
+        # Dashboard and analytics read one period over a date range
+        {"name": "period_bucket_start", "keys": [("period", ASCENDING), ("bucket_start", ASCENDING)]},
+    ],
+}
+
+
+def _declared_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: spec[key] for key in SIGNIFICANT_OPTIONS if key in spec}
+
+
+def _live_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: info[key] for key in SIGNIFICANT_OPTIONS if key in info}
+
+
+def _declared_keys(spec: Dict[str, Any]) -> List[tuple]:
+    # Text fields are stored as one _fts/_ftsx pair, in no particular order
+    keys, text_fields = [], sorted(field for field, direction in spec["keys"] if direction == TEXT)
+    for field, direction in spec["keys"]:
+        if direction != TEXT:
+            keys.append((field, direction))
+        elif ("$text", text_fields) not in keys:
+            keys.append(("$text", text_fields))
+    return keys
+
+
+def _live_keys(info: Dict[str, Any]) -> List[tuple]:
+    keys = []
+    for field, direction in info["key"].items():
+        if field == "_fts":
+            keys.append(("$text", sorted(info.get("weights", {}))))
+        elif field != "_ftsx":
+            # Key directions come back as ints or floats depending on the server version
+            keys.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return keys
+
+
+async def ensure_indexes(db, repair: bool = False, dry_run: bool = False) -> Dict[str, List[str]]:
+    """Create missing indexes and report drift against INDEX_SPECS.
+
+    Returns a report of index names per outcome ("created", "rebuilt",
+    "missing", "drifted", "undeclared", "failed"), each prefixed by its
+    collection. With dry_run nothing is changed and missing indexes are
+    only reported.
+    """
+    report: Dict[str, List[str]] = {
+        "created": [], "rebuilt": [], "missing": [], "drifted": [], "undeclared": [], "failed": []
+    }
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        live = {}
+        async for info in collection.list_indexes():
+            live[info["name"]] = info
+
+        for spec in specs:
+            name = spec["name"]
+            qualified = f"{collection_name}.{name}"
+            options = _declared_options(spec)
+            existing = live.pop(name, None)
+
+            if existing is not None:
+                if _live_keys(existing) == _declared_keys(spec) and _live_options(existing) == options:
+                    continue
+                report["drifted"].append(qualified)
+                logger.warning(
+                    "Index %s drifted: declared keys=%s options=%s, live keys=%s options=%s",
+                    qualified, spec["keys"], options, _live_keys(existing), _live_options(existing),
+                )
+                if not repair or dry_run:
+                    continue
+                await collection.drop_index(name)
+
+            if dry_run:
+                if existing is None:
+                    report["missing"].append(qualified)
+                    logger.warning("Index %s is missing", qualified)
+                continue
+
+            try:
+                await collection.create_index(spec["keys"], name=name, **options)
+            except OperationFailure as e:
+                # e.g. duplicate ids prevent building a unique index; leave the
+                # collection usable and surface the problem instead of crashing
+                report["failed"].append(qualified)
+                logger.error("Could not build index %s: %s", qualified, e)
+                continue
+
+            report["rebuilt" if existing is not None else "created"].append(qualified)
+            logger.info("Index %s %s", qualified, "rebuilt" if existing is not None else "created")
+
+        for name in live:
+            if name == "_id_":
+                continue
+            report["undeclared"].append(f"{collection_name}.{name}")
+            logger.warning("Index %s.%s is not declared in INDEX_SPECS", collection_name, name)
+
+    return report
+
+
+async def _main(args) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "nbntracker")]
+    try:
+        report = await ensure_indexes(db, repair=args.repair, dry_run=args.check)
+    finally:
+        client.close()
+
+    for action, names in report.items():
+        for name in names:
+            print(f"{action:>10}  {name}")
+    if args.check:
+        return 1 if report["missing"] or report["drifted"] else 0
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and reconcile NBNTracker MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="report missing or drifted indexes without changing anything")
+    parser.add_argument("--repair", action="store_true", help="drop and rebuild indexes whose definition drifted")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
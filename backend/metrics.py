@@ -0,0 +1,279 @@
+"""
+Prometheus metrics, served in the text exposition format at /metrics.
+
+    nbntracker_http_requests_total{method,route,status}
+    nbntracker_http_request_errors_total{method,route,status}
+    nbntracker_http_request_duration_seconds{method,route}     histogram
+    nbntracker_http_requests_in_progress{method,route}
+    nbntracker_mongo_command_duration_seconds{collection,command}   histogram
+    nbntracker_mongo_command_failures_total{collection,command}
+    nbntracker_mongo_documents_returned{collection,command}    histogram
+    nbntracker_cache_hits_total{cache} / _misses_total / _hit_ratio
+
+Routes are labelled by their path template (/api/expenses/{expense_id}),
+never the raw path, so label sets stay bounded; the frontend build counts
+as "static" and unmatched API paths as "unmatched". Errors are 5xx
+responses and unhandled exceptions.
+
+Recording is a dict lookup, a bisect and a few additions under one
+uncontended lock per metric (Mongo events arrive on the driver's threads),
+so it costs a few microseconds per request. Rendering happens only when
+/metrics is scraped. Metrics are per process: with several workers (see
+serve.py) scrape each one, or accept that a scrape samples one worker.
+
+Set METRICS_ENABLED=false to turn off recording and the endpoint.
+
+This is a small self-contained implementation of the format rather than a
+prometheus_client dependency; the output is what Prometheus expects.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from routing import route_label
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+PREFIX = "nbntracker"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DOCUMENT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = f"{PREFIX}_{name}", help, labels
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = f"{PREFIX}_{name}", help, labels
+        self.buckets = buckets
+        # Per label set: a count per bucket (non-cumulative, plus +Inf), the sum and the count
+        self._values: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        lines = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+http_requests = Counter("http_requests_total", "HTTP responses by route and status", ("method", "route", "status"))
+http_errors = Counter("http_request_errors_total", "HTTP 5xx responses and unhandled exceptions", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "Time to the last response byte", ("method", "route"))
+http_in_progress = Gauge("http_requests_in_progress", "Requests being handled", ("method", "route"))
+mongo_duration = Histogram("mongo_command_duration_seconds", "MongoDB command round trips", ("collection", "command"))
+mongo_failures = Counter("mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command"))
+mongo_documents = Histogram(
+    "mongo_documents_returned", "Documents per find/aggregate/getMore batch", ("collection", "command"), DOCUMENT_BUCKETS
+)
+
+METRICS = (http_requests, http_errors, http_duration, http_in_progress, mongo_duration, mongo_failures, mongo_documents)
+
+# name -> stats() of a cache with hits and misses (see register_cache)
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    _caches[name] = stats
+
+
+def _cache_samples() -> List[str]:
+    lines = []
+    for kind, help in (("hits_total", "Cache hits"), ("misses_total", "Cache misses"), ("hit_ratio", "Hits per lookup")):
+        name = f"{PREFIX}_cache_{kind}"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {'gauge' if kind == 'hit_ratio' else 'counter'}"]
+        for cache, stats in sorted(_caches.items()):
+            values = stats()
+            hits, misses = values.get("hits", 0), values.get("misses", 0)
+            value = {"hits_total": hits, "misses_total": misses}.get(kind, hits / (hits + misses) if hits + misses else 0.0)
+            lines.append(f'{name}{{cache="{_escape(cache)}"}} {_number(value)}')
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    lines.extend(_cache_samples())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Counts, times and tracks in-flight HTTP requests by route"""
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # An exception before the response started counts as the 500 it becomes
+            method = scope["method"]
+            route = route_label(scope, self.prefix)
+            http_requests.inc((method, route, str(status)))
+            http_duration.observe((method, route), time.perf_counter() - started)
+            if status >= 500:
+                http_errors.inc((method, route, str(status)))
+
+
+def track_in_progress(routes: Iterable[Any]) -> None:
+    """Wrap each API route's ASGI app to maintain its in-flight gauge.
+
+    The route of a request is only known once the router has matched it,
+    so the gauge is kept by the route itself rather than the middleware.
+    Call once, after all routes are declared.
+    """
+    for route in routes:
+        app = getattr(route, "app", None)
+        if app is None or not hasattr(route, "endpoint") or getattr(app, "_tracks_in_progress", False):
+            continue
+        route.app = _in_progress_app(app, route.path)
+
+
+def _in_progress_app(app: ASGIApp, path: str) -> ASGIApp:
+    async def tracked(scope: Scope, receive: Receive, send: Send) -> None:
+        labels = (scope["method"], path)
+        http_in_progress.inc(labels)
+        try:
+            await app(scope, receive, send)
+        finally:
+            http_in_progress.dec(labels)
+
+    tracked._tracks_in_progress = True
+    return tracked
+
+
+def command_collection(command_name: str, command: Dict[str, Any]) -> Optional[str]:
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else None
+
+
+def _returned(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("nextBatch" if command_name == "getMore" else "firstBatch")
+        return len(batch) if batch is not None else None
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return None
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Mongo command durations and batch sizes, labelled by collection and command.
+
+    Only started events carry the command (and so the collection); they are
+    matched to their outcome by request id. Commands not aimed at a
+    collection (ping, hello, db-wide aggregates) are ignored.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+
+    def started(self, event):
+        collection = command_collection(event.command_name, event.command)
+        if collection is not None:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is None:
+            return
+        mongo_duration.observe(labels, event.duration_micros / 1_000_000)
+        returned = _returned(event.command_name, event.reply)
+        if returned is not None:
+            mongo_documents.observe(labels, returned)
+
+    def failed(self, event):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is None:
+            return
+        mongo_duration.observe(labels, event.duration_micros / 1_000_000)
+        mongo_failures.inc(labels)
+
+
+command_metrics = CommandMetrics()
@@ -0,0 +1,54 @@
+"""
+Keyset (cursor) pagination helpers.
+
+List endpoints sort by (date desc, id desc), which is backed by an index, and
+hand out an opaque cursor holding the (date, id) of the last row returned.
+The next page is "everything strictly after that key", so fetching page 1000
+costs the same as page 1 (no skip), and rows inserted between requests can
+never shift a page boundary or show up twice.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Sort order that every cursor is relative to
+SORT = [("date", -1), ("id", -1)]
+
+# Largest page a list endpoint hands out; larger reads go through the export
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+
+def encode_cursor(date: datetime, doc_id: str) -> str:
+    raw = json.dumps([date.isoformat(), doc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict a query to rows that sort after the cursor position"""
+    if not cursor:
+        return query
+    date, doc_id = decode_cursor(cursor)
+    keyset = {"$or": [{"date": {"$lt": date}}, {"date": date, "id": {"$lt": doc_id}}]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+def next_cursor(docs: List[Dict[str, Any]], limit: int) -> Optional[str]:
+    """Cursor for the page after docs, which was fetched with limit + 1 rows"""
+    if len(docs) <= limit:
+        return None
+    last = docs[limit - 1]
+    return encode_cursor(last["date"], last["id"])
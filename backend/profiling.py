@@ -0,0 +1,345 @@
+"""
+Opt-in request profiling and a slow-query log.
+
+Request profiler: with PROFILING_TOKEN set, a request carrying that token
+in an X-Profile-Token header (or a ?profile=<token> query parameter) is
+profiled on its own. The response gets an X-Profile-Id header, and the
+profile is kept in memory (the last PROFILE_HISTORY of them) to be read
+from /api/debug/profiles/{id}. pyinstrument is used when it is installed
+(it is in requirements.txt): a sampling profiler that follows the request
+across awaits and renders an HTML call tree. Without it cProfile is the
+fallback, and a warning is logged at startup: it records every call on
+the event loop thread while the request runs, so concurrent requests show
+up in it too. One request is profiled at a time; others asking meanwhile
+get X-Profile-Id: busy.
+
+Slow-query log: with SLOW_QUERY_MS set, every Mongo command on a
+collection that takes longer is logged and kept (the last
+SLOW_QUERY_HISTORY of them) with its filter shape: the query with values
+replaced by their types, so it groups alike queries and carries no user
+data. The first time a shape is seen it is explained (queryPlanner
+verbosity, which plans but doesn't run the query) and the winning plan is
+summarised: its stages, the indexes used and whether it scans the whole
+collection.
+
+With neither variable set, nothing is installed: no middleware, no command
+listener, no per-request or per-command work.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import command_collection
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - optional
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.001"))
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_HISTORY = int(os.getenv("SLOW_QUERY_HISTORY", "200"))
+MAX_EXPLAINED_SHAPES = 500
+
+# Commands explain() accepts, and where their query is
+SHAPE_FIELDS = {
+    "find": ("filter", "sort"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+# Session and transport fields that explain() rejects
+UNEXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def authorized(headers: Headers, query_string: bytes) -> bool:
+    """True if the request carries the profiling token"""
+    if not PROFILING_TOKEN:
+        return False
+    token = headers.get("x-profile-token")
+    if token is None and b"profile=" in query_string:
+        token = parse_qs(query_string.decode("latin-1")).get("profile", [None])[0]
+    return token is not None and hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+
+class ProfileStore:
+    """The last few request profiles, by id"""
+
+    def __init__(self, max_entries: int = PROFILE_HISTORY):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        self._profiles[profile["id"]] = profile
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(profile_id)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        return [
+            {key: value for key, value in profile.items() if key not in ("html", "text")}
+            for profile in reversed(self._profiles.values())
+        ]
+
+
+profile_store = ProfileStore()
+
+
+class _RequestProfile:
+    """pyinstrument when available, cProfile otherwise"""
+
+    def __init__(self):
+        self.engine = "pyinstrument" if Profiler is not None else "cprofile"
+        if Profiler is not None:
+            self._profiler = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> Dict[str, Optional[str]]:
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+            return {"html": self._profiler.output_html(), "text": self._profiler.output_text(unicode=True)}
+        self._profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        return {"html": None, "text": out.getvalue()}
+
+
+class ProfilerMiddleware:
+    """Profiles requests that carry the profiling token; passes everything else straight through"""
+
+    def __init__(self, app: ASGIApp, store: ProfileStore = profile_store, skip_prefix: str = "/api/debug/"):
+        self.app = app
+        self.store = store
+        self.skip_prefix = skip_prefix
+        self._busy = False
+        if Profiler is None:
+            logger.warning(
+                "pyinstrument is not installed: request profiles fall back to cProfile, "
+                "which traces the whole event loop and includes concurrent requests"
+            )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.skip_prefix)
+            or not authorized(Headers(scope=scope), scope.get("query_string", b""))
+        ):
+            await self.app(scope, receive, send)
+            return
+        if self._busy:
+            await self.app(scope, receive, self._with_header(send, "busy"))
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        profile = _RequestProfile()
+        self._busy = True
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await self._with_header(send, profile_id)(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            output = profile.stop()
+            self._busy = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.store.add({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "duration_ms": round(duration_ms, 3),
+                "engine": profile.engine,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                **output,
+            })
+            logger.info(f"Profiled {scope['method']} {scope['path']} in {duration_ms:.0f} ms as {profile_id}")
+
+    @staticmethod
+    def _with_header(send: Send, value: str) -> Send:
+        async def wrapped(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["X-Profile-Id"] = value
+            await send(message)
+        return wrapped
+
+
+def query_shape(value: Any) -> Any:
+    """value with every literal replaced by its type name; lists by the shape of their first item"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(value[0])] if value else []
+    return type(value).__name__
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    fields = SHAPE_FIELDS.get(command_name)
+    if not fields:
+        return None
+    return {field: query_shape(command[field]) for field in fields if field in command}
+
+
+def _plan_stages(plan: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Stage names (top down) and index names of a winning plan tree"""
+    stages, indexes = [], []
+    pending = [plan.get("queryPlan", plan)]
+    while pending:
+        node = pending.pop(0)
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages, indexes
+
+
+def plan_summary(explained: Dict[str, Any]) -> Dict[str, Any]:
+    """The winning plan of an explain() result, in brief"""
+    planner = explained.get("queryPlanner")
+    if planner is None:
+        # Aggregations put the query's plan in their first ($cursor) stage
+        for stage in explained.get("stages", []):
+            planner = stage.get("$cursor", {}).get("queryPlanner")
+            if planner:
+                break
+    if not planner:
+        return {"plan": None}
+    stages, indexes = _plan_stages(planner.get("winningPlan", {}))
+    return {
+        "plan": " <- ".join(stages),
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+        "rejected_plans": len(planner.get("rejectedPlans", [])),
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Records Mongo commands slower than a threshold, with filter shape and plan summary.
+
+    Command events arrive on the driver's threads; only started() carries the
+    command, so it is kept by request id until the command finishes. Explains
+    run on the event loop (attach() gives the client and loop to use).
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, history: int = SLOW_QUERY_HISTORY):
+        self.threshold_micros = threshold_ms * 1000
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self._plans: Dict[str, Any] = {}
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.slow = 0
+
+    def attach(self, client) -> None:
+        """Run explains through this client on the current event loop"""
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+
+    def started(self, event):
+        collection = command_collection(event.command_name, event.command)
+        if collection is not None:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command)
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "")) if isinstance(event.failure, dict) else str(event.failure))
+
+    def _finish(self, event, error: Optional[str]) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_micros:
+            return
+        collection, command = pending
+        shape = command_shape(event.command_name, command)
+        shape_key = json.dumps([collection, event.command_name, shape], sort_keys=True)
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "collection": collection,
+            "command": event.command_name,
+            "duration_ms": event.duration_micros / 1000,
+            "shape": shape,
+            "explain": self._plans.get(shape_key),
+        }
+        if error is not None:
+            entry["error"] = error
+        self.slow += 1
+        self.entries.append(entry)
+        logger.warning(
+            f"Slow {event.command_name} on {collection}: {entry['duration_ms']:.0f} ms, "
+            f"shape {json.dumps(shape, sort_keys=True)}"
+        )
+        if shape is not None and shape_key not in self._plans:
+            self._explain_later(shape_key, event.database_name, command, entry)
+
+    def _explain_later(self, shape_key: str, database: str, command: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        if self._client is None or self._loop is None or self._loop.is_closed():
+            return
+        if len(self._plans) >= MAX_EXPLAINED_SHAPES:
+            self._plans.clear()
+        # Explain each shape once, even if it is slow again before the explain finishes
+        self._plans[shape_key] = None
+        explainable = {key: value for key, value in command.items() if not key.startswith("$") and key not in UNEXPLAINABLE_FIELDS}
+
+        async def explain():
+            try:
+                explained = await self._client[database].command({"explain": explainable, "verbosity": "queryPlanner"})
+                summary = plan_summary(explained)
+            except Exception as e:
+                summary = {"plan": None, "error": str(e)}
+            self._plans[shape_key] = summary
+            entry["explain"] = summary
+
+        asyncio.run_coroutine_threadsafe(explain(), self._loop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_micros / 1000,
+            "slow": self.slow,
+            "entries": list(reversed(self.entries)),
+        }
+
+
+slow_query_log = SlowQueryLog() if SLOW_QUERY_MS > 0 else None
@@ -0,0 +1,45 @@
+"""
+Sparse fieldsets for list endpoints.
+
+A fields=id,amount,category,date parameter is turned into a Mongo projection
+(so unrequested fields never leave the database) and, when responses are
+validated, into a slim Pydantic model containing only those fields. Slim
+models are built once per distinct field set and cached.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated field list against a model, keeping model order"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+def projection(fields: Iterable[str] = (), always: Iterable[str] = ()) -> Dict[str, Any]:
+    """Mongo projection for the requested fields (plus any needed internally), without _id.
+
+    With no fields this keeps every field except _id.
+    """
+    spec: Dict[str, Any] = {"_id": 0}
+    for field in (*fields, *always):
+        spec[field] = 1
+    return spec
+
+
+@lru_cache(maxsize=128)
+def slim_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A model with only the given fields of model, same types and defaults"""
+    definitions = {
+        name: (info.annotation, info) for name, info in model.model_fields.items() if name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
@@ -0,0 +1,275 @@
+"""
+Incrementally maintained spending rollups.
+
+Every expense contributes to one per-day and one per-month document in the
+spending_rollups collection, keyed by period, bucket and category:
+
+    {"_id": "month|2026-10|food", "period": "month", "bucket": "2026-10",
+     "bucket_start": datetime(2026, 10, 1), "category": "food",
+     "total": 1520.0, "count": 4}
+
+The expense write handlers turn each change into +/- deltas (the old
+document is read as part of the write) and apply them with $inc upserts in
+a single bulk_write, so each rollup document is updated atomically and the
+dashboard reads O(categories x periods) documents instead of every expense.
+
+If the two ever disagree (a crash between the expense write and the rollup
+write, a manual edit in the shell) the rollups can be recomputed from the
+raw expenses:
+
+    python rollups.py verify     # report mismatches, change nothing
+    python rollups.py rebuild    # recompute and replace all rollups
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "spending_rollups"
+PERIODS = ("day", "month")
+
+# Totals closer than this are considered equal when verifying
+TOLERANCE = 0.005
+
+BUCKET_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def bucket_for(period: str, date: datetime) -> Tuple[str, datetime]:
+    """Return the bucket key and bucket start for a date"""
+    # Mongo stores and $dateToString buckets in UTC, so an aware date is bucketed by its UTC day
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    if period == "day":
+        start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start.strftime(BUCKET_FORMATS[period]), start
+
+
+def rollup_id(period: str, bucket: str, category: str) -> str:
+    return f"{period}|{bucket}|{category}"
+
+
+def expense_deltas(expense: Optional[Dict[str, Any]], sign: int) -> List[Dict[str, Any]]:
+    """Rollup deltas for adding (sign=1) or removing (sign=-1) one expense"""
+    if not expense:
+        return []
+    deltas = []
+    for period in PERIODS:
+        bucket, start = bucket_for(period, expense["date"])
+        deltas.append({
+            "_id": rollup_id(period, bucket, expense["category"]),
+            "period": period,
+            "bucket": bucket,
+            "bucket_start": start,
+            "category": expense["category"],
+            "total": expense["amount"] * sign,
+            "count": sign,
+        })
+    return deltas
+
+
+def combine_deltas(deltas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge deltas that hit the same rollup document and drop no-ops"""
+    combined: Dict[str, Dict[str, Any]] = {}
+    for delta in deltas:
+        current = combined.get(delta["_id"])
+        if current is None:
+            combined[delta["_id"]] = dict(delta)
+        else:
+            current["total"] += delta["total"]
+            current["count"] += delta["count"]
+    return [d for d in combined.values() if d["count"] != 0 or abs(d["total"]) > 1e-9]
+
+
+async def apply_deltas(db, deltas: Iterable[Dict[str, Any]], session=None) -> None:
+    """Apply rollup deltas as one unordered bulk_write of $inc upserts"""
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": delta["_id"]},
+            {
+                "$inc": {"total": delta["total"], "count": delta["count"]},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "period": delta["period"],
+                    "bucket": delta["bucket"],
+                    "bucket_start": delta["bucket_start"],
+                    "category": delta["category"],
+                },
+            },
+            upsert=True,
+        )
+        for delta in combine_deltas(deltas)
+    ]
+    if operations:
+        await db[COLLECTION].bulk_write(operations, ordered=False, session=session)
+
+
+async def record_expense_change(db, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+    """Move an expense's contribution from its old state to its new one.
+
+    Pass old=None for a created expense and new=None for a deleted one.
+    """
+    await apply_deltas(db, expense_deltas(old, -1) + expense_deltas(new, 1))
+
+
+async def grouped_contributions(db, query: Dict[str, Any], session=None) -> List[Dict[str, Any]]:
+    """Sum the expenses matching query per (day, category) for bulk mutations"""
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": BUCKET_FORMATS["day"], "date": "$date"}},
+                "category": "$category",
+            },
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+            "date": {"$min": "$date"},
+        }},
+    ]
+    return [
+        {"category": row["_id"]["category"], "date": row["date"], "total": row["total"], "count": row["count"]}
+        async for row in db.expenses.aggregate(pipeline, allowDiskUse=True, session=session)
+    ]
+
+
+def bulk_change_deltas(groups: List[Dict[str, Any]], changes: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deltas for applying changes (or deleting, with changes=None) to grouped expenses.
+
+    Each group is removed from its rollups and, for an update, re-added under
+    its new category/date with the new total (amount x count if the amount was
+    set).
+    """
+    deltas = []
+    for group in groups:
+        for period in PERIODS:
+            bucket, start = bucket_for(period, group["date"])
+            deltas.append({
+                "_id": rollup_id(period, bucket, group["category"]),
+                "period": period, "bucket": bucket, "bucket_start": start,
+                "category": group["category"], "total": -group["total"], "count": -group["count"],
+            })
+            if changes is None:
+                continue
+            category = changes.get("category", group["category"])
+            bucket, start = bucket_for(period, changes.get("date", group["date"]))
+            total = changes["amount"] * group["count"] if "amount" in changes else group["total"]
+            deltas.append({
+                "_id": rollup_id(period, bucket, category),
+                "period": period, "bucket": bucket, "bucket_start": start,
+                "category": category, "total": total, "count": group["count"],
+            })
+    return deltas
+
+
+async def compute_rollups(db) -> Dict[str, Dict[str, Any]]:
+    """Recompute every rollup document from the raw expenses"""
+    rollups = {}
+    # One pass per period rather than a $facet so large histories can't hit
+    # the 16MB single-document limit
+    for period in PERIODS:
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "bucket": {"$dateToString": {"format": BUCKET_FORMATS[period], "date": "$date"}},
+                    "category": "$category",
+                },
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+                "date": {"$min": "$date"},
+            }},
+        ]
+        async for row in db.expenses.aggregate(pipeline, allowDiskUse=True):
+            bucket, start = bucket_for(period, row["date"])
+            doc_id = rollup_id(period, bucket, row["_id"]["category"])
+            rollups[doc_id] = {
+                "_id": doc_id,
+                "period": period,
+                "bucket": bucket,
+                "bucket_start": start,
+                "category": row["_id"]["category"],
+                "total": row["total"],
+                "count": row["count"],
+            }
+    return rollups
+
+
+async def verify_rollups(db) -> List[Dict[str, Any]]:
+    """Compare stored rollups with a fresh recomputation and list mismatches"""
+    expected = await compute_rollups(db)
+    mismatches = []
+    async for stored in db[COLLECTION].find():
+        want = expected.pop(stored["_id"], None)
+        if want is None:
+            if stored.get("count", 0) != 0 or abs(stored.get("total", 0)) > TOLERANCE:
+                mismatches.append({"id": stored["_id"], "stored": stored, "expected": None})
+        elif stored.get("count") != want["count"] or abs(stored.get("total", 0) - want["total"]) > TOLERANCE:
+            mismatches.append({"id": stored["_id"], "stored": stored, "expected": want})
+    for doc_id, want in expected.items():
+        mismatches.append({"id": doc_id, "stored": None, "expected": want})
+    return mismatches
+
+
+async def rebuild_rollups(db) -> int:
+    """Replace all rollups with a fresh recomputation; returns documents written"""
+    rollups = await compute_rollups(db)
+    now = datetime.utcnow()
+    await db[COLLECTION].delete_many({})
+    if rollups:
+        await db[COLLECTION].insert_many(
+            [{**doc, "updated_at": now} for doc in rollups.values()], ordered=False
+        )
+    return len(rollups)
+
+
+async def ensure_rollups(db) -> None:
+    """Build rollups on first start against a database that predates them"""
+    if await db[COLLECTION].find_one({}, {"_id": 1}) is not None:
+        return
+    if await db.expenses.find_one({}, {"_id": 1}) is None:
+        return
+    logger.info("No spending rollups found, building them from existing expenses")
+    written = await rebuild_rollups(db)
+    logger.info("Built %d spending rollup documents", written)
+
+
+async def _main(args) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "nbntracker")]
+    try:
+        if args.command == "rebuild":
+            written = await rebuild_rollups(db)
+            print(f"Rebuilt {written} rollup documents")
+            return 0
+        mismatches = await verify_rollups(db)
+    finally:
+        client.close()
+
+    for mismatch in mismatches:
+        stored, expected = mismatch["stored"], mismatch["expected"]
+        print(
+            f"{mismatch['id']}: stored "
+            f"{'missing' if stored is None else (stored.get('total'), stored.get('count'))}, expected "
+            f"{'none' if expected is None else (expected['total'], expected['count'])}"
+        )
+    print(f"{len(mismatches)} mismatched rollup documents")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify or rebuild NBNTracker spending rollups")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
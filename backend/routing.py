@@ -0,0 +1,52 @@
+"""
+Route templates of handled requests, for per-route labels.
+
+route_path() gives the path template of the route that served a request
+(/api/expenses/{expense_id}) rather than its raw path, so metrics.py and
+the compression stats keep one entry per route. The router leaves the
+matched endpoint in the scope; its template is found by scanning the route
+table once and cached per endpoint. Misses are cached too: a mounted app
+(the frontend build) is an endpoint without a route of its own, and would
+otherwise scan the whole table on every static request. route_label()
+puts every request without a template under "unmatched" (API paths) or
+"static" (the frontend build), so scanners probing random paths can't
+grow per-route tables.
+"""
+
+from typing import Any, Dict, Optional
+
+from starlette.types import Scope
+
+# endpoint -> path template, or None for endpoints no route declares
+_route_paths: Dict[Any, Optional[str]] = {}
+
+_RAW_PATH = object()
+
+
+def route_path(scope: Scope, default: Any = _RAW_PATH) -> Optional[str]:
+    """The path template of the route that handled a request.
+
+    Falls back to default, or the raw path if none is given.
+    """
+    fallback = scope["path"] if default is _RAW_PATH else default
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return fallback
+    try:
+        path = _route_paths[endpoint]
+    except KeyError:
+        router = scope.get("router")
+        if router is None:
+            return fallback
+        path = _route_paths[endpoint] = next(
+            (route.path for route in router.routes if getattr(route, "endpoint", None) is endpoint), None
+        )
+    return fallback if path is None else path
+
+
+def route_label(scope: Scope, api_prefix: str = "/api/") -> str:
+    """route_path(), with requests no route handled labelled "unmatched" (API paths) or "static\""""
+    route = route_path(scope, default=None)
+    if route is None:
+        route = "unmatched" if scope["path"].startswith(api_prefix) else "static"
+    return route
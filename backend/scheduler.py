@@ -0,0 +1,241 @@
+"""
+Background worker that rolls subscriptions forward.
+
+Started from the app lifespan, the worker wakes every
+SCHEDULER_INTERVAL_SECONDS, reads active subscriptions whose next_due_date
+has passed through the active_next_due_date partial index (oldest first,
+SCHEDULER_BATCH_SIZE at a time) and advances each one past now with
+calculate_next_due_date, keeping it on the subscription's billing_day so
+month-end dates don't drift (see forecast.py). With
+SCHEDULER_MATERIALIZE_EXPENSES=true every passed due date is also recorded
+as an expense (one insert_many per batch, rollups updated once per batch).
+
+Only one process does this at a time: each pass first takes a lease
+document in scheduler_leases, renewed between batches, so with several
+uvicorn workers the others stay idle until the holder stops renewing.
+Charges are still safe if a lease lapses mid-pass: an expense's id is
+derived from the subscription id and due date, so a retried insert hits
+the unique index instead of creating a duplicate, and a subscription is
+only advanced if its next_due_date is still the value that was read.
+
+Batches are separated by a short sleep and each pass is capped, so a large
+backlog is worked off over several passes without holding the event loop.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from etags import record_change
+from forecast import billing_day
+from rollups import apply_deltas, expense_deltas
+
+logger = logging.getLogger(__name__)
+
+LEASES_COLLECTION = "scheduler_leases"
+LEASE_NAME = "subscriptions"
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+MATERIALIZE_EXPENSES = os.getenv("SCHEDULER_MATERIALIZE_EXPENSES", "false").lower() == "true"
+INTERVAL_SECONDS = float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "60"))
+BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+BATCH_PAUSE_SECONDS = float(os.getenv("SCHEDULER_BATCH_PAUSE_SECONDS", "0.05"))
+MAX_BATCHES_PER_PASS = int(os.getenv("SCHEDULER_MAX_BATCHES_PER_PASS", "50"))
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", str(max(INTERVAL_SECONDS * 2, 30))))
+
+# A subscription left untouched for years is caught up over several passes
+MAX_CHARGES_PER_SUBSCRIPTION = 36
+
+# Namespace for the deterministic ids of materialised charges
+CHARGE_NAMESPACE = uuid.UUID("5b0c7a7e-3f0e-4d55-9f57-4d1f2b9a6c10")
+
+DUE_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "cost": 1, "billing_frequency": 1, "next_due_date": 1, "billing_day": 1, "category": 1,
+}
+
+
+def charge_id(subscription_id: str, due: datetime) -> str:
+    """Stable expense id for one charge of a subscription"""
+    return str(uuid.uuid5(CHARGE_NAMESPACE, f"{subscription_id}|{due.isoformat()}"))
+
+
+def due_dates(
+    subscription: Dict[str, Any],
+    now: datetime,
+    next_due_date: Callable[[datetime, str, int], datetime],
+) -> Tuple[List[datetime], datetime]:
+    """Due dates of a subscription that have passed, and its next due date after them"""
+    passed = []
+    due = subscription["next_due_date"]
+    day = billing_day(subscription)
+    while due <= now and len(passed) < MAX_CHARGES_PER_SUBSCRIPTION:
+        passed.append(due)
+        due = next_due_date(due, subscription["billing_frequency"], day)
+    return passed, due
+
+
+class SubscriptionScheduler:
+    """Leased background loop that advances due subscriptions"""
+
+    def __init__(
+        self,
+        db,
+        next_due_date: Callable[[datetime, str, int], datetime],
+        build_charge: Callable[[Dict[str, Any], datetime], Dict[str, Any]],
+        materialize_expenses: bool = MATERIALIZE_EXPENSES,
+    ):
+        self.db = db
+        self.next_due_date = next_due_date
+        self.build_charge = build_charge
+        self.materialize_expenses = materialize_expenses
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.passes = 0
+        self.advanced = 0
+        self.charges = 0
+        self.conflicts = 0
+        self.last_pass_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run(), name="subscription-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=LEASE_SECONDS)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+        try:
+            # Let another worker take over without waiting for the lease to expire
+            await self.db[LEASES_COLLECTION].delete_one({"_id": LEASE_NAME, "owner": self.owner})
+        except Exception as e:
+            logger.warning(f"Could not release scheduler lease: {e}")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.run_pass()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Subscription scheduler pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire_lease(self) -> bool:
+        """Take or renew the lease; False if another process holds it"""
+        now = datetime.utcnow()
+        try:
+            await self.db[LEASES_COLLECTION].find_one_and_update(
+                {"_id": LEASE_NAME, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=LEASE_SECONDS), "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by someone else, so the upsert collided
+            return False
+        return True
+
+    async def run_pass(self) -> Dict[str, int]:
+        """Advance due subscriptions in paced batches while holding the lease"""
+        result = {"advanced": 0, "charges": 0, "conflicts": 0}
+        if not await self.acquire_lease():
+            return result
+        self.passes += 1
+        for _ in range(MAX_BATCHES_PER_PASS):
+            now = datetime.utcnow()
+            due = await self.db.subscriptions.find(
+                {"is_active": True, "next_due_date": {"$lte": now}}, DUE_PROJECTION
+            ).sort("next_due_date", ASCENDING).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+            if not due:
+                break
+            batch = await self.process_batch(due, now)
+            for key in result:
+                result[key] += batch[key]
+            if len(due) < BATCH_SIZE or self._stopping.is_set():
+                break
+            # Yield to request handlers between batches
+            await asyncio.sleep(BATCH_PAUSE_SECONDS)
+            if not await self.acquire_lease():
+                break
+        self.last_pass_at = datetime.utcnow()
+        return result
+
+    async def process_batch(self, subscriptions: List[Dict[str, Any]], now: datetime) -> Dict[str, int]:
+        charges: List[Dict[str, Any]] = []
+        updates = []
+        for subscription in subscriptions:
+            passed, next_due = due_dates(subscription, now, self.next_due_date)
+            if self.materialize_expenses:
+                charges.extend(self.build_charge(subscription, due) for due in passed)
+            # Compare-and-set: skip subscriptions changed since they were read
+            updates.append(UpdateOne(
+                {"id": subscription["id"], "is_active": True, "next_due_date": subscription["next_due_date"]},
+                # Subscriptions saved before billing_day was kept get it stored here
+                {"$set": {"next_due_date": next_due, "billing_day": billing_day(subscription), "updated_at": now}},
+            ))
+
+        # Charges go in first; a retry after a crash then only re-advances
+        inserted = await self._insert_charges(charges) if charges else 0
+        advanced = 0
+        if updates:
+            write = await self.db.subscriptions.bulk_write(updates, ordered=False)
+            advanced = write.modified_count
+        # Only a write that changed something invalidates cached reads
+        if advanced:
+            await record_change(self.db, "subscriptions")
+        if inserted:
+            await record_change(self.db, "expenses")
+
+        conflicts = len(updates) - advanced
+        self.advanced += advanced
+        self.charges += inserted
+        self.conflicts += conflicts
+        return {"advanced": advanced, "charges": inserted, "conflicts": conflicts}
+
+    async def _insert_charges(self, charges: List[Dict[str, Any]]) -> int:
+        failed_indexes = set()
+        try:
+            await self.db.expenses.insert_many(charges, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                # Duplicate ids are charges an earlier pass already recorded
+                if write_error.get("code") != 11000:
+                    logger.error(f"Could not record subscription charge: {write_error.get('errmsg')}")
+                failed_indexes.add(write_error["index"])
+        written = [charge for index, charge in enumerate(charges) if index not in failed_indexes]
+        deltas = []
+        for charge in written:
+            deltas.extend(expense_deltas(charge, 1))
+        await apply_deltas(self.db, deltas)
+        return len(written)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "owner": self.owner,
+            "materialize_expenses": self.materialize_expenses,
+            "interval_seconds": INTERVAL_SECONDS,
+            "batch_size": BATCH_SIZE,
+            "passes": self.passes,
+            "advanced": self.advanced,
+            "charges": self.charges,
+            "conflicts": self.conflicts,
+            "last_pass_at": self.last_pass_at,
+            "last_error": self.last_error,
+        }
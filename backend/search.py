@@ -0,0 +1,79 @@
+"""
+Full-text search over expense notes and tags.
+
+Matching goes through the notes_tags_text index (see indexes.py), so a
+search only reads the expenses that contain the search terms; category,
+date and tag filters are applied to those candidates. Results are ranked
+by text score, highest first, with id as the tie-breaker.
+
+Pages use a keyset cursor on (score, id), like the (date, id) cursor of
+the list endpoint (see pagination.py): the next page is everything ranked
+strictly below the last row returned.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+MAX_QUERY_LENGTH = 200
+
+
+def encode_search_cursor(score: float, doc_id: str) -> str:
+    raw = json.dumps([score, doc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def search_pipeline(
+    text: str,
+    filters: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> List[Dict[str, Any]]:
+    """Aggregation returning limit + 1 ranked matches after the cursor"""
+    pipeline: List[Dict[str, Any]] = [
+        # $text must be in the first stage for the text index to be used
+        {"$match": {"$text": {"$search": text}, **filters}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        score, doc_id = decode_search_cursor(cursor)
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "id": {"$lt": doc_id}}]}})
+    pipeline.append({"$sort": {"score": -1, "id": -1}})
+    pipeline.append({"$limit": limit + 1})
+    if fields:
+        pipeline.append({"$project": {"_id": 0, "score": 1, "id": 1, **{field: 1 for field in fields}}})
+    else:
+        pipeline.append({"$project": {"_id": 0}})
+    return pipeline
+
+
+async def search_expenses(
+    db,
+    text: str,
+    filters: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Ranked expenses matching text and filters, and the cursor of the next page"""
+    docs = await db.expenses.aggregate(search_pipeline(text, filters, limit, cursor, fields)).to_list(length=None)
+    next_page = None
+    if len(docs) > limit:
+        last = docs[limit - 1]
+        next_page = encode_search_cursor(last["score"], last["id"])
+        docs = docs[:limit]
+    for doc in docs:
+        del doc["score"]
+    return docs, next_page
@@ -0,0 +1,66 @@
+"""
+Fast JSON responses for list endpoints.
+
+Documents in our collections are only ever written through our own Pydantic
+models, so list endpoints can trust them and encode the Mongo dicts straight
+to JSON instead of building a model per row and having FastAPI validate and
+serialise it a second time through response_model. orjson is used when it
+is installed (it encodes datetimes natively); otherwise the stdlib json
+encoder is used with the same output format.
+
+Set STRICT_RESPONSE_VALIDATION=true to validate every row through its model
+again, e.g. while debugging a suspected bad document.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from projections import slim_model
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+STRICT_RESPONSE_VALIDATION = os.getenv("STRICT_RESPONSE_VALIDATION", "false").lower() == "true"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def list_response(
+    model: Type[BaseModel],
+    docs: List[Dict[str, Any]],
+    fields: Optional[Tuple[str, ...]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    strict: Optional[bool] = None,
+) -> Response:
+    """Serialise documents fetched without _id, optionally restricted to fields"""
+    if STRICT_RESPONSE_VALIDATION if strict is None else strict:
+        row_model = slim_model(model, fields) if fields else model
+        return FastJSONResponse(content=[row_model(**doc).model_dump(mode="json") for doc in docs], headers=headers)
+    if fields:
+        docs = [{field: doc[field] for field in fields if field in doc} for doc in docs]
+    return FastJSONResponse(content=docs, headers=headers)
@@ -0,0 +1,135 @@
+"""
+Production entry point: several uvicorn workers with tuned startup.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8001]
+
+Worker count defaults to WEB_CONCURRENCY, or one per CPU core. uvloop and
+httptools are used when they are installed (pip install uvloop httptools)
+and fall back to asyncio and h11 otherwise.
+
+One-off startup work runs once here, before the workers start: index
+reconciliation (indexes.py), the initial rollup build (rollups.py) and
+the compressed copies of the frontend build (static_assets.py).
+Workers are then told to skip it, so N workers don't race to build the
+same indexes. Each worker opens its own MongoDB client in the app
+lifespan (see db.py), keeps its caches in sync with the others through a
+change stream (see change_sync.py), and logs how long its startup took.
+
+On SIGTERM/SIGINT uvicorn stops accepting connections and gives in-flight
+requests GRACEFUL_SHUTDOWN_SECONDS to finish before the lifespan shutdown
+stops background tasks and closes the MongoDB client. Event streams are
+ended as soon as the signal arrives (see events.py), so they don't hold
+the drain open; their clients reconnect.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("serve")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def build_config(args) -> Dict[str, Any]:
+    """uvicorn.run() keyword arguments"""
+    loop = args.loop if args.loop != "auto" else ("uvloop" if _installed("uvloop") else "asyncio")
+    http = args.http if args.http != "auto" else ("httptools" if _installed("httptools") else "h11")
+    return {
+        # An import string, so every worker process imports the app itself
+        "app": "server:app",
+        "app_dir": os.path.dirname(os.path.abspath(__file__)),
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        "loop": loop,
+        "http": http,
+        "lifespan": "on",
+        "proxy_headers": True,
+        "forwarded_allow_ips": os.getenv("FORWARDED_ALLOW_IPS", "*"),
+        "timeout_keep_alive": int(os.getenv("KEEP_ALIVE_SECONDS", "5")),
+        "timeout_graceful_shutdown": int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30")),
+        "backlog": int(os.getenv("LISTEN_BACKLOG", "2048")),
+        # Per-request access logging costs more than most of our handlers
+        "access_log": os.getenv("ACCESS_LOG", "false").lower() == "true",
+    }
+
+
+async def prepare_database() -> Dict[str, float]:
+    """Reconcile indexes and build missing rollups once for all workers; returns timings in ms"""
+    from db import MongoConnection
+    from indexes import ensure_indexes
+    from rollups import ensure_rollups
+
+    timings = {}
+    connection = MongoConnection()
+    db = connection.connect()
+    try:
+        for name, step in (("indexes", ensure_indexes), ("rollups", ensure_rollups)):
+            started = time.perf_counter()
+            try:
+                await step(db)
+            except Exception as e:
+                # Same policy as the lifespan: a bootstrap failure must not keep the API down
+                logger.error(f"{name} bootstrap failed: {e}")
+            timings[name] = (time.perf_counter() - started) * 1000
+    finally:
+        connection.close()
+    return timings
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the NBNTracker API with multiple workers")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--loop", choices=("auto", "uvloop", "asyncio"), default=os.getenv("UVICORN_LOOP", "auto"))
+    parser.add_argument("--http", choices=("auto", "httptools", "h11"), default=os.getenv("UVICORN_HTTP", "auto"))
+    parser.add_argument("--skip-prepare", action="store_true", help="leave index and rollup bootstrap to the workers")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+
+    started = time.perf_counter()
+    if not args.skip_prepare:
+        timings = asyncio.run(prepare_database())
+        # Workers inherit the environment and skip what was just done
+        os.environ["ENSURE_INDEXES_ON_STARTUP"] = "false"
+        os.environ["ENSURE_ROLLUPS_ON_STARTUP"] = "false"
+        logger.info(
+            "Database prepared in %.0f ms (indexes %.0f ms, rollups %.0f ms)",
+            (time.perf_counter() - started) * 1000, timings["indexes"], timings["rollups"],
+        )
+
+    from static_assets import precompress
+
+    started = time.perf_counter()
+    counts = precompress(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "build"))
+    logger.info(
+        "Precompressed %d static file(s) in %.0f ms (%d written, %d failed)",
+        counts["files"], (time.perf_counter() - started) * 1000, counts["written"], counts["failed"],
+    )
+
+    config = build_config(args)
+    logger.info(
+        "Starting %d worker(s) on %s:%d (loop=%s, http=%s, cores=%s, graceful shutdown %ds)",
+        config["workers"], config["host"], config["port"], config["loop"], config["http"],
+        os.cpu_count(), config["timeout_graceful_shutdown"],
+    )
+
+    import uvicorn
+
+    uvicorn.run(**config)
+
+
+if __name__ == "__main__":
+    main()
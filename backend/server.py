@@ -1,21 +1,143 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 from dotenv import load_dotenv
 import uuid
 from enum import Enum
-import calendar
+from contextlib import asynccontextmanager
+import logging
+import time
 
-# Load environment variables
+# Load environment variables before the local imports below, which read their settings at import time
 load_dotenv()
 
-app = FastAPI(title="NBNTracker API", version="1.0.0")
+from indexes import ensure_indexes
+from analytics import (
+    DEFAULT_TOP_TAGS,
+    GRANULARITIES as TIMESERIES_GRANULARITIES,
+    MAX_TIMESERIES_DAYS,
+    MAX_TAG_PERIOD_ENTRIES,
+    MAX_TOP_TAGS,
+    bucket_starts,
+    SPLITS as TIMESERIES_SPLITS,
+    merge_totals,
+    spending_summary,
+    spending_timeseries,
+    tag_analytics,
+)
+from rollups import ensure_rollups, record_expense_change
+from pagination import MAX_PAGE_SIZE, SORT as PAGE_SORT, after_cursor, next_cursor
+from export import EXPORT_FIELDS, FORMATS as EXPORT_FORMATS, export_stream
+from importer import (
+    DEFAULT_BATCH_SIZE as DEFAULT_IMPORT_BATCH_SIZE,
+    FORMATS as IMPORT_FORMATS,
+    MAX_BATCH_SIZE as MAX_IMPORT_BATCH_SIZE,
+    import_expenses,
+)
+from projections import parse_fields, projection
+from serialization import FastJSONResponse, list_response
+from search import MAX_QUERY_LENGTH as MAX_SEARCH_QUERY_LENGTH, search_expenses
+from stats import DEFAULT_Z_THRESHOLD, spending_stats
+from forecast import (
+    DEFAULT_FORECAST_MONTHS,
+    FREQUENCY_MONTHS as FORECAST_FREQUENCY_MONTHS,
+    GRANULARITIES as FORECAST_GRANULARITIES,
+    MAX_FORECAST_MONTHS,
+    add_months,
+    forecast_engine,
+    subscription_forecast,
+)
+from cache import change_versions, result_cache
+from budgets import alerts_from_statuses, budget_status, evaluate_budgets
+from events import close_on_shutdown_signal, event_bus, sse_stream
+from alerts import AlertMonitor
+from scheduler import SCHEDULER_ENABLED, SubscriptionScheduler, charge_id
+from etags import conditional_get, record_change, use_change_stream
+from db import mongo
+from change_sync import CHANGE_STREAM_SYNC, ChangeStreamSync
+from static_assets import PrecompressedStaticFiles
+from compression import COMPRESSION_ENABLED, CompressionMiddleware, compression_stats
+import metrics
+from metrics import METRICS_ENABLED, MetricsMiddleware
+from profiling import PROFILING_TOKEN, ProfilerMiddleware, authorized, profile_store, slow_query_log
+from bulk import bulk_delete_expenses, bulk_update_expenses, bulk_update_subscriptions
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global db
+    timings = {}
+    started = time.perf_counter()
+    
+    def lap(name: str):
+        timings[name] = round((time.perf_counter() - started) * 1000 - sum(timings.values()), 1)
+    
+    # One client per process, created after the worker starts
+    db = mongo.connect()
+    if slow_query_log is not None:
+        slow_query_log.attach(mongo.client)
+    try:
+        await mongo.warm_up()
+    except Exception as e:
+        logger.error(f"MongoDB warm-up failed: {e}")
+    lap("mongo")
+    # Reconcile indexes before serving; a failure here must not keep the API down
+    # (serve.py does this once before starting its workers)
+    if os.getenv("ENSURE_INDEXES_ON_STARTUP", "true").lower() == "true":
+        try:
+            await ensure_indexes(db)
+        except Exception as e:
+            logger.error(f"Index bootstrap failed: {e}")
+        lap("indexes")
+    if os.getenv("ENSURE_ROLLUPS_ON_STARTUP", "true").lower() == "true":
+        try:
+            await ensure_rollups(db)
+        except Exception as e:
+            logger.error(f"Rollup bootstrap failed: {e}")
+        lap("rollups")
+    # Invalidate this worker's caches on writes made through other workers
+    change_sync = None
+    if CHANGE_STREAM_SYNC:
+        change_sync = ChangeStreamSync(db, change_versions)
+        change_sync.start()
+    app.state.change_sync = change_sync
+    # ETags come from the in-process versions while the stream keeps them in step
+    use_change_stream(change_sync)
+    # Roll due subscriptions forward in the background (one process at a time, see scheduler.py)
+    scheduler = None
+    if SCHEDULER_ENABLED:
+        scheduler = SubscriptionScheduler(db, calculate_next_due_date, subscription_charge)
+        scheduler.start()
+    app.state.scheduler = scheduler
+    # Push budget and due-date alerts to /api/events clients
+    alert_monitor = AlertMonitor(db, event_bus)
+    alert_monitor.start()
+    # End event streams as soon as shutdown starts instead of after the graceful timeout
+    close_on_shutdown_signal(event_bus)
+    lap("background_tasks")
+    
+    app.state.startup = {"pid": os.getpid(), "total_ms": round(sum(timings.values()), 1), "phases_ms": timings}
+    logging.getLogger("uvicorn.error").info(
+        "Worker %d started in %.0f ms (%s)",
+        os.getpid(), app.state.startup["total_ms"], ", ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items())
+    )
+    yield
+    event_bus.close()
+    await alert_monitor.stop()
+    if scheduler:
+        await scheduler.stop()
+    if change_sync:
+        await change_sync.stop()
+    mongo.close()
+
+app = FastAPI(title="NBNTracker API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -24,13 +146,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile-Id"],
 )
 
-# MongoDB connection
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "nbntracker")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+# gzip/brotli for API responses (see compression.py)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Request counts and latency for /metrics; added last so it also times the other middleware
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    metrics.register_cache("results", result_cache.stats)
+    metrics.register_cache("forecast_expansions", forecast_engine.stats)
+
+# Per-request profiles on demand (see profiling.py); outermost, so the profile covers everything
+if PROFILING_TOKEN:
+    app.add_middleware(ProfilerMiddleware)
+
+# MongoDB connection (opened and closed by the lifespan, see db.py)
+db = None
 
 # Security
 security = HTTPBearer()
@@ -58,6 +192,8 @@ class Subscription(BaseModel):
     cost: float
     billing_frequency: BillingFrequency
     next_due_date: datetime
+    # Day of the month it is billed on; next_due_date is clamped to it in short months
+    billing_day: Optional[int] = None
     category: str
     description: Optional[str] = None
     is_active: bool = True
@@ -97,6 +233,7 @@ class CreateSubscriptionRequest(BaseModel):
     cost: float
     billing_frequency: BillingFrequency
     next_due_date: datetime
+    billing_day: Optional[int] = Field(None, ge=1, le=31)  # next_due_date's day by default
     category: str
     description: Optional[str] = None
 
@@ -105,6 +242,7 @@ class UpdateSubscriptionRequest(BaseModel):
     cost: Optional[float] = None
     billing_frequency: Optional[BillingFrequency] = None
     next_due_date: Optional[datetime] = None
+    billing_day: Optional[int] = Field(None, ge=1, le=31)
     category: Optional[str] = None
     description: Optional[str] = None
     is_active: Optional[bool] = None
@@ -137,54 +275,163 @@ class DashboardResponse(BaseModel):
     budget_alerts: List[Dict[str, Any]]
     savings_suggestions: List[str]
 
+class ExpenseFilter(BaseModel):
+    category: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    tags: Optional[List[str]] = None
+
+class BulkUpdateExpensesRequest(BaseModel):
+    filter: ExpenseFilter
+    set: UpdateExpenseRequest = Field(default_factory=UpdateExpenseRequest)
+    add_tags: List[str] = []
+    remove_tags: List[str] = []
+    dry_run: bool = False
+
+class BulkDeleteExpensesRequest(BaseModel):
+    filter: ExpenseFilter
+    dry_run: bool = False
+
+class SubscriptionFilter(BaseModel):
+    category: Optional[str] = None
+    billing_frequency: Optional[BillingFrequency] = None
+    start_date: Optional[datetime] = None  # next_due_date range
+    end_date: Optional[datetime] = None
+
+class BulkUpdateSubscriptionsRequest(BaseModel):
+    filter: SubscriptionFilter
+    set: UpdateSubscriptionRequest
+    dry_run: bool = False
+
+class BulkDeleteSubscriptionsRequest(BaseModel):
+    filter: SubscriptionFilter
+    dry_run: bool = False
+
+class BulkMutationResponse(BaseModel):
+    matched: int
+    modified: int
+    dry_run: bool
+
+class BulkImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[Dict[str, Any]]
+
 # Utility functions
-def calculate_next_due_date(current_date: datetime, frequency: BillingFrequency) -> datetime:
-    """Calculate next due date based on frequency"""
-    if frequency == BillingFrequency.MONTHLY:
-        if current_date.month == 12:
-            return current_date.replace(year=current_date.year + 1, month=1)
-        else:
-            # Handle month-end dates
-            next_month = current_date.month + 1
-            year = current_date.year
-            last_day = calendar.monthrange(year, next_month)[1]
-            day = min(current_date.day, last_day)
-            return current_date.replace(month=next_month, day=day)
-    else:  # yearly
-        return current_date.replace(year=current_date.year + 1)
-
-def calculate_yearly_projection(subscriptions: List[Dict]) -> float:
-    """Calculate total yearly spending projection from subscriptions"""
-    total = 0
-    for sub in subscriptions:
-        if sub['is_active']:
-            if sub['billing_frequency'] == 'monthly':
-                total += sub['cost'] * 12
-            else:  # yearly
-                total += sub['cost']
-    return total
+def calculate_next_due_date(current_date: datetime, frequency: BillingFrequency, billing_day: Optional[int] = None) -> datetime:
+    """Calculate next due date based on frequency, on billing_day clamped to the month's length"""
+    return add_months(current_date, FORECAST_FREQUENCY_MONTHS[BillingFrequency(frequency).value], billing_day)
+
+def with_billing_day(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Subscription changes with the billing day following a new next_due_date unless it is given"""
+    if "next_due_date" in changes and "billing_day" not in changes:
+        changes["billing_day"] = changes["next_due_date"].day
+    return changes
+
+def subscription_charge(subscription: Dict[str, Any], due_date: datetime) -> Dict[str, Any]:
+    """Expense recorded by the scheduler for one passed due date of a subscription"""
+    return Expense(
+        id=charge_id(subscription["id"], due_date),
+        amount=subscription["cost"],
+        category=subscription["category"],
+        tags=["subscription"],
+        notes=subscription["name"],
+        date=due_date
+    ).dict()
+
+def date_range_query(start_date: Optional[datetime], end_date: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    """Mongo condition for an optional inclusive date range"""
+    if start_date and end_date:
+        return {"$gte": start_date, "$lte": end_date}
+    elif start_date:
+        return {"$gte": start_date}
+    elif end_date:
+        return {"$lte": end_date}
+    return None
+
+def build_expense_query(
+    category: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    tags: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Build the expense filter shared by the list and bulk endpoints"""
+    query = {}
+    
+    if category:
+        query["category"] = category
+    
+    date_range = date_range_query(start_date, end_date)
+    if date_range:
+        query["date"] = date_range
+    
+    # Expenses carrying all of the given tags
+    if tags:
+        query["tags"] = {"$all": tags}
+    
+    return query
+
+# Base of every bulk subscription filter; on its own it matches everything
+ACTIVE_SUBSCRIPTIONS = {"is_active": True}
+
+# Collections the dashboard and budget status read; their ETags and cached results follow writes to any of them
+DASHBOARD_COLLECTIONS = ("expenses", "subscriptions", "budgets")
+
+def build_subscription_query(subscription_filter: SubscriptionFilter) -> Dict[str, Any]:
+    """Build the filter for bulk subscription changes (active subscriptions only)"""
+    query: Dict[str, Any] = dict(ACTIVE_SUBSCRIPTIONS)
+    if subscription_filter.category:
+        query["category"] = subscription_filter.category
+    if subscription_filter.billing_frequency:
+        query["billing_frequency"] = subscription_filter.billing_frequency
+    due_range = date_range_query(subscription_filter.start_date, subscription_filter.end_date)
+    if due_range:
+        query["next_due_date"] = due_range
+    return query
+
+def new_expense(request: CreateExpenseRequest) -> Expense:
+    """Build a new expense from a create request, dated now if no date was given"""
+    expense_data = request.dict()
+    if expense_data.get('date') is None:
+        expense_data['date'] = datetime.utcnow()
+    return Expense(**expense_data)
 
 # API Routes
 @app.get("/api/health")
 async def health_check():
-    try:
-        # Try to ping the MongoDB server
-        await db.command("ping")
+    readiness = await mongo.readiness()
+    if readiness["ready"]:
         return {"status": "healthy", "db": "connected"}
-    except Exception as e:
-        return {"status": "unhealthy", "db": "disconnected", "error": str(e)}
+    return {"status": "unhealthy", "db": "disconnected", "error": readiness.get("error")}
+
+@app.get("/api/health/live")
+async def liveness_check():
+    """Liveness probe: the process is serving requests (no database call)"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness probe: MongoDB answered a ping within the last few seconds"""
+    readiness = await mongo.readiness()
+    status_code = status.HTTP_200_OK if readiness["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return FastJSONResponse(content={"status": "ready" if readiness["ready"] else "not ready", **readiness}, status_code=status_code)
 
 # Subscription endpoints
 @app.post("/api/subscriptions", response_model=Subscription)
 async def create_subscription(request: CreateSubscriptionRequest):
-    subscription = Subscription(**request.dict())
+    subscription = Subscription(**with_billing_day(request.dict(exclude_none=True)))
     result = await db.subscriptions.insert_one(subscription.dict())
+    await record_change(db, "subscriptions")
     return subscription
 
 @app.get("/api/subscriptions", response_model=List[Subscription])
-async def get_subscriptions():
-    subscriptions = await db.subscriptions.find({"is_active": True}).to_list(length=None)
-    return [Subscription(**sub) for sub in subscriptions]
+async def get_subscriptions(request: Request, fields: Optional[str] = None):
+    headers, not_modified = await conditional_get(db, request, "subscriptions", ("subscriptions",))
+    if not_modified:
+        return not_modified
+    selected = parse_fields(Subscription, fields)
+    subscriptions = await db.subscriptions.find({"is_active": True}, projection(selected or ())).to_list(length=None)
+    return list_response(Subscription, subscriptions, selected, headers=headers)
 
 @app.get("/api/subscriptions/{subscription_id}", response_model=Subscription)
 async def get_subscription(subscription_id: str):
@@ -195,7 +442,7 @@ async def get_subscription(subscription_id: str):
 
 @app.put("/api/subscriptions/{subscription_id}", response_model=Subscription)
 async def update_subscription(subscription_id: str, request: UpdateSubscriptionRequest):
-    update_data = {k: v for k, v in request.dict().items() if v is not None}
+    update_data = with_billing_day({k: v for k, v in request.dict().items() if v is not None})
     update_data["updated_at"] = datetime.utcnow()
     
     result = await db.subscriptions.update_one(
@@ -206,6 +453,7 @@ async def update_subscription(subscription_id: str, request: UpdateSubscriptionR
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
+    await record_change(db, "subscriptions")
     updated_subscription = await db.subscriptions.find_one({"id": subscription_id})
     return Subscription(**updated_subscription)
 
@@ -219,40 +467,157 @@ async def delete_subscription(subscription_id: str):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
+    await record_change(db, "subscriptions")
     return {"message": "Subscription deleted successfully"}
 
+@app.post("/api/subscriptions/bulk-update", response_model=BulkMutationResponse)
+async def bulk_update_subscriptions_endpoint(request: BulkUpdateSubscriptionsRequest):
+    """Update every active subscription matching a filter in one operation"""
+    changes = with_billing_day({k: v for k, v in request.set.dict().items() if v is not None})
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    
+    query = build_subscription_query(request.filter)
+    if query == ACTIVE_SUBSCRIPTIONS:
+        raise HTTPException(status_code=400, detail="A filter is required for bulk updates")
+    
+    result = await bulk_update_subscriptions(db, query, changes, request.dry_run)
+    if not request.dry_run:
+        await record_change(db, "subscriptions")
+    return BulkMutationResponse(**result)
+
+@app.post("/api/subscriptions/bulk-delete", response_model=BulkMutationResponse)
+async def bulk_delete_subscriptions_endpoint(request: BulkDeleteSubscriptionsRequest):
+    """Deactivate every subscription matching a filter, like DELETE does for one"""
+    query = build_subscription_query(request.filter)
+    if query == ACTIVE_SUBSCRIPTIONS:
+        raise HTTPException(status_code=400, detail="A filter is required for bulk deletes")
+    
+    result = await bulk_update_subscriptions(db, query, {"is_active": False}, request.dry_run)
+    if not request.dry_run:
+        await record_change(db, "subscriptions")
+    return BulkMutationResponse(**result)
+
 # Expense endpoints
 @app.post("/api/expenses", response_model=Expense)
 async def create_expense(request: CreateExpenseRequest):
-    expense_data = request.dict()
-    if expense_data.get('date') is None:
-        expense_data['date'] = datetime.utcnow()
-    
-    expense = Expense(**expense_data)
+    expense = new_expense(request)
     result = await db.expenses.insert_one(expense.dict())
+    await record_expense_change(db, None, expense.dict())
+    await record_change(db, "expenses")
     return expense
 
+@app.post("/api/expenses/bulk", response_model=BulkImportResponse)
+async def bulk_import_expenses(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+):
+    """Import expenses from a streamed CSV or NDJSON body"""
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {format}")
+    if not 1 <= batch_size <= MAX_IMPORT_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {MAX_IMPORT_BATCH_SIZE}")
+    
+    def build_document(row: Dict[str, Any]) -> Dict[str, Any]:
+        return new_expense(CreateExpenseRequest(**row)).dict()
+    
+    result = await import_expenses(
+        db, request.stream(), format, build_document, batch_size,
+        on_batch=lambda: record_change(db, "expenses")
+    )
+    return BulkImportResponse(**result)
+
+@app.post("/api/expenses/bulk-update", response_model=BulkMutationResponse)
+async def bulk_update_expenses_endpoint(request: BulkUpdateExpensesRequest):
+    """Update every expense matching a filter in one operation"""
+    query = build_expense_query(**request.filter.dict())
+    if not query:
+        raise HTTPException(status_code=400, detail="A filter is required for bulk updates")
+    changes = {k: v for k, v in request.set.dict().items() if v is not None}
+    if "tags" in changes and (request.add_tags or request.remove_tags):
+        raise HTTPException(status_code=400, detail="Use either set.tags or add_tags/remove_tags, not both")
+    if not changes and not request.add_tags and not request.remove_tags:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    
+    result = await bulk_update_expenses(db, query, changes, request.add_tags, request.remove_tags, request.dry_run)
+    if not request.dry_run:
+        await record_change(db, "expenses")
+    return BulkMutationResponse(**result)
+
+@app.post("/api/expenses/bulk-delete", response_model=BulkMutationResponse)
+async def bulk_delete_expenses_endpoint(request: BulkDeleteExpensesRequest):
+    """Delete every expense matching a filter in one operation"""
+    query = build_expense_query(**request.filter.dict())
+    if not query:
+        raise HTTPException(status_code=400, detail="A filter is required for bulk deletes")
+    
+    result = await bulk_delete_expenses(db, query, request.dry_run)
+    if not request.dry_run:
+        await record_change(db, "expenses")
+    return BulkMutationResponse(**result)
+
 @app.get("/api/expenses", response_model=List[Expense])
 async def get_expenses(
+    request: Request,
     category: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    fields: Optional[str] = None
 ):
-    query = {}
-    
-    if category:
-        query["category"] = category
+    headers, not_modified = await conditional_get(db, request, "expenses", ("expenses",))
+    if not_modified:
+        return not_modified
+    query = build_expense_query(category, start_date, end_date, tags)
+    selected = parse_fields(Expense, fields)
     
-    if start_date and end_date:
-        query["date"] = {"$gte": start_date, "$lte": end_date}
-    elif start_date:
-        query["date"] = {"$gte": start_date}
-    elif end_date:
-        query["date"] = {"$lte": end_date}
+    # Keyset pagination on (date, id); the cursor of the next page goes in X-Next-Cursor
+    query = after_cursor(query, cursor)
+    # The cursor needs date and id even when they weren't asked for
+    find = db.expenses.find(query, projection(selected or (), always=("date", "id") if selected else ())).sort(PAGE_SORT)
+    expenses = await find.limit(limit + 1).to_list(length=None)
+    cursor_for_next_page = next_cursor(expenses, limit)
+    if cursor_for_next_page:
+        headers["X-Next-Cursor"] = cursor_for_next_page
+    expenses = expenses[:limit]
+    return list_response(Expense, expenses, selected, headers=headers)
+
+@app.get("/api/expenses/search", response_model=List[Expense])
+async def search_expenses_endpoint(
+    request: Request,
+    q: str,
+    category: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    fields: Optional[str] = None
+):
+    """Search expense notes and tags, most relevant first"""
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    if len(q) > MAX_SEARCH_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"q is limited to {MAX_SEARCH_QUERY_LENGTH} characters")
+    headers, not_modified = await conditional_get(db, request, "expenses/search", ("expenses",))
+    if not_modified:
+        return not_modified
+    selected = parse_fields(Expense, fields)
     
-    expenses = await db.expenses.find(query).sort("date", -1).limit(limit).to_list(length=None)
-    return [Expense(**exp) for exp in expenses]
+    # Ranked keyset pagination on (score, id); the cursor of the next page goes in X-Next-Cursor
+    expenses, cursor_for_next_page = await search_expenses(
+        db, q, build_expense_query(category, start_date, end_date, tags), limit, cursor, selected
+    )
+    if cursor_for_next_page:
+        headers["X-Next-Cursor"] = cursor_for_next_page
+    return list_response(Expense, expenses, selected, headers=headers)
 
 @app.get("/api/expenses/{expense_id}", response_model=Expense)
 async def get_expense(expense_id: str):
@@ -266,24 +631,30 @@ async def update_expense(expense_id: str, request: UpdateExpenseRequest):
     update_data = {k: v for k, v in request.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
-    result = await db.expenses.update_one(
+    # Read the previous version as part of the write so rollups get the exact delta
+    old_expense = await db.expenses.find_one_and_update(
         {"id": expense_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if old_expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    updated_expense = await db.expenses.find_one({"id": expense_id})
+    updated_expense = {**old_expense, **update_data}
+    await record_expense_change(db, old_expense, updated_expense)
+    await record_change(db, "expenses")
     return Expense(**updated_expense)
 
 @app.delete("/api/expenses/{expense_id}")
 async def delete_expense(expense_id: str):
-    result = await db.expenses.delete_one({"id": expense_id})
+    deleted_expense = await db.expenses.find_one_and_delete({"id": expense_id})
     
-    if result.deleted_count == 0:
+    if deleted_expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    await record_expense_change(db, deleted_expense, None)
+    await record_change(db, "expenses")
     return {"message": "Expense deleted successfully"}
 
 # Budget endpoints
@@ -291,12 +662,29 @@ async def delete_expense(expense_id: str):
 async def create_budget(request: CreateBudgetRequest):
     budget = Budget(**request.dict())
     result = await db.budgets.insert_one(budget.dict())
+    await record_change(db, "budgets")
     return budget
 
 @app.get("/api/budgets", response_model=List[Budget])
-async def get_budgets():
-    budgets = await db.budgets.find().to_list(length=None)
-    return [Budget(**budget) for budget in budgets]
+async def get_budgets(request: Request, fields: Optional[str] = None):
+    headers, not_modified = await conditional_get(db, request, "budgets", ("budgets",))
+    if not_modified:
+        return not_modified
+    selected = parse_fields(Budget, fields)
+    budgets = await db.budgets.find({}, projection(selected or ())).to_list(length=None)
+    return list_response(Budget, budgets, selected, headers=headers)
+
+@app.get("/api/budgets/status")
+async def get_budget_status(request: Request, response: Response):
+    """Get percent used and projected end-of-period spend for every budget"""
+    headers, not_modified = await conditional_get(db, request, "budgets/status", DASHBOARD_COLLECTIONS, windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    period = datetime.utcnow().strftime("%Y-%m-%d")
+    return await result_cache.get_or_compute(
+        ("budgets/status", period), DASHBOARD_COLLECTIONS, lambda: budget_status(db)
+    )
 
 @app.put("/api/budgets/{budget_id}", response_model=Budget)
 async def update_budget(budget_id: str, request: CreateBudgetRequest):
@@ -311,6 +699,7 @@ async def update_budget(budget_id: str, request: CreateBudgetRequest):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Budget not found")
     
+    await record_change(db, "budgets")
     updated_budget = await db.budgets.find_one({"id": budget_id})
     return Budget(**updated_budget)
 
@@ -321,88 +710,53 @@ async def delete_budget(budget_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Budget not found")
     
+    await record_change(db, "budgets")
     return {"message": "Budget deleted successfully"}
 
 # Dashboard endpoint
 @app.get("/api/dashboard", response_model=DashboardResponse)
-async def get_dashboard():
+async def get_dashboard(request: Request, response: Response):
+    headers, not_modified = await conditional_get(db, request, "dashboard", DASHBOARD_COLLECTIONS, windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    period = datetime.utcnow().strftime("%Y-%m")
+    return await result_cache.get_or_compute(
+        ("dashboard", period), DASHBOARD_COLLECTIONS, compute_dashboard
+    )
+
+async def compute_dashboard() -> DashboardResponse:
     try:
         # Get current date
         now = datetime.utcnow()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        current_year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        # Get subscriptions
-        subscriptions = await db.subscriptions.find({"is_active": True}).to_list(length=None)
-        # Get expenses
-        monthly_expenses = await db.expenses.find({
-            "date": {"$gte": current_month_start}
-        }).to_list(length=None)
-        yearly_expenses = await db.expenses.find({
-            "date": {"$gte": current_year_start}
-        }).to_list(length=None)
-        # Calculate totals
-        yearly_projection = calculate_yearly_projection(subscriptions)
-        monthly_spending = sum(exp['amount'] for exp in monthly_expenses)
-        yearly_spending = sum(exp['amount'] for exp in yearly_expenses)
-        # Calculate subscription costs for the year
-        subscription_yearly_cost = 0
-        for sub in subscriptions:
-            if sub['is_active']:
-                if sub['billing_frequency'] == 'monthly':
-                    subscription_yearly_cost += sub['cost'] * 12
-                else:
-                    subscription_yearly_cost += sub['cost']
-        yearly_spending += subscription_yearly_cost
-        # Category breakdown
-        category_breakdown = {}
-        for exp in yearly_expenses:
-            category = exp['category']
-            category_breakdown[category] = category_breakdown.get(category, 0) + exp['amount']
-        # Add subscription costs to breakdown
-        for sub in subscriptions:
-            if sub['is_active']:
-                category = sub['category']
-                yearly_cost = sub['cost'] * 12 if sub['billing_frequency'] == 'monthly' else sub['cost']
-                category_breakdown[category] = category_breakdown.get(category, 0) + yearly_cost
+        # Totals, breakdowns and subscription projections in one aggregation
+        summary = await spending_summary(db, now)
+        yearly_projection = summary["subscription_yearly_cost"]
+        monthly_spending = summary["monthly_total"]
+        # Yearly spending includes the subscription costs for the year
+        yearly_spending = summary["yearly_total"] + summary["subscription_yearly_cost"]
+        # Category breakdown with subscription costs added
+        category_breakdown = merge_totals(summary["category_totals"], summary["subscription_category_totals"])
         # Upcoming subscriptions (next 7 days)
-        upcoming_date = now + timedelta(days=7)
-        upcoming_subscriptions = []
-        for sub in subscriptions:
-            if sub['is_active'] and sub['next_due_date'] <= upcoming_date:
-                upcoming_subscriptions.append({
-                    "id": sub['id'],
-                    "name": sub['name'],
-                    "cost": sub['cost'],
-                    "due_date": sub['next_due_date'],
-                    "days_until_due": (sub['next_due_date'] - now).days
-                })
+        upcoming_subscriptions = [
+            {
+                "id": sub['id'],
+                "name": sub['name'],
+                "cost": sub['cost'],
+                "due_date": sub['next_due_date'],
+                "days_until_due": (sub['next_due_date'] - now).days
+            }
+            for sub in summary["upcoming_subscriptions"]
+        ]
         # Budget alerts
-        budgets = await db.budgets.find().to_list(length=None)
-        budget_alerts = []
-        for budget in budgets:
-            if budget['type'] == 'monthly':
-                current_spending = monthly_spending
-                if budget['category']:
-                    current_spending = sum(exp['amount'] for exp in monthly_expenses if exp['category'] == budget['category'])
-            else:  # yearly
-                current_spending = yearly_spending
-                if budget['category']:
-                    current_spending = category_breakdown.get(budget['category'], 0)
-            if current_spending > budget['limit']:
-                budget_alerts.append({
-                    "type": budget['type'],
-                    "category": budget['category'],
-                    "limit": budget['limit'],
-                    "current": current_spending,
-                    "exceeded_by": current_spending - budget['limit']
-                })
+        budgets = await db.budgets.find({}, {"_id": 0}).to_list(length=None)
+        budget_alerts = alerts_from_statuses(evaluate_budgets(budgets, summary, now))
         # Savings suggestions
         savings_suggestions = []
         # Suggest cancelling expensive subscriptions
-        expensive_subs = [sub for sub in subscriptions if sub['is_active'] and sub['cost'] > 500]
-        if expensive_subs:
-            total_savings = sum(sub['cost'] * 12 if sub['billing_frequency'] == 'monthly' else sub['cost'] for sub in expensive_subs)
-            savings_suggestions.append(f"Consider reviewing {len(expensive_subs)} expensive subscriptions to save up to ₹{total_savings:.0f} annually")
+        expensive_subs = summary["expensive_subscriptions"]
+        if expensive_subs["count"]:
+            savings_suggestions.append(f"Consider reviewing {expensive_subs['count']} expensive subscriptions to save up to ₹{expensive_subs['yearly_cost']:.0f} annually")
         # Suggest reducing high-spending categories
         high_spending_categories = [(cat, amount) for cat, amount in category_breakdown.items() if amount > yearly_spending * 0.2]
         if high_spending_categories:
@@ -422,80 +776,281 @@ async def get_dashboard():
 
 # Analytics endpoints
 @app.get("/api/analytics/categories")
-async def get_category_analytics():
+async def get_category_analytics(request: Request, response: Response):
     """Get spending analytics by category"""
-    now = datetime.utcnow()
-    current_year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Get yearly expenses
-    yearly_expenses = await db.expenses.find({
-        "date": {"$gte": current_year_start}
-    }).to_list(length=None)
-    
-    # Get subscriptions
-    subscriptions = await db.subscriptions.find({"is_active": True}).to_list(length=None)
-    
-    # Category breakdown
-    category_breakdown = {}
-    for exp in yearly_expenses:
-        category = exp['category']
-        category_breakdown[category] = category_breakdown.get(category, 0) + exp['amount']
-    
-    # Add subscription costs
-    for sub in subscriptions:
-        if sub['is_active']:
-            category = sub['category']
-            yearly_cost = sub['cost'] * 12 if sub['billing_frequency'] == 'monthly' else sub['cost']
-            category_breakdown[category] = category_breakdown.get(category, 0) + yearly_cost
+    headers, not_modified = await conditional_get(db, request, "analytics/categories", ("expenses", "subscriptions"), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    period = datetime.utcnow().strftime("%Y")
+    return await result_cache.get_or_compute(
+        ("analytics/categories", period), ("expenses", "subscriptions"), compute_category_analytics
+    )
+
+async def compute_category_analytics() -> Dict[str, Any]:
+    summary = await spending_summary(db, facets=["category_totals", "subscription_category_totals"])
+    
+    # Category breakdown with subscription costs added
+    category_breakdown = merge_totals(summary["category_totals"], summary["subscription_category_totals"])
     
     return {"category_breakdown": category_breakdown}
 
 @app.get("/api/analytics/trends")
-async def get_spending_trends():
+async def get_spending_trends(request: Request, response: Response):
     """Get monthly spending trends for the current year"""
-    now = datetime.utcnow()
-    current_year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    headers, not_modified = await conditional_get(db, request, "analytics/trends", ("expenses",), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    period = datetime.utcnow().strftime("%Y")
+    return await result_cache.get_or_compute(("analytics/trends", period), ("expenses",), compute_spending_trends)
+
+async def compute_spending_trends() -> Dict[str, Any]:
+    summary = await spending_summary(db, facets=["monthly_trends"])
     
-    # Get expenses for current year
-    yearly_expenses = await db.expenses.find({
-        "date": {"$gte": current_year_start}
-    }).to_list(length=None)
+    return {"monthly_trends": summary["monthly_trends"]}
+
+@app.get("/api/analytics/timeseries")
+async def get_spending_timeseries(
+    request: Request,
+    response: Response,
+    granularity: str = "month",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    split: Optional[str] = None,
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None)
+):
+    """Get zero-filled spending totals per day, week, month or quarter"""
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(TIMESERIES_GRANULARITIES)}")
+    if split and split not in TIMESERIES_SPLITS:
+        raise HTTPException(status_code=400, detail=f"split must be one of {', '.join(TIMESERIES_SPLITS)}")
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date.replace(month=1, day=1)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if (end_date - start_date).days > MAX_TIMESERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_TIMESERIES_DAYS} days")
     
-    # Group by month
-    monthly_trends = {}
-    for exp in yearly_expenses:
-        month_key = exp['date'].strftime('%Y-%m')
-        monthly_trends[month_key] = monthly_trends.get(month_key, 0) + exp['amount']
+    headers, not_modified = await conditional_get(db, request, "analytics/timeseries", ("expenses",), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     
-    return {"monthly_trends": monthly_trends}
+    key = ("analytics/timeseries", granularity, start_date, end_date, split, category, tuple(tags or ()))
+    return await result_cache.get_or_compute(
+        key, ("expenses",),
+        lambda: spending_timeseries(db, granularity, start_date, end_date, split, category, tags)
+    )
+
+@app.get("/api/analytics/tags")
+async def get_tag_analytics(
+    request: Request,
+    response: Response,
+    granularity: str = "month",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    top: int = DEFAULT_TOP_TAGS,
+    category: Optional[str] = None
+):
+    """Get spending per tag, tag co-occurrence and the top tags per period"""
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(TIMESERIES_GRANULARITIES)}")
+    if not 1 <= top <= MAX_TOP_TAGS:
+        raise HTTPException(status_code=400, detail=f"top must be between 1 and {MAX_TOP_TAGS}")
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date.replace(month=1, day=1)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if (end_date - start_date).days > MAX_TIMESERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_TIMESERIES_DAYS} days")
+    if len(bucket_starts(start_date, end_date, granularity)) * top > MAX_TAG_PERIOD_ENTRIES:
+        raise HTTPException(status_code=400, detail="Too many periods; use a coarser granularity or a smaller top")
+    
+    headers, not_modified = await conditional_get(db, request, "analytics/tags", ("expenses",), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    
+    key = ("analytics/tags", granularity, start_date, end_date, top, category)
+    return await result_cache.get_or_compute(
+        key, ("expenses",),
+        lambda: tag_analytics(db, granularity, start_date, end_date, top, category)
+    )
+
+@app.get("/api/analytics/stats")
+async def get_spending_stats(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category: Optional[str] = None,
+    z_threshold: float = DEFAULT_Z_THRESHOLD
+):
+    """Get rolling averages, percentiles, month-over-month changes and anomalies"""
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=364)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if (end_date - start_date).days > MAX_TIMESERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_TIMESERIES_DAYS} days")
+    if z_threshold <= 0:
+        raise HTTPException(status_code=400, detail="z_threshold must be positive")
+    
+    headers, not_modified = await conditional_get(db, request, "analytics/stats", ("expenses",), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    
+    key = ("analytics/stats", start_date, end_date, category, z_threshold)
+    return await result_cache.get_or_compute(
+        key, ("expenses",),
+        lambda: spending_stats(db, start_date, end_date, category, z_threshold)
+    )
+
+@app.get("/api/analytics/forecast")
+async def get_subscription_forecast(
+    request: Request,
+    response: Response,
+    months: int = DEFAULT_FORECAST_MONTHS,
+    granularity: str = "month",
+    start_date: Optional[date] = None
+):
+    """Get projected subscription charges per month, quarter or year"""
+    if granularity not in FORECAST_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(FORECAST_GRANULARITIES)}")
+    if not 1 <= months <= MAX_FORECAST_MONTHS:
+        raise HTTPException(status_code=400, detail=f"months must be between 1 and {MAX_FORECAST_MONTHS}")
+    start_date = start_date or datetime.utcnow().date()
+    
+    headers, not_modified = await conditional_get(db, request, "analytics/forecast", ("subscriptions",), windowed=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    
+    key = ("analytics/forecast", start_date, months, granularity)
+    return await result_cache.get_or_compute(
+        key, ("subscriptions",),
+        lambda: subscription_forecast(db, start_date, months, granularity)
+    )
+
+# Event stream
+@app.get("/api/events")
+async def stream_events(request: Request, types: Optional[List[str]] = Query(None)):
+    """Stream budget.threshold and subscription.due_soon events as Server-Sent Events"""
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    subscriber = event_bus.subscribe(set(types) if types else None)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many event stream clients, or shutting down")
+    return StreamingResponse(
+        sse_stream(event_bus, subscriber, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/stats/cache")
+async def get_cache_stats():
+    """Hit/miss counters of the dashboard and analytics result cache"""
+    return {**result_cache.stats(), "forecast_expansions": forecast_engine.stats()}
+
+@app.get("/api/stats/scheduler")
+async def get_scheduler_stats():
+    """Counters of the background subscription scheduler in this process"""
+    scheduler = app.state.scheduler
+    if scheduler is None:
+        return {"enabled": False}
+    return scheduler.stats()
+
+@app.get("/api/stats/pool")
+async def get_pool_stats():
+    """MongoDB pool settings, connection counts and checkout wait times in this process"""
+    return mongo.stats()
+
+@app.get("/api/stats/startup")
+async def get_startup_stats():
+    """How long this worker's startup took, per phase, and the cross-worker sync state"""
+    change_sync = app.state.change_sync
+    return {**app.state.startup, "change_stream_sync": change_sync.stats() if change_sync else {"active": False}}
+
+@app.get("/api/stats/compression")
+async def get_compression_stats():
+    """Per-route compression ratio and CPU time in this process"""
+    return compression_stats.stats()
+
+@app.get("/api/stats/events")
+async def get_event_stats():
+    """Subscriber and delivery counters of the event stream in this process"""
+    return event_bus.stats()
 
 # Export endpoints
 @app.get("/api/export/csv")
-async def export_data_csv():
-    """Export all data as CSV format"""
-    # Get all data
-    subscriptions = await db.subscriptions.find().to_list(length=None)
-    expenses = await db.expenses.find().to_list(length=None)
-    budgets = await db.budgets.find().to_list(length=None)
-    
-    # Convert MongoDB ObjectIds to strings for JSON serialization
-    def convert_objectid(data):
-        if isinstance(data, list):
-            return [convert_objectid(item) for item in data]
-        elif isinstance(data, dict):
-            return {key: str(value) if hasattr(value, '__str__') and '_id' in key else convert_objectid(value) if isinstance(value, (dict, list)) else value for key, value in data.items()}
-        return data
-    
-    return {
-        "subscriptions": convert_objectid(subscriptions),
-        "expenses": convert_objectid(expenses),
-        "budgets": convert_objectid(budgets)
-    }
-
-# Serve React static files from the build directory
+async def export_data_csv(format: str = "csv", collection: Optional[str] = None, gzip: bool = False):
+    """Stream all data as CSV (or NDJSON with format=ndjson)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    if collection and collection not in EXPORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown collection: {collection}")
+    
+    collections = [collection] if collection else list(EXPORT_FIELDS)
+    filename = f"nbntracker-{collection or 'export'}-{datetime.utcnow():%Y%m%d}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    
+    return StreamingResponse(
+        export_stream(db, collections, format, compress=gzip),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers
+    )
+
+# Debug endpoints (profiling token required, see profiling.py)
+def require_profiling_token(request: Request):
+    if not authorized(request.headers, request.url.query.encode("latin-1")):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/api/debug/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """Recently captured request profiles, newest first"""
+    return profile_store.summaries()
+
+@app.get("/api/debug/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def get_profile(profile_id: str, format: str = "html"):
+    """One captured profile, as pyinstrument HTML or text"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "html" and profile["html"]:
+        return Response(profile["html"], media_type="text/html")
+    return Response(profile["text"], media_type="text/plain")
+
+@app.get("/api/debug/slow-queries", dependencies=[Depends(require_profiling_token)])
+async def get_slow_queries():
+    """Mongo commands over SLOW_QUERY_MS, newest first, with filter shape and plan summary"""
+    if slow_query_log is None:
+        return {"enabled": False}
+    return {"enabled": True, **slow_query_log.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics of this process"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+if METRICS_ENABLED:
+    metrics.track_in_progress(app.routes)
+
+# Serve React static files from the build directory (see static_assets.py)
 frontend_build_path = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'build')
-app.mount("/", StaticFiles(directory=frontend_build_path, html=True), name="static")
+app.mount("/", PrecompressedStaticFiles(directory=frontend_build_path, html=True), name="static")
 
+# Single-process development server; use serve.py in production
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""
+Static serving for the React build (frontend/build).
+
+- Compressible files are sent as their precompressed .br or .gz sibling
+  when the client accepts that encoding. serve.py writes the siblings once
+  at startup (precompress); a file without them is compressed in the
+  background on its first request and sent uncompressed meanwhile.
+  Brotli comes from the brotli package (in requirements.txt); where it
+  isn't installed only existing .br files are used and gzip covers the rest.
+- Files under /static/ have content hashes in their names (main.f35e77c3.js),
+  so they are cached by browsers for a year without revalidation. Every
+  other file is revalidated on each use (Cache-Control: no-cache).
+- index.html is kept in memory, with its compressed variants, and served
+  with an ETag of its content; it is reloaded when the file changes.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+from etags import etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+HASHED_PREFIX = "static" + os.sep
+
+# Background compression tasks, referenced until done so they aren't garbage-collected mid-run
+_background_tasks: Set[asyncio.Task] = set()
+
+# Smaller files don't gain enough to be worth the extra request header work
+MIN_COMPRESS_BYTES = int(os.getenv("STATIC_MIN_COMPRESS_BYTES", "1024"))
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico"}
+
+# Preferred first; the file suffix of each encoding's sibling
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return tuple(encoding for encoding, _ in ENCODINGS if encoding != "br" or brotli is not None)
+
+
+def accepted_encodings(header: Optional[str]) -> Set[str]:
+    """Codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def is_compressible(path: str, size: int) -> bool:
+    return size >= MIN_COMPRESS_BYTES and os.path.splitext(path)[1] in COMPRESSIBLE_SUFFIXES
+
+
+def write_variant(path: str, encoding: str, suffix: str) -> bool:
+    """Write path's compressed sibling unless an up-to-date one exists; True if written"""
+    target = path + suffix
+    source_mtime = os.stat(path).st_mtime
+    if os.path.exists(target) and os.stat(target).st_mtime >= source_mtime:
+        return False
+    with open(path, "rb") as source:
+        data = compress(source.read(), encoding)
+    # Write aside and rename, so a concurrent request never reads half a file
+    temporary = f"{target}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(data)
+    os.replace(temporary, target)
+    return True
+
+
+def precompress(directory: str) -> Dict[str, int]:
+    """Write compressed siblings of every compressible file under directory"""
+    counts = {"files": 0, "written": 0, "failed": 0}
+    suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(suffixes) or not is_compressible(path, os.path.getsize(path)):
+                continue
+            counts["files"] += 1
+            for encoding, suffix in ENCODINGS:
+                if encoding not in available_encodings():
+                    continue
+                try:
+                    counts["written"] += write_variant(path, encoding, suffix)
+                except OSError as e:
+                    counts["failed"] += 1
+                    logger.warning(f"Could not precompress {path}: {e}")
+    return counts
+
+
+class IndexPage:
+    """index.html bytes, compressed variants and ETag, keyed by the file's mtime and size"""
+
+    def __init__(self):
+        self.key: Optional[Tuple[int, int]] = None
+        self.etag = ""
+        self.bodies: Dict[str, bytes] = {}
+
+    def load(self, path: str, stat_result: os.stat_result) -> None:
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        if key == self.key:
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        self.bodies = {"identity": data}
+        for encoding in available_encodings():
+            self.bodies[encoding] = compress(data, encoding)
+        self.etag = f'"{hashlib.blake2s(data, digest_size=12).hexdigest()}"'
+        self.key = key
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles with precompressed variants, long-lived caching of hashed assets and an in-memory index.html"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = IndexPage()
+        self._compressing: Set[str] = set()
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = str(full_path)
+        relative = os.path.relpath(full_path, os.path.realpath(self.directory))
+        if relative == "index.html":
+            return self.index_response(full_path, stat_result, scope, status_code)
+
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if relative.startswith(HASHED_PREFIX) else REVALIDATE_CACHE_CONTROL,
+        }
+        path, encoding = full_path, None
+        if is_compressible(full_path, stat_result.st_size):
+            headers["Vary"] = "Accept-Encoding"
+            path, encoding, stat_result = self.choose_variant(full_path, stat_result, Headers(scope=scope))
+            if encoding:
+                headers["Content-Encoding"] = encoding
+
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+            method=scope["method"],
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return Response(status_code=304, headers={
+                key: value for key, value in response.headers.items()
+                if key in ("cache-control", "etag", "last-modified", "vary", "content-encoding")
+            })
+        return response
+
+    def choose_variant(
+        self, full_path: str, stat_result: os.stat_result, request_headers: Headers
+    ) -> Tuple[str, Optional[str], os.stat_result]:
+        """The best compressed sibling the client accepts, or the file itself"""
+        accepted = accepted_encodings(request_headers.get("accept-encoding"))
+        missing = False
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                missing = missing or encoding in available_encodings()
+                continue
+            # A sibling older than the file is stale (the build was replaced)
+            if variant_stat.st_mtime >= stat_result.st_mtime:
+                return full_path + suffix, encoding, variant_stat
+            missing = True
+        if missing:
+            self.compress_later(full_path)
+        return full_path, None, stat_result
+
+    def compress_later(self, full_path: str) -> None:
+        """Write the file's compressed siblings in a worker thread, once"""
+        if full_path in self._compressing:
+            return
+        self._compressing.add(full_path)
+
+        def write_all():
+            for encoding, suffix in ENCODINGS:
+                if encoding in available_encodings():
+                    write_variant(full_path, encoding, suffix)
+
+        async def run():
+            try:
+                await asyncio.to_thread(write_all)
+            except Exception as e:
+                # E.g. a read-only build directory: keep serving the file uncompressed
+                logger.warning(f"Could not compress {full_path}: {e}")
+            else:
+                self._compressing.discard(full_path)
+
+        task = asyncio.get_running_loop().create_task(run())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    def index_response(self, full_path: str, stat_result: os.stat_result, scope, status_code: int) -> Response:
+        self.index.load(full_path, stat_result)
+        headers = {"ETag": self.index.etag, "Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if etag_matches(Request(scope), self.index.etag):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding"))
+        encoding = next((encoding for encoding, _ in ENCODINGS if encoding in accepted and encoding in self.index.bodies), None)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        body = self.index.bodies[encoding or "identity"]
+        if scope["method"] == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=status_code, headers=headers, media_type="text/html")
+        return Response(body, status_code=status_code, headers=headers, media_type="text/html")
@@ -0,0 +1,219 @@
+"""
+Vectorised spending statistics.
+
+Expenses in a date range are loaded once into NumPy columns (amount, day
+number, integer category code, id) and every statistic is computed in a
+few batched array passes instead of per-dict Python loops:
+
+- rolling 7/30-day averages of daily spending (bincount + cumulative sums)
+- per-category percentiles (one lexsort, then index arithmetic per quantile)
+- month-over-month totals and deltas, overall and per category
+- z-score anomaly flags against each category's mean and standard deviation
+
+Building the columns and computing the statistics run in a worker thread,
+so a history of millions of rows doesn't stall the event loop (and every
+other request and event stream on the worker) while they run.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROLLING_WINDOWS = (7, 30)
+PERCENTILES = (0.5, 0.9, 0.99)
+DEFAULT_Z_THRESHOLD = 3.0
+MAX_ANOMALIES = 100
+CURSOR_BATCH_SIZE = 10000
+
+EPOCH = np.datetime64("1970-01-01", "D")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@dataclass
+class ExpenseColumns:
+    amounts: np.ndarray      # float64
+    days: np.ndarray         # int64, days since 1970-01-01
+    codes: np.ndarray        # int64 index into categories
+    categories: List[str]
+    ids: np.ndarray          # object (str)
+
+    @classmethod
+    def from_lists(cls, amounts: List[float], dates: List[datetime], categories: List[str], ids: List[str]) -> "ExpenseColumns":
+        # Plain Python passes here are several times faster than NumPy's
+        # object-to-datetime64 and object-to-str conversions
+        seen: Dict[str, int] = {}
+        raw_codes = np.fromiter((seen.setdefault(name, len(seen)) for name in categories), dtype=np.int64, count=len(categories))
+        names = sorted(seen)
+        # Renumber so codes follow the sorted category names
+        remap = np.empty(len(names), dtype=np.int64)
+        remap[[seen[name] for name in names]] = np.arange(len(names))
+        days = np.fromiter((value.toordinal() - EPOCH_ORDINAL for value in dates), dtype=np.int64, count=len(dates))
+        return cls(
+            amounts=np.asarray(amounts, dtype=np.float64),
+            days=days,
+            codes=remap[raw_codes] if len(names) else raw_codes,
+            categories=names,
+            ids=np.asarray(ids, dtype=object),
+        )
+
+
+async def load_columns(db, start: date, end: date, category: Optional[str] = None) -> ExpenseColumns:
+    """Load the expense columns for whole days start..end (inclusive)"""
+    query: Dict[str, Any] = {
+        "date": {
+            "$gte": datetime(start.year, start.month, start.day),
+            "$lt": datetime(end.year, end.month, end.day) + timedelta(days=1),
+        }
+    }
+    if category:
+        query["category"] = category
+    amounts, dates, categories, ids = [], [], [], []
+    cursor = db.expenses.find(query, {"_id": 0, "id": 1, "amount": 1, "date": 1, "category": 1})
+    async for doc in cursor.batch_size(CURSOR_BATCH_SIZE):
+        amounts.append(doc["amount"])
+        dates.append(doc["date"])
+        categories.append(doc["category"])
+        ids.append(doc["id"])
+    return await asyncio.to_thread(ExpenseColumns.from_lists, amounts, dates, categories, ids)
+
+
+def _day_to_iso(day: int) -> str:
+    return str(EPOCH + np.timedelta64(int(day), "D"))
+
+
+def rolling_averages(columns: ExpenseColumns, first_day: int, n_days: int) -> Dict[str, Any]:
+    """Daily totals and trailing rolling means over each window"""
+    daily = np.bincount(columns.days - first_day, weights=columns.amounts, minlength=n_days)[:n_days]
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    positions = np.arange(1, n_days + 1)
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        lower = np.maximum(positions - window, 0)
+        # Average over the days available so far for the first window-1 days
+        rolling[str(window)] = ((cumulative[positions] - cumulative[lower]) / np.minimum(positions, window)).tolist()
+    return {"daily_totals": daily.tolist(), "rolling_averages": rolling}
+
+
+def category_percentiles(columns: ExpenseColumns) -> Dict[str, Dict[str, float]]:
+    """Linear-interpolated percentiles of expense amounts per category"""
+    n_categories = len(columns.categories)
+    if not n_categories:
+        return {}
+    order = np.lexsort((columns.amounts, columns.codes))
+    ordered = columns.amounts[order]
+    counts = np.bincount(columns.codes, minlength=n_categories)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    result: Dict[str, Dict[str, float]] = {name: {} for name, keep in zip(columns.categories, present) if keep}
+    for quantile in PERCENTILES:
+        positions = starts + quantile * (np.maximum(counts, 1) - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.ceil(positions).astype(np.int64)
+        lower_values = ordered[np.minimum(lower, len(ordered) - 1)]
+        upper_values = ordered[np.minimum(upper, len(ordered) - 1)]
+        values = lower_values + (upper_values - lower_values) * (positions - lower)
+        label = f"p{int(round(quantile * 100))}"
+        for index in np.flatnonzero(present):
+            result[columns.categories[index]][label] = float(values[index])
+    return result
+
+
+def month_over_month(columns: ExpenseColumns) -> Dict[str, Any]:
+    """Monthly totals and their changes, overall and per category"""
+    if not len(columns.amounts):
+        return {"months": [], "totals": [], "deltas": [], "percent_changes": [], "by_category": {}}
+    months = (EPOCH + columns.days.astype("timedelta64[D]")).astype("datetime64[M]").astype(np.int64)
+    first_month = int(months.min())
+    n_months = int(months.max()) - first_month + 1
+    month_index = months - first_month
+    n_categories = len(columns.categories)
+
+    totals = np.bincount(month_index, weights=columns.amounts, minlength=n_months)
+    grid = np.bincount(
+        month_index * n_categories + columns.codes, weights=columns.amounts, minlength=n_months * n_categories
+    ).reshape(n_months, n_categories)
+
+    def changes(series: np.ndarray):
+        deltas = np.diff(series)
+        previous = series[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percent = np.where(previous > 0, deltas / previous * 100, np.nan)
+        return deltas.tolist(), [None if np.isnan(value) else float(value) for value in percent]
+
+    deltas, percent_changes = changes(totals)
+    by_category = {}
+    for index, name in enumerate(columns.categories):
+        category_deltas, category_percent = changes(grid[:, index])
+        by_category[name] = {
+            "totals": grid[:, index].tolist(),
+            "deltas": category_deltas,
+            "percent_changes": category_percent,
+        }
+    month_labels = np.arange(first_month, first_month + n_months).astype("datetime64[M]").astype(str)
+    return {
+        "months": month_labels.tolist(),
+        "totals": totals.tolist(),
+        "deltas": deltas,
+        "percent_changes": percent_changes,
+        "by_category": by_category,
+    }
+
+
+def anomalies(columns: ExpenseColumns, z_threshold: float = DEFAULT_Z_THRESHOLD) -> Dict[str, Any]:
+    """Expenses whose amount is z_threshold or more standard deviations from their category mean"""
+    n_categories = len(columns.categories)
+    if not len(columns.amounts):
+        return {"threshold": z_threshold, "count": 0, "expenses": [], "category_stats": {}}
+    counts = np.bincount(columns.codes, minlength=n_categories)
+    sums = np.bincount(columns.codes, weights=columns.amounts, minlength=n_categories)
+    squares = np.bincount(columns.codes, weights=columns.amounts ** 2, minlength=n_categories)
+    means = sums / np.maximum(counts, 1)
+    stds = np.sqrt(np.maximum(squares / np.maximum(counts, 1) - means ** 2, 0.0))
+
+    row_std = stds[columns.codes]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(row_std > 0, (columns.amounts - means[columns.codes]) / row_std, 0.0)
+    flagged = np.flatnonzero(np.abs(z) >= z_threshold)
+    # Most extreme first
+    flagged = flagged[np.argsort(-np.abs(z[flagged]))]
+    return {
+        "threshold": z_threshold,
+        "count": int(len(flagged)),
+        "expenses": [
+            {
+                "id": columns.ids[index],
+                "amount": float(columns.amounts[index]),
+                "category": columns.categories[columns.codes[index]],
+                "date": _day_to_iso(columns.days[index]),
+                "z_score": float(z[index]),
+            }
+            for index in flagged[:MAX_ANOMALIES]
+        ],
+        "category_stats": {
+            name: {"count": int(counts[i]), "mean": float(means[i]), "std": float(stds[i])}
+            for i, name in enumerate(columns.categories) if counts[i]
+        },
+    }
+
+
+def compute_stats(columns: ExpenseColumns, start: date, end: date, z_threshold: float = DEFAULT_Z_THRESHOLD) -> Dict[str, Any]:
+    first_day = (start - date(1970, 1, 1)).days
+    n_days = (end - start).days + 1
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "expense_count": int(len(columns.amounts)),
+        "days": [_day_to_iso(day) for day in range(first_day, first_day + n_days)],
+        **rolling_averages(columns, first_day, n_days),
+        "percentiles": category_percentiles(columns),
+        "month_over_month": month_over_month(columns),
+        "anomalies": anomalies(columns, z_threshold),
+    }
+
+
+async def spending_stats(db, start: date, end: date, category: Optional[str] = None, z_threshold: float = DEFAULT_Z_THRESHOLD) -> Dict[str, Any]:
+    columns = await load_columns(db, start, end, category)
+    return await asyncio.to_thread(compute_stats, columns, start, end, z_threshold)
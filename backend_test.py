@@ -34,6 +34,11 @@ class NBNTrackerTester:
             if response.status_code == 200:
                 data = response.json()
                 if data.get("status") == "healthy":
+                    for probe in ("live", "ready"):
+                        response = self.session.get(f"{BACKEND_URL}/health/{probe}")
+                        if response.status_code != 200:
+                            self.log(f"❌ Health {probe} probe failed - status code: {response.status_code}", "ERROR")
+                            return False
                     self.log("✅ Health check passed", "SUCCESS")
                     return True
                 else:
@@ -266,6 +271,249 @@ class NBNTrackerTester:
             self.log(f"❌ Expense CRUD tests failed - exception: {str(e)}", "ERROR")
             return False
     
+    def test_expense_pagination(self):
+        """Test keyset pagination of the expense list"""
+        self.log("Testing Expense Cursor Pagination...")
+        
+        try:
+            seen_ids = []
+            cursor = None
+            pages = 0
+            while pages < 50:
+                params = {"limit": 1}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.session.get(f"{BACKEND_URL}/expenses", params=params)
+                if response.status_code != 200:
+                    self.log(f"❌ Failed to get expense page: {response.status_code}", "ERROR")
+                    return False
+                page = response.json()
+                if len(page) > 1:
+                    self.log(f"❌ Page larger than limit: {len(page)}", "ERROR")
+                    return False
+                seen_ids.extend(exp['id'] for exp in page)
+                pages += 1
+                cursor = response.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            
+            if len(seen_ids) != len(set(seen_ids)):
+                self.log("❌ Pagination returned duplicate expenses", "ERROR")
+                return False
+            
+            # Invalid cursors are rejected
+            response = self.session.get(f"{BACKEND_URL}/expenses", params={"cursor": "not-a-cursor"})
+            if response.status_code != 400:
+                self.log(f"❌ Expected 400 for invalid cursor, got {response.status_code}", "ERROR")
+                return False
+            
+            # Unbounded pages are rejected
+            for limit in (0, -1, 100000):
+                response = self.session.get(f"{BACKEND_URL}/expenses", params={"limit": limit})
+                if response.status_code != 422:
+                    self.log(f"❌ Expected 422 for limit={limit}, got {response.status_code}", "ERROR")
+                    return False
+            
+            self.log(f"✅ Paged through {len(seen_ids)} expenses in {pages} pages without duplicates", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Expense pagination tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_sparse_fieldsets(self):
+        """Test fields= projections on list endpoints"""
+        self.log("Testing Sparse Fieldsets...")
+        
+        try:
+            for path, fields in (("expenses", {"id", "amount"}), ("subscriptions", {"id", "name"})):
+                response = self.session.get(f"{BACKEND_URL}/{path}", params={"fields": ",".join(sorted(fields))})
+                if response.status_code != 200:
+                    self.log(f"❌ Failed to get {path} with fields: {response.status_code} - {response.text}", "ERROR")
+                    return False
+                items = response.json()
+                if not items:
+                    self.log(f"❌ No {path} to check the projection against", "ERROR")
+                    return False
+                extra = [sorted(item) for item in items if set(item) != fields]
+                if extra:
+                    self.log(f"❌ {path} items carry other keys than {sorted(fields)}: {extra[0]}", "ERROR")
+                    return False
+                self.log(f"✅ {path} limited to {sorted(fields)} in {len(items)} items")
+            
+            # Unknown fields are rejected
+            response = self.session.get(f"{BACKEND_URL}/expenses", params={"fields": "id,not_a_field"})
+            if response.status_code != 400:
+                self.log(f"❌ Expected 400 for an unknown field, got {response.status_code}", "ERROR")
+                return False
+            self.log("✅ Unknown field rejected with 400")
+            
+            self.log("✅ Sparse fieldset tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Sparse fieldset tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_rollup_consistency(self):
+        """Test that dashboard and category totals follow expense writes"""
+        self.log("Testing Rollup Consistency...")
+        
+        # Unique categories, so their totals come from this test's expense only
+        first_category = f"rollup-a-{uuid.uuid4().hex[:8]}"
+        second_category = f"rollup-b-{uuid.uuid4().hex[:8]}"
+        
+        def totals():
+            dashboard = self.session.get(f"{BACKEND_URL}/dashboard")
+            categories = self.session.get(f"{BACKEND_URL}/analytics/categories")
+            if dashboard.status_code != 200 or categories.status_code != 200:
+                raise Exception(f"totals unavailable: {dashboard.status_code}/{categories.status_code}")
+            dashboard = dashboard.json()
+            breakdown = categories.json()['category_breakdown']
+            raw = {}
+            for category in (first_category, second_category):
+                expenses = self.session.get(f"{BACKEND_URL}/expenses", params={"category": category}).json()
+                raw[category] = sum(expense['amount'] for expense in expenses)
+            return dashboard, breakdown, raw
+        
+        def check(step, baseline, expected):
+            dashboard, breakdown, raw = totals()
+            monthly_change = dashboard['current_monthly_spending'] - baseline['current_monthly_spending']
+            yearly_change = dashboard['current_yearly_spending'] - baseline['current_yearly_spending']
+            expected_total = sum(expected.values())
+            if abs(monthly_change - expected_total) > 0.01 or abs(yearly_change - expected_total) > 0.01:
+                self.log(f"❌ Dashboard totals off after {step}: monthly {monthly_change:+.2f}, yearly {yearly_change:+.2f}, expected {expected_total:+.2f}", "ERROR")
+                return False
+            for category, amount in expected.items():
+                for source, values in (("dashboard", dashboard['category_breakdown']), ("category analytics", breakdown), ("expense list", raw)):
+                    if abs(values.get(category, 0) - amount) > 0.01:
+                        self.log(f"❌ {source} total for {category} after {step} is {values.get(category, 0)}, expected {amount}", "ERROR")
+                        return False
+            self.log(f"✅ Totals match the raw expenses after {step}")
+            return True
+        
+        try:
+            baseline, _, _ = totals()
+            
+            # Create
+            response = self.session.post(f"{BACKEND_URL}/expenses", json={
+                "amount": 250.0,
+                "category": first_category,
+                "notes": "Rollup check",
+                "date": datetime.utcnow().isoformat()
+            })
+            if response.status_code != 200:
+                self.log(f"❌ Failed to create expense: {response.status_code} - {response.text}", "ERROR")
+                return False
+            expense_id = response.json()['id']
+            self.created_items['expenses'].append(expense_id)
+            if not check("create", baseline, {first_category: 250.0, second_category: 0.0}):
+                return False
+            
+            # Update amount and category
+            response = self.session.put(f"{BACKEND_URL}/expenses/{expense_id}", json={"amount": 400.0, "category": second_category})
+            if response.status_code != 200:
+                self.log(f"❌ Failed to update expense: {response.status_code} - {response.text}", "ERROR")
+                return False
+            if not check("update", baseline, {first_category: 0.0, second_category: 400.0}):
+                return False
+            
+            # Delete
+            response = self.session.delete(f"{BACKEND_URL}/expenses/{expense_id}")
+            if response.status_code != 200:
+                self.log(f"❌ Failed to delete expense: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.created_items['expenses'].remove(expense_id)
+            if not check("delete", baseline, {first_category: 0.0, second_category: 0.0}):
+                return False
+            
+            self.log("✅ Rollup consistency tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Rollup consistency tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_bulk_expense_operations(self):
+        """Test bulk import, bulk update and bulk delete of expenses"""
+        self.log("Testing Bulk Expense Operations...")
+        
+        # Unique tag so the test only ever touches its own rows
+        batch_tag = f"bulk-test-{uuid.uuid4().hex[:8]}"
+        
+        try:
+            # Bulk import (NDJSON) with one invalid row
+            rows = [
+                {"amount": 120.0, "category": "food", "tags": [batch_tag, "swiggy"], "notes": "Swiggy order"},
+                {"amount": 310.0, "category": "food", "tags": [batch_tag, "uber"], "notes": "Uber Eats"},
+                {"amount": "not-a-number", "category": "food", "tags": [batch_tag]},
+                {"amount": 95.0, "category": "other", "tags": [batch_tag, "uber"], "notes": "Uber auto"},
+            ]
+            body = "\n".join(json.dumps(row) for row in rows)
+            response = self.session.post(
+                f"{BACKEND_URL}/expenses/bulk",
+                data=body.encode(),
+                headers={"Content-Type": "application/x-ndjson"},
+                params={"batch_size": 2}
+            )
+            if response.status_code != 200:
+                self.log(f"❌ Bulk import failed: {response.status_code} - {response.text}", "ERROR")
+                return False
+            result = response.json()
+            if result['inserted'] != 3 or result['failed'] != 1 or result['errors'][0]['row'] != 3:
+                self.log(f"❌ Unexpected bulk import result: {result}", "ERROR")
+                return False
+            self.log("✅ Bulk import inserted valid rows and reported the invalid one")
+            
+            # Dry run counts without changing anything
+            bulk_filter = {"tags": [batch_tag, "uber"]}
+            response = self.session.post(f"{BACKEND_URL}/expenses/bulk-update", json={
+                "filter": bulk_filter, "set": {"category": "transport"}, "dry_run": True
+            })
+            if response.status_code != 200 or response.json()['matched'] != 2 or response.json()['modified'] != 0:
+                self.log(f"❌ Bulk update dry run failed: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.log("✅ Bulk update dry run counted matching expenses")
+            
+            # Re-categorise everything tagged uber
+            response = self.session.post(f"{BACKEND_URL}/expenses/bulk-update", json={
+                "filter": bulk_filter, "set": {"category": "transport"}, "add_tags": ["ride"]
+            })
+            if response.status_code != 200 or response.json()['modified'] != 2:
+                self.log(f"❌ Bulk update failed: {response.status_code} - {response.text}", "ERROR")
+                return False
+            response = self.session.get(f"{BACKEND_URL}/expenses", params={"tags": [batch_tag, "ride"]})
+            moved = response.json()
+            if len(moved) != 2 or any(exp['category'] != 'transport' for exp in moved):
+                self.log(f"❌ Bulk update not applied: {moved}", "ERROR")
+                return False
+            self.log("✅ Bulk update re-categorised and retagged expenses")
+            
+            # Filters are required for bulk deletes
+            response = self.session.post(f"{BACKEND_URL}/expenses/bulk-delete", json={"filter": {}})
+            if response.status_code != 400:
+                self.log(f"❌ Expected 400 for unfiltered bulk delete, got {response.status_code}", "ERROR")
+                return False
+            for path, body in (("bulk-update", {"filter": {}, "set": {"category": "other"}}), ("bulk-delete", {"filter": {}})):
+                response = self.session.post(f"{BACKEND_URL}/subscriptions/{path}", json=body)
+                if response.status_code != 400:
+                    self.log(f"❌ Expected 400 for unfiltered subscription {path}, got {response.status_code}", "ERROR")
+                    return False
+            
+            # Clean up everything the test imported
+            response = self.session.post(f"{BACKEND_URL}/expenses/bulk-delete", json={"filter": {"tags": [batch_tag]}})
+            if response.status_code != 200 or response.json()['matched'] != 3:
+                self.log(f"❌ Bulk delete failed: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.log("✅ Bulk delete removed the imported expenses")
+            
+            self.log("✅ Bulk expense operation tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Bulk expense operation tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
     def test_budget_crud(self):
         """Test budget CRUD operations"""
         self.log("Testing Budget Management CRUD...")
@@ -315,7 +563,21 @@ class NBNTrackerTester:
             else:
                 self.log(f"❌ Failed to get budgets: {response.status_code}", "ERROR")
                 return False
-            
+
+            # Test STATUS (every budget evaluated, not only exceeded ones)
+            self.log("Testing budget status...")
+            response = self.session.get(f"{BACKEND_URL}/budgets/status")
+            if response.status_code == 200:
+                statuses = {status['id']: status for status in response.json()['budgets']}
+                missing = [budget_id for budget_id in self.created_items['budgets'] if budget_id not in statuses]
+                if missing:
+                    self.log(f"❌ Budget status missing budgets: {missing}", "ERROR")
+                    return False
+                self.log(f"✅ Budget status evaluated {len(statuses)} budgets")
+            else:
+                self.log(f"❌ Failed to get budget status: {response.status_code}", "ERROR")
+                return False
+
             # Test UPDATE
             if self.created_items['budgets']:
                 budget_id = self.created_items['budgets'][0]
@@ -444,7 +706,35 @@ class NBNTrackerTester:
             else:
                 self.log(f"❌ Failed to get spending trends: {response.status_code}", "ERROR")
                 return False
-            
+
+            # Test subscription forecast
+            self.log("Testing subscription forecast...")
+            response = self.session.get(f"{BACKEND_URL}/analytics/forecast", params={"months": 24})
+            if response.status_code == 200:
+                forecast_data = response.json()
+                if len(forecast_data.get('buckets', [])) == 24 and len(forecast_data.get('totals', [])) == 24:
+                    self.log(f"✅ Forecast retrieved: {forecast_data['total']:.2f} over 24 months")
+                else:
+                    self.log(f"❌ Forecast has the wrong number of buckets: {forecast_data}", "ERROR")
+                    return False
+            else:
+                self.log(f"❌ Failed to get forecast: {response.status_code}", "ERROR")
+                return False
+
+            # Test tag analytics
+            self.log("Testing tag analytics...")
+            response = self.session.get(f"{BACKEND_URL}/analytics/tags", params={"top": 3})
+            if response.status_code == 200:
+                tag_data = response.json()
+                if all(key in tag_data for key in ('tags', 'co_occurrence', 'periods')):
+                    self.log(f"✅ Tag analytics retrieved: {tag_data['tag_count']} tags")
+                else:
+                    self.log(f"❌ Tag analytics missing breakdowns: {list(tag_data)}", "ERROR")
+                    return False
+            else:
+                self.log(f"❌ Failed to get tag analytics: {response.status_code}", "ERROR")
+                return False
+
             self.log("✅ Analytics endpoints tests passed", "SUCCESS")
             return True
             
@@ -452,53 +742,507 @@ class NBNTrackerTester:
             self.log(f"❌ Analytics endpoints tests failed - exception: {str(e)}", "ERROR")
             return False
     
+    def test_month_end_billing(self):
+        """Test that a subscription billed on the 31st keeps its billing day"""
+        self.log("Testing Month-End Billing...")
+        
+        try:
+            # Due on the last day of February, billed on the 31st
+            year = datetime.now().year + 1
+            february_end = datetime(year, 3, 1) - timedelta(days=1)
+            category = f"month-end-{uuid.uuid4().hex[:8]}"
+            sub_data = {
+                "name": "Hotstar Month-End",
+                "cost": 299.0,
+                "billing_frequency": "monthly",
+                "next_due_date": february_end.isoformat(),
+                "billing_day": 31,
+                "category": category
+            }
+            response = self.session.post(f"{BACKEND_URL}/subscriptions", json=sub_data)
+            if response.status_code != 200:
+                self.log(f"❌ Failed to create subscription: {response.status_code} - {response.text}", "ERROR")
+                return False
+            created_sub = response.json()
+            self.created_items['subscriptions'].append(created_sub['id'])
+            if created_sub.get('billing_day') != 31 or not created_sub['next_due_date'].startswith(february_end.date().isoformat()):
+                self.log(f"❌ Billing day or due date not kept: {created_sub}", "ERROR")
+                return False
+            self.log("✅ Billing day 31 kept for a subscription due on the last day of February")
+            
+            # A due date on the 31st sets the billing day by itself
+            response = self.session.post(
+                f"{BACKEND_URL}/subscriptions",
+                json={**sub_data, "name": "Hotstar January", "billing_day": None, "next_due_date": datetime(year, 1, 31).isoformat()}
+            )
+            if response.status_code != 200 or response.json().get('billing_day') != 31:
+                self.log(f"❌ Billing day not derived from next_due_date: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.created_items['subscriptions'].append(response.json()['id'])
+            self.log("✅ Billing day derived from a Jan 31 due date")
+            
+            # Charged on Mar 31, not the 28th: a forecast starting on Mar 31 includes March.
+            # The Jan 31 subscription is charged on Mar 31 and Apr 30 as well
+            response = self.session.get(
+                f"{BACKEND_URL}/analytics/forecast",
+                params={"start_date": f"{year}-03-31", "months": 2}
+            )
+            if response.status_code != 200:
+                self.log(f"❌ Failed to get forecast: {response.status_code} - {response.text}", "ERROR")
+                return False
+            series = response.json().get('series', {}).get(category)
+            if series != [598.0, 598.0]:
+                self.log(f"❌ Month-end charges drifted: expected [598.0, 598.0] for Mar/Apr, got {series}", "ERROR")
+                return False
+            self.log("✅ Forecast charges both subscriptions on Mar 31 and Apr 30")
+            
+            # The billing day survives an export
+            response = self.session.get(f"{BACKEND_URL}/export/csv", params={"format": "ndjson", "collection": "subscriptions"})
+            if response.status_code != 200:
+                self.log(f"❌ Failed to export subscriptions: {response.status_code}", "ERROR")
+                return False
+            records = [json.loads(line) for line in response.text.splitlines() if line]
+            exported = next((record for record in records if record.get('id') == created_sub['id']), None)
+            if not exported or exported.get('billing_day') != 31:
+                self.log(f"❌ Billing day missing from export: {exported}", "ERROR")
+                return False
+            self.log("✅ Billing day included in the export")
+            
+            self.log("✅ Month-end billing tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Month-end billing tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_spending_timeseries(self):
+        """Test zero-filled spending time series and their splits"""
+        self.log("Testing Spending Time Series...")
+        
+        # Expenses far in the past, under a unique tag and categories, so the series only hold this test's data
+        series_tag = f"series-{uuid.uuid4().hex[:8]}"
+        first_category = f"series-a-{uuid.uuid4().hex[:8]}"
+        second_category = f"series-b-{uuid.uuid4().hex[:8]}"
+        test_expenses = [
+            {"amount": 100.0, "category": first_category, "tags": [series_tag], "date": "2001-01-10T12:00:00"},
+            {"amount": 50.0, "category": second_category, "tags": [series_tag], "date": "2001-03-05T12:00:00"},
+        ]
+        window = {"start_date": "2001-01-01", "end_date": "2001-03-31", "tags": [series_tag]}
+        
+        try:
+            for expense in test_expenses:
+                response = self.session.post(f"{BACKEND_URL}/expenses", json=expense)
+                if response.status_code != 200:
+                    self.log(f"❌ Failed to create expense: {response.status_code} - {response.text}", "ERROR")
+                    return False
+                self.created_items['expenses'].append(response.json()['id'])
+            
+            # Bucket counts per granularity: 90 days, 13 Monday-based weeks, 3 months, 1 quarter
+            for granularity, count in (("day", 90), ("week", 13), ("month", 3), ("quarter", 1)):
+                response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params={**window, "granularity": granularity})
+                if response.status_code != 200:
+                    self.log(f"❌ Failed to get {granularity} series: {response.status_code} - {response.text}", "ERROR")
+                    return False
+                data = response.json()
+                if len(data['buckets']) != count or len(data['totals']) != count:
+                    self.log(f"❌ Expected {count} {granularity} buckets, got {len(data['buckets'])}", "ERROR")
+                    return False
+                if abs(sum(data['totals']) - 150.0) > 0.01:
+                    self.log(f"❌ {granularity} totals sum to {sum(data['totals'])}, expected 150", "ERROR")
+                    return False
+            self.log("✅ Bucket counts match each granularity")
+            
+            # Months without spending are zero-filled
+            response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params={**window, "granularity": "month"})
+            data = response.json()
+            if data['buckets'] != ["2001-01-01", "2001-02-01", "2001-03-01"] or data['totals'] != [100.0, 0.0, 50.0]:
+                self.log(f"❌ Unexpected monthly series: {data['buckets']} {data['totals']}", "ERROR")
+                return False
+            self.log("✅ February zero-filled between January and March spending")
+            
+            # Split by category and by tag
+            response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params={**window, "granularity": "month", "split": "category"})
+            series = response.json().get('series', {}) if response.status_code == 200 else {}
+            if series.get(first_category) != [100.0, 0.0, 0.0] or series.get(second_category) != [0.0, 0.0, 50.0]:
+                self.log(f"❌ Unexpected category split: {series}", "ERROR")
+                return False
+            response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params={**window, "granularity": "month", "split": "tag"})
+            series = response.json().get('series', {}) if response.status_code == 200 else {}
+            if series.get(series_tag) != [100.0, 0.0, 50.0]:
+                self.log(f"❌ Unexpected tag split: {series}", "ERROR")
+                return False
+            self.log("✅ Category and tag splits match the expenses")
+            
+            # The rollup-backed path (no tag filter) agrees for one category
+            response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params={
+                "start_date": "2001-01-01", "end_date": "2001-03-31", "granularity": "month", "category": first_category
+            })
+            if response.status_code != 200 or response.json()['totals'] != [100.0, 0.0, 0.0]:
+                self.log(f"❌ Unexpected rollup-backed series: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.log("✅ Rollup-backed series matches")
+            
+            # Invalid requests
+            invalid = [
+                ("bad granularity", {"granularity": "hour"}),
+                ("start after end", {"start_date": "2001-03-31", "end_date": "2001-01-01"}),
+                ("too many buckets", {"start_date": "1980-01-01", "end_date": "2020-12-31", "granularity": "day"}),
+            ]
+            for label, params in invalid:
+                response = self.session.get(f"{BACKEND_URL}/analytics/timeseries", params=params)
+                if response.status_code != 400:
+                    self.log(f"❌ Expected 400 for {label}, got {response.status_code}", "ERROR")
+                    return False
+            self.log("✅ Invalid time series requests rejected with 400")
+            
+            self.log("✅ Spending time series tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Spending time series tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_spending_stats(self):
+        """Test rolling averages, percentiles, month-over-month changes and anomaly flags"""
+        self.log("Testing Spending Statistics...")
+        
+        # Twenty steady expenses in February and one outlier in March, in a unique category
+        stats_category = f"stats-{uuid.uuid4().hex[:8]}"
+        test_expenses = [
+            {"amount": 100.0, "category": stats_category, "date": f"2002-02-{day:02d}T12:00:00"}
+            for day in range(1, 21)
+        ]
+        test_expenses.append({"amount": 5000.0, "category": stats_category, "date": "2002-03-05T12:00:00"})
+        params = {"start_date": "2002-02-01", "end_date": "2002-03-31", "category": stats_category}
+        
+        try:
+            for expense in test_expenses:
+                response = self.session.post(f"{BACKEND_URL}/expenses", json=expense)
+                if response.status_code != 200:
+                    self.log(f"❌ Failed to create expense: {response.status_code} - {response.text}", "ERROR")
+                    return False
+                self.created_items['expenses'].append(response.json()['id'])
+            
+            response = self.session.get(f"{BACKEND_URL}/analytics/stats", params=params)
+            if response.status_code != 200:
+                self.log(f"❌ Failed to get spending statistics: {response.status_code} - {response.text}", "ERROR")
+                return False
+            data = response.json()
+            
+            if data['expense_count'] != 21 or len(data['days']) != 59:
+                self.log(f"❌ Expected 21 expenses over 59 days, got {data['expense_count']} over {len(data['days'])}", "ERROR")
+                return False
+            
+            # Rolling averages: one value per day for each window
+            rolling = data['rolling_averages']
+            if set(rolling) != {"7", "30"} or any(len(values) != 59 for values in rolling.values()):
+                self.log(f"❌ Unexpected rolling averages: {list(rolling)}", "ERROR")
+                return False
+            if abs(rolling["7"][6] - 100.0) > 0.01:
+                self.log(f"❌ Expected a 7-day average of 100 on Feb 7, got {rolling['7'][6]}", "ERROR")
+                return False
+            self.log("✅ Rolling averages cover every day")
+            
+            # Percentiles per category
+            percentiles = data['percentiles'].get(stats_category, {})
+            if set(percentiles) != {"p50", "p90", "p99"} or abs(percentiles['p50'] - 100.0) > 0.01:
+                self.log(f"❌ Unexpected percentiles: {percentiles}", "ERROR")
+                return False
+            self.log("✅ Percentiles computed")
+            
+            # Month-over-month totals and deltas
+            monthly = data['month_over_month']
+            expected_keys = {"months", "totals", "deltas", "percent_changes", "by_category"}
+            if not expected_keys.issubset(monthly):
+                self.log(f"❌ Missing month-over-month keys: {expected_keys - set(monthly)}", "ERROR")
+                return False
+            if monthly['months'] != ["2002-02", "2002-03"] or monthly['totals'] != [2000.0, 5000.0] or monthly['deltas'] != [3000.0]:
+                self.log(f"❌ Unexpected month-over-month values: {monthly}", "ERROR")
+                return False
+            self.log("✅ Month-over-month changes correct")
+            
+            # Only the seeded outlier is flagged
+            flagged = data['anomalies']
+            if flagged['count'] != 1 or flagged['expenses'][0]['amount'] != 5000.0:
+                self.log(f"❌ Expected only the 5000 outlier to be flagged, got {flagged['expenses']}", "ERROR")
+                return False
+            self.log(f"✅ Outlier flagged with z-score {flagged['expenses'][0]['z_score']:.2f}")
+            
+            # Non-positive thresholds are rejected
+            for threshold in (0, -1):
+                response = self.session.get(f"{BACKEND_URL}/analytics/stats", params={**params, "z_threshold": threshold})
+                if response.status_code != 400:
+                    self.log(f"❌ Expected 400 for z_threshold={threshold}, got {response.status_code}", "ERROR")
+                    return False
+            self.log("✅ Non-positive z_threshold rejected with 400")
+            
+            self.log("✅ Spending statistics tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Spending statistics tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_result_cache(self):
+        """Test result cache hits and invalidation by writes"""
+        self.log("Testing Result Cache...")
+        
+        try:
+            def cache_stats():
+                response = self.session.get(f"{BACKEND_URL}/stats/cache")
+                if response.status_code != 200:
+                    raise Exception(f"cache stats unavailable: {response.status_code}")
+                return response.json()
+            
+            def category_breakdown():
+                response = self.session.get(f"{BACKEND_URL}/analytics/categories")
+                if response.status_code != 200:
+                    raise Exception(f"category analytics unavailable: {response.status_code}")
+                return response.json()['category_breakdown']
+            
+            # The second identical request is served from the cache
+            before = cache_stats()
+            first = category_breakdown()
+            second = category_breakdown()
+            after = cache_stats()
+            if first != second:
+                self.log("❌ Repeated request returned a different result", "ERROR")
+                return False
+            if after['hits'] <= before['hits'] or after['hits'] + after['misses'] < before['hits'] + before['misses'] + 2:
+                self.log(f"❌ Cache counters did not move as expected: {before} -> {after}", "ERROR")
+                return False
+            self.log(f"✅ Cache hits {before['hits']} -> {after['hits']}, misses {before['misses']} -> {after['misses']}")
+            
+            # A write invalidates the cached result
+            category = f"cache-{uuid.uuid4().hex[:8]}"
+            response = self.session.post(f"{BACKEND_URL}/expenses", json={
+                "amount": 123.0,
+                "category": category,
+                "date": datetime.utcnow().isoformat()
+            })
+            if response.status_code != 200:
+                self.log(f"❌ Failed to create expense: {response.status_code} - {response.text}", "ERROR")
+                return False
+            self.created_items['expenses'].append(response.json()['id'])
+            
+            third = category_breakdown()
+            if abs(third.get(category, 0) - 123.0) > 0.01:
+                self.log(f"❌ Cached result not invalidated by the write: {category} = {third.get(category)}", "ERROR")
+                return False
+            invalidated = cache_stats()
+            if invalidated['invalidations'] <= after['invalidations']:
+                self.log(f"❌ Write did not count as an invalidation: {after} -> {invalidated}", "ERROR")
+                return False
+            self.log("✅ Write reflected in the next response")
+            
+            self.log("✅ Result cache tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Result cache tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_conditional_get(self):
+        """Test ETag / If-None-Match revalidation"""
+        self.log("Testing Conditional GETs...")
+        
+        try:
+            for path in ["subscriptions", "expenses?category=food", "budgets", "dashboard"]:
+                response = self.session.get(f"{BACKEND_URL}/{path}")
+                etag = response.headers.get("ETag")
+                if response.status_code != 200 or not etag:
+                    self.log(f"❌ {path} returned no ETag: {response.status_code}", "ERROR")
+                    return False
+                response = self.session.get(f"{BACKEND_URL}/{path}", headers={"If-None-Match": etag})
+                if response.status_code != 304:
+                    self.log(f"❌ Expected 304 for unchanged {path}, got {response.status_code}", "ERROR")
+                    return False
+                self.log(f"✅ {path} revalidated with 304")
+            
+            self.log("✅ Conditional GET tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Conditional GET tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_static_assets(self):
+        """Test compressed, cached serving of the frontend build"""
+        self.log("Testing Static Assets...")
+        site_url = BACKEND_URL.rsplit("/api", 1)[0]
+        
+        try:
+            response = self.session.get(f"{site_url}/", headers={"Accept-Encoding": "gzip"})
+            etag = response.headers.get("ETag")
+            if response.status_code != 200 or not etag or response.headers.get("Content-Encoding") != "gzip":
+                self.log(f"❌ index.html not served gzipped with an ETag: {response.status_code} {dict(response.headers)}", "ERROR")
+                return False
+            response = self.session.get(f"{site_url}/", headers={"If-None-Match": etag})
+            if response.status_code != 304:
+                self.log(f"❌ Expected 304 for unchanged index.html, got {response.status_code}", "ERROR")
+                return False
+            self.log("✅ index.html served gzipped and revalidated with 304")
+            
+            manifest = self.session.get(f"{site_url}/asset-manifest.json").json()
+            bundle = manifest["files"]["main.js"]
+            response = self.session.get(f"{site_url}{bundle}", headers={"Accept-Encoding": "gzip"})
+            cache_control = response.headers.get("Cache-Control", "")
+            if response.status_code != 200 or "immutable" not in cache_control:
+                self.log(f"❌ {bundle} not cached as immutable: {response.status_code} {cache_control}", "ERROR")
+                return False
+            self.log(f"✅ {bundle} served with {cache_control} ({response.headers.get('Content-Encoding', 'identity')})")
+            
+            self.log("✅ Static asset tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Static asset tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
+    def test_expense_search(self):
+        """Test full-text expense search"""
+        self.log("Testing Expense Search...")
+
+        try:
+            expense = {"amount": 780.0, "category": "healthcare", "tags": ["pharmacy"], "notes": "Apollo Pharmacy medicines"}
+            response = self.session.post(f"{BACKEND_URL}/expenses", json=expense)
+            if response.status_code != 200:
+                self.log(f"❌ Failed to create search expense: {response.status_code}", "ERROR")
+                return False
+            expense_id = response.json()['id']
+            self.created_items['expenses'].append(expense_id)
+
+            response = self.session.get(f"{BACKEND_URL}/expenses/search", params={"q": "apollo", "category": "healthcare"})
+            if response.status_code != 200 or expense_id not in [row['id'] for row in response.json()]:
+                self.log(f"❌ Search did not find the expense: {response.status_code} {response.text[:200]}", "ERROR")
+                return False
+            self.log("✅ Search found expense by notes")
+
+            response = self.session.get(f"{BACKEND_URL}/expenses/search", params={"q": "apollo", "category": "food"})
+            if response.status_code != 200 or expense_id in [row['id'] for row in response.json()]:
+                self.log("❌ Search ignored the category filter", "ERROR")
+                return False
+
+            response = self.session.get(f"{BACKEND_URL}/expenses/search", params={"q": " "})
+            if response.status_code != 400:
+                self.log(f"❌ Expected 400 for an empty query, got {response.status_code}", "ERROR")
+                return False
+
+            self.log("✅ Expense search tests passed", "SUCCESS")
+            return True
+
+        except Exception as e:
+            self.log(f"❌ Expense search tests failed - exception: {str(e)}", "ERROR")
+            return False
+
+    def test_event_stream(self):
+        """Test the Server-Sent Events alert stream"""
+        self.log("Testing Event Stream...")
+
+        try:
+            response = self.session.get(f"{BACKEND_URL}/events", stream=True, timeout=10)
+            if response.status_code != 200 or not response.headers.get('content-type', '').startswith('text/event-stream'):
+                self.log(f"❌ Event stream not opened: {response.status_code} {response.headers.get('content-type')}", "ERROR")
+                return False
+            first_line = next(response.iter_lines(decode_unicode=True))
+            response.close()
+            if not first_line.startswith("retry:"):
+                self.log(f"❌ Unexpected first event stream line: {first_line}", "ERROR")
+                return False
+
+            self.log("✅ Event stream tests passed", "SUCCESS")
+            return True
+
+        except Exception as e:
+            self.log(f"❌ Event stream tests failed - exception: {str(e)}", "ERROR")
+            return False
+
     def test_data_export(self):
-        """Test data export endpoint (previously failing)"""
-        self.log("Testing Data Export Endpoint (Previously Fixed)...")
+        """Test streaming data export endpoint"""
+        self.log("Testing Data Export Endpoint...")
         
         try:
-            response = self.session.get(f"{BACKEND_URL}/export/csv")
+            # CSV export of all collections
+            response = self.session.get(f"{BACKEND_URL}/export/csv", stream=True)
             if response.status_code == 200:
-                export_data = response.json()
-                
-                # Check required fields
-                required_fields = ['subscriptions', 'expenses', 'budgets']
-                for field in required_fields:
-                    if field not in export_data:
-                        self.log(f"❌ Export data missing required field: {field}", "ERROR")
-                        return False
-                
-                # Validate data types
-                if not isinstance(export_data['subscriptions'], list):
-                    self.log("❌ subscriptions should be a list", "ERROR")
+                if not response.headers.get('content-type', '').startswith('text/csv'):
+                    self.log(f"❌ Unexpected export content type: {response.headers.get('content-type')}", "ERROR")
                     return False
                 
-                if not isinstance(export_data['expenses'], list):
-                    self.log("❌ expenses should be a list", "ERROR")
+                lines = response.text.splitlines()
+                header = lines[0].split(',') if lines else []
+                if not header or header[0] != 'collection':
+                    self.log(f"❌ Export CSV missing header row: {header}", "ERROR")
                     return False
                 
-                if not isinstance(export_data['budgets'], list):
-                    self.log("❌ budgets should be a list", "ERROR")
-                    return False
+                counts = {'subscriptions': 0, 'expenses': 0, 'budgets': 0}
+                for line in lines[1:]:
+                    collection = line.split(',', 1)[0]
+                    if collection in counts:
+                        counts[collection] += 1
                 
-                # Check if ObjectId serialization is working (no ObjectId objects in response)
-                export_str = json.dumps(export_data)  # This would fail if ObjectIds weren't serialized
-                
-                self.log("✅ Data export endpoint working correctly")
-                self.log(f"   - Subscriptions: {len(export_data['subscriptions'])}")
-                self.log(f"   - Expenses: {len(export_data['expenses'])}")
-                self.log(f"   - Budgets: {len(export_data['budgets'])}")
-                self.log("   - ObjectId serialization: ✅ Fixed")
-                
-                return True
+                self.log("✅ CSV export streamed correctly")
+                if response.headers.get('content-encoding') not in ('gzip', 'br'):
+                    self.log(f"❌ CSV export not compressed: {response.headers.get('content-encoding')}", "ERROR")
+                    return False
+                self.log(f"   - Compressed with {response.headers.get('content-encoding')}")
+                self.log(f"   - Subscriptions: {counts['subscriptions']}")
+                self.log(f"   - Expenses: {counts['expenses']}")
+                self.log(f"   - Budgets: {counts['budgets']}")
             else:
                 self.log(f"❌ Failed to export data: {response.status_code} - {response.text}", "ERROR")
                 return False
+            
+            # NDJSON export of one collection, gzip-compressed on the fly
+            response = self.session.get(f"{BACKEND_URL}/export/csv", params={"format": "ndjson", "collection": "expenses", "gzip": "true"})
+            if response.status_code == 200:
+                records = [json.loads(line) for line in response.text.splitlines() if line]
+                if any(record.get('collection') != 'expenses' or '_id' in record for record in records):
+                    self.log("❌ NDJSON export returned unexpected records", "ERROR")
+                    return False
+                self.log(f"✅ NDJSON export streamed {len(records)} expenses (gzip)")
+            else:
+                self.log(f"❌ Failed to export NDJSON: {response.status_code} - {response.text}", "ERROR")
+                return False
+            
+            # Unknown formats are rejected
+            response = self.session.get(f"{BACKEND_URL}/export/csv", params={"format": "xml"})
+            if response.status_code != 400:
+                self.log(f"❌ Expected 400 for unsupported format, got {response.status_code}", "ERROR")
+                return False
+            
+            return True
                 
         except Exception as e:
             self.log(f"❌ Data export test failed - exception: {str(e)}", "ERROR")
             return False
     
+    def test_metrics(self):
+        """Test the Prometheus metrics endpoint"""
+        self.log("Testing Metrics Endpoint...")
+        site_url = BACKEND_URL.rsplit("/api", 1)[0]
+        
+        try:
+            response = self.session.get(f"{site_url}/metrics")
+            if response.status_code != 200 or not response.headers.get('content-type', '').startswith('text/plain'):
+                self.log(f"❌ Metrics not served: {response.status_code} {response.headers.get('content-type')}", "ERROR")
+                return False
+            for name in ("nbntracker_http_requests_total", "nbntracker_http_request_duration_seconds_bucket",
+                         "nbntracker_mongo_command_duration_seconds_bucket", "nbntracker_cache_hit_ratio"):
+                if name not in response.text:
+                    self.log(f"❌ Metrics missing {name}", "ERROR")
+                    return False
+            if 'route="/api/expenses/{expense_id}"' not in response.text:
+                self.log("❌ Request metrics not labelled by route template", "ERROR")
+                return False
+            
+            self.log("✅ Metrics endpoint tests passed", "SUCCESS")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ Metrics endpoint tests failed - exception: {str(e)}", "ERROR")
+            return False
+    
     def test_error_handling(self):
         """Test error handling for invalid requests"""
         self.log("Testing Error Handling...")
@@ -577,11 +1321,24 @@ class NBNTrackerTester:
             ("Health Check Endpoint", self.test_health_check),
             ("Subscription Management CRUD", self.test_subscription_crud),
             ("Expense Management CRUD", self.test_expense_crud),
+            ("Expense Cursor Pagination", self.test_expense_pagination),
+            ("Sparse Fieldsets", self.test_sparse_fieldsets),
+            ("Rollup Consistency", self.test_rollup_consistency),
+            ("Bulk Expense Operations", self.test_bulk_expense_operations),
+            ("Expense Search", self.test_expense_search),
             ("Budget Management CRUD", self.test_budget_crud),
             ("Dashboard Analytics", self.test_dashboard_analytics),
             ("Analytics Endpoints", self.test_analytics_endpoints),
+            ("Spending Time Series", self.test_spending_timeseries),
+            ("Spending Statistics", self.test_spending_stats),
+            ("Result Cache", self.test_result_cache),
+            ("Month-End Billing", self.test_month_end_billing),
+            ("Conditional GETs", self.test_conditional_get),
+            ("Event Stream", self.test_event_stream),
+            ("Static Assets", self.test_static_assets),
             ("Data Export Endpoint", self.test_data_export),
-            ("Error Handling", self.test_error_handling)
+            ("Error Handling", self.test_error_handling),
+            ("Metrics Endpoint", self.test_metrics)
         ]
         
         for test_name, test_func in tests:
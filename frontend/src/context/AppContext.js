@@ -20,6 +20,8 @@ const initialState = {
   
   // Expenses
   expenses: [],
+  // Cursor of the next page of expenses, null when all are loaded
+  expensesCursor: null,
   
   // Budgets
   budgets: [],
@@ -47,6 +49,7 @@ const actionTypes = {
   UPDATE_SUBSCRIPTION: 'UPDATE_SUBSCRIPTION',
   DELETE_SUBSCRIPTION: 'DELETE_SUBSCRIPTION',
   SET_EXPENSES: 'SET_EXPENSES',
+  APPEND_EXPENSES: 'APPEND_EXPENSES',
   ADD_EXPENSE: 'ADD_EXPENSE',
   UPDATE_EXPENSE: 'UPDATE_EXPENSE',
   DELETE_EXPENSE: 'DELETE_EXPENSE',
@@ -97,7 +100,14 @@ const appReducer = (state, action) => {
       };
     
     case actionTypes.SET_EXPENSES:
-      return { ...state, expenses: action.payload };
+      return { ...state, expenses: action.payload.expenses, expensesCursor: action.payload.cursor };
+    
+    case actionTypes.APPEND_EXPENSES:
+      return {
+        ...state,
+        expenses: [...state.expenses, ...action.payload.expenses],
+        expensesCursor: action.payload.cursor
+      };
     
     case actionTypes.ADD_EXPENSE:
       return { 
@@ -238,14 +248,25 @@ export const AppProvider = ({ children }) => {
       if (filters.start_date) params.append('start_date', filters.start_date);
       if (filters.end_date) params.append('end_date', filters.end_date);
       if (filters.limit) params.append('limit', filters.limit);
+      if (filters.cursor) params.append('cursor', filters.cursor);
 
       const response = await api.get(`/expenses?${params.toString()}`);
-      dispatch({ type: actionTypes.SET_EXPENSES, payload: response.data });
+      // The API pages by cursor; the next page's cursor comes in a response header
+      dispatch({
+        type: filters.cursor ? actionTypes.APPEND_EXPENSES : actionTypes.SET_EXPENSES,
+        payload: { expenses: response.data, cursor: response.headers['x-next-cursor'] || null }
+      });
     } catch (error) {
       handleError(error, 'Failed to fetch expenses');
     }
   };
 
+  const fetchMoreExpenses = async (filters = {}) => {
+    if (state.expensesCursor) {
+      await fetchExpenses({ ...filters, cursor: state.expensesCursor });
+    }
+  };
+
   const createExpense = async (expenseData) => {
     try {
       dispatch({ type: actionTypes.SET_LOADING, payload: true });
@@ -388,6 +409,7 @@ export const AppProvider = ({ children }) => {
     updateSubscription,
     deleteSubscription,
     fetchExpenses,
+    fetchMoreExpenses,
     createExpense,
     updateExpense,
     deleteExpense,
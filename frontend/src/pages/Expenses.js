@@ -21,9 +21,11 @@ import toast from 'react-hot-toast';
 const Expenses = () => {
   const { 
     expenses, 
+    expensesCursor,
     loading, 
     error, 
     fetchExpenses,
+    fetchMoreExpenses,
     createExpense,
     updateExpense,
     deleteExpense 
@@ -358,6 +360,16 @@ const Expenses = () => {
               </div>
             </div>
           ))}
+          {expensesCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={() => fetchMoreExpenses()}
+                className="btn btn-secondary"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
 